@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Event loop responsiveness of ``CASASGIMiddleware`` under concurrent logins.
+
+Simulates a CAS server answering ``serviceValidate`` after ``LATENCY``
+seconds, drives ``CONCURRENCY`` simultaneous ticket validations through the
+middleware and samples event loop lag with a 1ms heartbeat. A blocked loop
+shows up as a maximum lag on the order of ``LATENCY``.
+
+::
+
+    python-cas-client$ pip install .
+    python-cas-client$ python benchmarks/asgi_concurrency.py
+
+'''
+import asyncio
+import concurrent.futures
+import time
+from cas_client import CASClient, MemoryCASSessionAdapter
+from cas_client.asgi import CASASGIMiddleware
+from unittest import mock
+
+
+CONCURRENCY = 200
+LATENCY = 0.05
+
+RESPONSE_TEXT = """
+<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    <cas:authenticationSuccess>
+        <cas:user>jott</cas:user>
+    </cas:authenticationSuccess>
+</cas:serviceResponse>
+"""
+
+
+def perform_get(self, url, headers=None):
+    time.sleep(LATENCY)
+    return RESPONSE_TEXT
+
+
+async def application(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'OK'})
+
+
+async def request(middleware, index):
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'scheme': 'https',
+        'path': '/',
+        'query_string': 'ticket=ST-{}'.format(index).encode('latin-1'),
+        'headers': [(b'host', b'app.url')],
+        }
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    await middleware(scope, receive, send)
+
+
+async def heartbeat(lags, done):
+    loop = asyncio.get_event_loop()
+    while not done.is_set():
+        started = loop.time()
+        await asyncio.sleep(0.001)
+        lags.append(loop.time() - started - 0.001)
+
+
+async def run(middleware):
+    lags = []
+    done = asyncio.Event()
+    monitor = asyncio.ensure_future(heartbeat(lags, done))
+    started = time.time()
+    await asyncio.gather(*(
+        request(middleware, index) for index in range(CONCURRENCY)
+        ))
+    elapsed = time.time() - started
+    done.set()
+    await monitor
+    lags.sort()
+    return elapsed, lags[len(lags) // 2], lags[-1]
+
+
+def main():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENCY)
+    client = CASClient(
+        'https://dummy.url',
+        session_storage_adapter=MemoryCASSessionAdapter(),
+        )
+    middleware = CASASGIMiddleware(application, client, executor=executor)
+    loop = asyncio.new_event_loop()
+    with mock.patch('cas_client.CASClient._perform_get', perform_get):
+        elapsed, median_lag, max_lag = loop.run_until_complete(run(middleware))
+    loop.close()
+    executor.shutdown()
+    print('{} concurrent validations at {:.0f}ms CAS latency'.format(
+        CONCURRENCY, LATENCY * 1000))
+    print('wall time:     {:8.1f} ms (serial: {:.1f} ms)'.format(
+        elapsed * 1000, CONCURRENCY * LATENCY * 1000))
+    print('median lag:    {:8.1f} ms'.format(median_lag * 1000))
+    print('max loop lag:  {:8.1f} ms'.format(max_lag * 1000))
+
+
+if __name__ == '__main__':
+    main()
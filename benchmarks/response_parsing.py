@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Buffered versus streaming parsing of CAS validation responses.
+
+The buffered path decodes the whole body, strips blank lines and parses the
+resulting string, as ``CASClient`` does by default. The streaming path feeds
+the raw body into the parser chunk by chunk, as with ``stream_responses``.
+
+::
+
+    python-cas-client$ pip install .
+    python-cas-client$ python benchmarks/response_parsing.py
+
+'''
+import io
+import timeit
+import tracemalloc
+from cas_client import CASClient, CASResponse
+
+
+def build_body(attribute_count):
+    attributes = ''.join(
+        '        <cas:attribute{0}>value {0}</cas:attribute{0}>\n'.format(i)
+        for i in range(attribute_count)
+        )
+    text = (
+        "<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>\n"
+        "    <cas:authenticationSuccess>\n"
+        "        <cas:user>jott</cas:user>\n"
+        "        <cas:attributes>\n"
+        "{}"
+        "        </cas:attributes>\n"
+        "    </cas:authenticationSuccess>\n"
+        "</cas:serviceResponse>\n"
+        ).format(attributes)
+    return text.encode('utf-8')
+
+
+def buffered(client, body):
+    text = body.decode('utf-8')
+    return client._build_cas_response(text)
+
+
+def streaming(client, body):
+    return CASResponse.from_file(io.BytesIO(body))
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    client = CASClient('https://dummy.url')
+    for attribute_count in (10, 100, 1000):
+        body = build_body(attribute_count)
+        number = max(10, 20000 // attribute_count)
+        print('{} attributes, {} byte body'.format(attribute_count, len(body)))
+        for name, function in (('buffered', buffered), ('streaming', streaming)):
+            seconds = min(timeit.repeat(
+                lambda: function(client, body),
+                number=number,
+                repeat=3,
+                ))
+            print('    {:<10} {:9.1f} usec/response  {:9d} bytes peak'.format(
+                name,
+                seconds / number * 1e6,
+                peak_memory(function, client, body),
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Bytes stored and encode/decode times per session payload encoding.
+
+``pickle (protocol 0)`` is what python-memcached stores by default;
+``pickle (highest)`` is what pymemcache's pickle serde stores.
+
+::
+
+    python-cas-client$ pip install .
+    python-cas-client$ python benchmarks/session_codecs.py
+
+'''
+import json
+import pickle
+import timeit
+from cas_client import BinaryCASSessionCodec
+
+
+SMALL = {
+    'user': u'jott',
+    'attributes': {
+        u'email': u'jott@purdue.edu',
+        u'firstname': u'Jeffrey A',
+        u'fullname': u'Jeffrey A Ott',
+        u'i2a2characteristics': u'0,3592,2000',
+        u'lastname': u'Ott',
+        u'puid': u'0012345678',
+        },
+    }
+
+LARGE = {
+    'user': u'jott',
+    'attributes': dict(SMALL['attributes'], **{
+        u'memberOf': [
+            u'cn=group-{},ou=groups,dc=purdue,dc=edu'.format(index)
+            for index in range(40)
+            ],
+        }),
+    }
+
+
+def codecs():
+    binary = BinaryCASSessionCodec(compress_threshold=None)
+    compressed = BinaryCASSessionCodec(compress_threshold=512)
+    return [
+        ('pickle (protocol 0)',
+            lambda payload: pickle.dumps(payload, 0), pickle.loads),
+        ('pickle (highest)',
+            lambda payload: pickle.dumps(payload, pickle.HIGHEST_PROTOCOL),
+            pickle.loads),
+        ('json',
+            lambda payload: json.dumps(payload, separators=(',', ':')).encode('utf-8'),
+            lambda data: json.loads(data.decode('utf-8'))),
+        ('binary', binary.encode, binary.decode),
+        ('binary + zlib >= 512', compressed.encode, compressed.decode),
+        ]
+
+
+def main():
+    for name, payload in (('small', SMALL), ('large', LARGE)):
+        print('{} payload'.format(name))
+        for codec_name, encode, decode in codecs():
+            data = encode(payload)
+            assert decode(data) == payload
+            number = 20000
+            encode_time = timeit.timeit(lambda: encode(payload), number=number)
+            decode_time = timeit.timeit(lambda: decode(data), number=number)
+            print('  {:<22} {:6d} bytes {:8.2f} us encode {:8.2f} us decode'.format(
+                codec_name,
+                len(data),
+                encode_time / number * 1e6,
+                decode_time / number * 1e6,
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Session store latency and multi-process throughput, shared memory versus
+memcached.
+
+Measures ``create``, ``exists`` and ``get`` per call from one process, then
+``exists`` calls per second from ``PROCESSES`` forked workers sharing the
+store. The memcached rows need ``pymemcache`` and a memcached server at
+``$MEMCACHED`` (``127.0.0.1:11211`` by default), and are skipped otherwise.
+
+::
+
+    python-cas-client$ pip install .
+    python-cas-client$ memcached -d
+    python-cas-client$ python benchmarks/shared_memory_sessions.py
+
+'''
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import timeit
+from cas_client import MemcachedCASSessionAdapter, SharedMemoryCASSessionAdapter
+
+
+PAYLOAD = {
+    'user': u'jott',
+    'attributes': {
+        u'email': u'jott@purdue.edu',
+        u'firstname': u'Jeffrey A',
+        u'lastname': u'Ott',
+        u'puid': u'0012345678',
+        },
+    }
+
+PROCESSES = 8
+
+SESSIONS = 10000
+
+SECONDS = 2.0
+
+
+def memcached_adapter():
+    try:
+        from pymemcache.client.base import Client
+    except ImportError:
+        return None
+    host, _, port = os.environ.get('MEMCACHED', '127.0.0.1:11211').partition(':')
+    client = Client((host, int(port or 11211)), connect_timeout=1, timeout=1)
+    try:
+        client.version()
+    except Exception:
+        return None
+    return MemcachedCASSessionAdapter(client)
+
+
+def count_exists(adapter, seconds):
+    count = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        for index in range(100):
+            adapter.exists('ST-bench-{}'.format(index * 97 % SESSIONS))
+        count += 100
+    return count
+
+
+def open_adapter(path):
+    if path is None:
+        return memcached_adapter()
+    return SharedMemoryCASSessionAdapter(path, capacity=SESSIONS * 2)
+
+
+def worker(path):
+    return count_exists(open_adapter(path), SECONDS)
+
+
+def measure(name, path):
+    adapter = open_adapter(path)
+    number = 20000
+    index = [0]
+
+    def create():
+        index[0] += 1
+        adapter.create('ST-bench-{}'.format(index[0] % SESSIONS), PAYLOAD, 600)
+
+    create_time = timeit.timeit(create, number=number)
+    exists_time = timeit.timeit(lambda: adapter.exists('ST-bench-1'), number=number)
+    get_time = timeit.timeit(lambda: adapter.get('ST-bench-1'), number=number)
+    pool = multiprocessing.Pool(PROCESSES)
+    try:
+        counts = pool.map(worker, [path] * PROCESSES)
+    finally:
+        pool.close()
+        pool.join()
+    print('{:<14} {:8.2f} us create {:8.2f} us exists {:8.2f} us get '
+        '{:10.0f} exists/s from {} processes'.format(
+            name,
+            create_time / number * 1e6,
+            exists_time / number * 1e6,
+            get_time / number * 1e6,
+            sum(counts) / SECONDS,
+            PROCESSES,
+            ))
+
+
+def main():
+    directory = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        measure('shared memory', os.path.join(directory, 'sessions'))
+    finally:
+        shutil.rmtree(directory)
+    if memcached_adapter() is None:
+        print('{:<14} skipped: no pymemcache or memcached server'.format('memcached'))
+    else:
+        measure('memcached', None)
+
+
+if __name__ == '__main__':
+    main()
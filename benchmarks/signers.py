@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Auth token signatures per second for each ``CASSigner``.
+
+``RSA (reparsed)`` re-imports the PEM key on every call, as
+``_build_auth_token_data`` did before signers were pluggable.
+
+::
+
+    python-cas-client$ pip install .
+    python-cas-client$ python benchmarks/signers.py
+
+'''
+import json
+import time
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import ECC, RSA
+from Crypto.Signature import PKCS1_v1_5
+from cas_client import ECDSASigner, Ed25519Signer, RSASigner
+
+
+TOKEN = json.dumps({
+    'authenticator': 'my_company_ldap',
+    'ticket': 'AT-1234',
+    'username': 'my_user',
+    }, sort_keys=True).encode('utf-8')
+
+
+def reparsed_rsa(private_key):
+    def sign(message):
+        signer = PKCS1_v1_5.new(RSA.importKey(private_key))
+        return signer.sign(SHA256.new(message))
+    return sign
+
+
+def measure(sign, duration=1.0):
+    count = 0
+    started = time.time()
+    while time.time() - started < duration:
+        sign(TOKEN)
+        count += 1
+    return count / (time.time() - started)
+
+
+def main():
+    signers = []
+    for bits in (2048, 4096):
+        private_key = RSA.generate(bits).export_key().decode('ascii')
+        signers.append(('RSA-{} (reparsed)'.format(bits), reparsed_rsa(private_key)))
+        signers.append(('RSA-{}'.format(bits), RSASigner(private_key).sign))
+    signers.append(('ECDSA P-256', ECDSASigner(
+        ECC.generate(curve='P-256').export_key(format='PEM')).sign))
+    signers.append(('Ed25519', Ed25519Signer(
+        ECC.generate(curve='Ed25519').export_key(format='PEM')).sign))
+    for name, sign in signers:
+        print('{:<22} {:10.0f} signatures/sec'.format(name, measure(sign)))
+
+
+if __name__ == '__main__':
+    main()
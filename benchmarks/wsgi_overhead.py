@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Per-request overhead of ``CASWSGIMiddleware`` against a bare WSGI app.
+
+::
+
+    python-cas-client$ pip install .
+    python-cas-client$ python benchmarks/wsgi_overhead.py
+
+'''
+import io
+import timeit
+from cas_client import CASClient, MemoryCASSessionAdapter
+from cas_client.wsgi import CASWSGIMiddleware
+
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'OK']
+
+
+def start_response(status, headers):
+    pass
+
+
+def build_environ():
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': '/',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'app.url',
+        'SERVER_PORT': '443',
+        'HTTP_HOST': 'app.url',
+        'HTTP_COOKIE': 'cas_ticket=ST-1234',
+        'wsgi.url_scheme': 'https',
+        'wsgi.input': io.BytesIO(),
+        }
+
+
+def main(number=100000):
+    adapter = MemoryCASSessionAdapter()
+    adapter.create('ST-1234')
+    client = CASClient('https://dummy.url', session_storage_adapter=adapter)
+    applications = [
+        ('bare', application),
+        ('adapter', CASWSGIMiddleware(application, client)),
+        ('near-cache', CASWSGIMiddleware(application, client, near_cache_ttl=60)),
+        ]
+    baseline = None
+    for name, app in applications:
+        seconds = min(timeit.repeat(
+            lambda: app(build_environ(), start_response),
+            number=number,
+            repeat=3,
+            ))
+        usec = seconds / number * 1e6
+        if baseline is None:
+            baseline = usec
+        print('{:<12} {:8.2f} usec/request  (+{:.2f} usec)'.format(
+            name, usec, usec - baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,28 @@
 import six
 
 if six.PY3:
+    from .admission import *
+    from .api_session import *
     from .cas_client import *
+    from .lifecycle import *
+    from .registry import *
+    from .replay import *
+    from .replay_filter import *
+    from .session_codecs import *
+    from .shared_memory import *
+    from .signers import *
+    from .transport import *
     from ._version import __version__, __version_info__
 else:
+    from admission import *
+    from api_session import *
     from cas_client import *
+    from lifecycle import *
+    from registry import *
+    from replay import *
+    from replay_filter import *
+    from session_codecs import *
+    from shared_memory import *
+    from signers import *
+    from transport import *
     from _version import __version__, __version_info__
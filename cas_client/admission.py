@@ -0,0 +1,227 @@
+# -*- encoding: utf-8 -*-
+import collections
+import contextlib
+import logging
+import requests
+import threading
+import time
+from .lifecycle import register_after_fork
+
+
+class CASAdmissionError(Exception):
+    r'''Raised when a call to the CAS server is refused by admission
+    control, because the wait queue is full or the wait timed out.
+    '''
+    pass
+
+
+class CASAdmissionController(object):
+    r'''Adaptive admission control for calls to a CAS server.
+
+    At most ``limit`` calls run at once; further calls wait in a queue of at
+    most ``queue_size`` calls, for at most ``queue_timeout`` seconds, and
+    are refused with ``CASAdmissionError`` otherwise. Waiting calls are
+    admitted by priority class, in the order of ``priorities``, and first
+    come first served within a class. ``CASClient`` admits validation calls
+    as ``validate`` and auth token and API calls as ``api``; back-channel
+    handlers can admit their work as ``slo`` to go ahead of both.
+
+    The limit adapts to the CAS server's latency (AIMD): it grows by about
+    one per limit's worth of calls completing within ``latency_threshold``
+    seconds while the limit is in use, and shrinks by ``backoff_ratio``
+    when a call is slower or fails to connect or times out, at most once
+    per such call's duration.
+
+    ::
+
+        >>> from cas_client import CASAdmissionController, CASClient
+        >>> controller = CASAdmissionController(initial_limit=10)
+        >>> client = CASClient(
+        ...     'https://logmein.com',
+        ...     admission_controller=controller,
+        ...     )
+        >>> with controller.admit('slo'):
+        ...     controller.metrics['inflight']
+        1
+
+    '''
+
+    def __init__(
+        self,
+        initial_limit=20,
+        min_limit=1,
+        max_limit=200,
+        latency_threshold=1.0,
+        backoff_ratio=0.9,
+        queue_size=100,
+        queue_timeout=1.0,
+        priorities=('slo', 'validate', 'api'),
+        ):
+        assert 0 < min_limit <= initial_limit <= max_limit
+        assert 0 < backoff_ratio < 1
+        self._limit = float(initial_limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._latency_threshold = latency_threshold
+        self._backoff_ratio = backoff_ratio
+        self._queue_size = queue_size
+        self._queue_timeout = queue_timeout
+        self._priorities = tuple(priorities)
+        self._lock = threading.Lock()
+        self._queues = collections.OrderedDict(
+            (priority, collections.deque()) for priority in self._priorities
+            )
+        self._queued = 0
+        self._inflight = 0
+        self._last_decrease = 0.0
+        self._admitted = dict.fromkeys(self._priorities, 0)
+        self._rejected = dict.fromkeys(self._priorities, 0)
+        self._timeouts = dict.fromkeys(self._priorities, 0)
+        self._queue_seconds_max = 0.0
+        self._queue_seconds_total = 0.0
+        self._queue_waits = 0
+        register_after_fork(self)
+
+    ### PUBLIC METHODS ###
+
+    @contextlib.contextmanager
+    def admit(self, priority='api', timeout=None):
+        '''
+        Run the body of the ``with`` statement as one admitted call of class
+        ``priority``, waiting up to ``timeout`` seconds (``queue_timeout``
+        by default) for admission.
+        '''
+        self._acquire(priority, timeout)
+        started = time.time()
+        overloaded = False
+        try:
+            yield
+        except (requests.ConnectionError, requests.Timeout):
+            overloaded = True
+            raise
+        finally:
+            self._release(time.time() - started, overloaded)
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        # Calls in flight or queued at fork belong to the parent.
+        self._lock = threading.Lock()
+        self._queues = collections.OrderedDict(
+            (priority, collections.deque()) for priority in self._priorities
+            )
+        self._queued = 0
+        self._inflight = 0
+
+    def _acquire(self, priority, timeout):
+        queue = self._queues[priority]
+        with self._lock:
+            if not self._queued and self._inflight < int(self._limit):
+                self._inflight += 1
+                self._admitted[priority] += 1
+                return
+            if self._queued >= self._queue_size:
+                self._rejected[priority] += 1
+                raise CASAdmissionError(
+                    'CAS admission queue full ({} waiting)'.format(self._queued))
+            waiter = _Waiter()
+            queue.append(waiter)
+            self._queued += 1
+        started = time.time()
+        waiter.event.wait(self._queue_timeout if timeout is None else timeout)
+        waited = time.time() - started
+        with self._lock:
+            self._queue_waits += 1
+            self._queue_seconds_total += waited
+            self._queue_seconds_max = max(self._queue_seconds_max, waited)
+            if waiter.granted:
+                self._admitted[priority] += 1
+                return
+            queue.remove(waiter)
+            self._queued -= 1
+            self._rejected[priority] += 1
+            self._timeouts[priority] += 1
+        raise CASAdmissionError(
+            'Timed out after {:.3f}s waiting for CAS admission'.format(waited))
+
+    def _release(self, latency, overloaded):
+        now = time.time()
+        with self._lock:
+            self._inflight -= 1
+            if overloaded or (
+                self._latency_threshold is not None and
+                latency > self._latency_threshold
+                ):
+                if now - self._last_decrease >= latency:
+                    self._limit = max(
+                        self._min_limit,
+                        self._limit * self._backoff_ratio,
+                        )
+                    self._last_decrease = now
+                    logging.debug('[CAS] Admission limit decreased to {}'.format(
+                        int(self._limit)))
+            elif (self._inflight + 1) * 2 >= self._limit:
+                self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+            while self._queued and self._inflight < int(self._limit):
+                for queue in self._queues.values():
+                    if queue:
+                        waiter = queue.popleft()
+                        break
+                self._queued -= 1
+                self._inflight += 1
+                waiter.granted = True
+                waiter.event.set()
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def limit(self):
+        '''
+        The current concurrency limit.
+        '''
+        return int(self._limit)
+
+    @property
+    def metrics(self):
+        '''
+        The current limit, in-flight and queued call counts, admission,
+        rejection and queue timeout counts per priority class, and queue
+        wait times in seconds.
+        '''
+        with self._lock:
+            return {
+                'admitted': dict(self._admitted),
+                'inflight': self._inflight,
+                'limit': int(self._limit),
+                'queue_seconds_max': self._queue_seconds_max,
+                'queue_seconds_mean': (
+                    self._queue_seconds_total / self._queue_waits
+                    if self._queue_waits else 0.0
+                    ),
+                'queue_seconds_total': self._queue_seconds_total,
+                'queued': self._queued,
+                'rejected': dict(self._rejected),
+                'timeouts': dict(self._timeouts),
+                }
+
+    @property
+    def priorities(self):
+        '''
+        The priority classes, highest first.
+        '''
+        return self._priorities
+
+
+class _Waiter(object):
+
+    __slots__ = ('event', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+__all__ = [
+    'CASAdmissionController',
+    'CASAdmissionError',
+    ]
@@ -0,0 +1,223 @@
+# -*- encoding: utf-8 -*-
+import base64
+import collections
+import json
+import logging
+import operator
+import six
+from concurrent import futures
+from .lifecycle import register_after_fork
+from .signers import _get_token_fields
+from .transport import _reset_http_session, create_http_session
+try:
+    from urllib import quote_plus
+except ImportError:
+    from urllib.parse import quote_plus
+
+
+CASAPIResult = collections.namedtuple(
+    'CASAPIResult',
+    ['body', 'token_fields', 'response', 'error'],
+    )
+
+
+class CASAPISession(object):
+    r'''A reusable session for calling one auth-token-protected CAS API
+    resource many times.
+
+    ``CASClient.get_api_url`` rebuilds and re-serializes the whole auth
+    token on every call. A session serializes the token's static fields,
+    ``authenticator`` plus any ``token_fields`` given here, resolves the
+    signer and builds the resource URL once, so each call only serializes
+    its new ticket and per-call fields into the canonical (key-sorted) JSON
+    and signs the result, once.
+
+    ::
+
+        >>> from cas_client import CASAPISession, CASClient, RSASigner
+        >>> from Crypto.PublicKey import RSA
+        >>> signer = RSASigner(RSA.generate(1024))
+        >>> client = CASClient('https://logmein.com', signer=signer)
+        >>> session = CASAPISession(client, 'users', 'my_company_ldap')
+        >>> url = session.get_url('ATT-1234', username='jott')
+        >>> url.startswith('https://logmein.com/cas/api/users?at=')
+        True
+        >>> session.close()
+
+    Calls go over the client's HTTP session, or a pool of ``max_workers``
+    connections the session creates if the client has none. Each call
+    acquires a fresh auth token ticket, since tickets are single-use.
+    ``perform_many`` runs calls concurrently on ``max_workers`` threads.
+    '''
+
+    def __init__(
+        self,
+        client,
+        api_resource,
+        authenticator,
+        private_key=None,
+        service_url=None,
+        method='POST',
+        max_workers=8,
+        **token_fields
+    ):
+        assert method in ('GET', 'POST')
+        assert 'ticket' not in token_fields
+        self._client = client
+        self._api_resource = api_resource
+        self._method = method
+        self._max_workers = max_workers
+        self._signer = client._get_signer(private_key)
+        token_fields['authenticator'] = authenticator
+        token_fields.update(_get_token_fields(self._signer))
+        self._fields = _serialize_fields(token_fields)
+        # The token's JSON around the ticket, for calls without extra fields.
+        fields = self._fields + _serialize_fields({'ticket': ''})
+        fields.sort(key=operator.itemgetter(0))
+        index = [key for key, _ in fields].index('ticket')
+        self._token_prefix = '{' + ''.join(
+            text + ', ' for _, text in fields[:index]) + '"ticket": '
+        self._token_suffix = ''.join(
+            ', ' + text for _, text in fields[index + 1:]) + '}'
+        self._url_prefix = client._get_api_url(api_resource) + '?at='
+        self._url_suffix = ''
+        if service_url is not None:
+            self._url_suffix = '&service=' + quote_plus(service_url)
+        self._http_session = client.http_session
+        self._owns_http_session = self._http_session is None
+        if self._owns_http_session:
+            self._http_session = create_http_session(
+                client.ssl_context,
+                pool_maxsize=max_workers,
+                )
+            register_after_fork(self)
+
+    ### PUBLIC METHODS ###
+
+    def close(self):
+        '''
+        Close the session's own connection pool, if it created one.
+        '''
+        if self._owns_http_session:
+            self._http_session.close()
+
+    def get_url(self, auth_token_ticket, **token_fields):
+        '''
+        Build the signed API URL for ``auth_token_ticket``, with
+        ``token_fields`` added to the session's static token fields.
+        '''
+        auth_token = self._build_auth_token(auth_token_ticket, token_fields)
+        if six.PY3:
+            auth_token = auth_token.encode('utf-8')
+        auth_token_signature = self._signer.sign(auth_token)
+        return ''.join((
+            self._url_prefix,
+            quote_plus(base64.b64encode(auth_token)),
+            '&ats=',
+            quote_plus(base64.b64encode(auth_token_signature)),
+            self._url_suffix,
+            ))
+
+    def perform(self, body=None, headers=None, **token_fields):
+        '''
+        Acquire an auth token ticket and call the API resource with
+        ``body``, returning the response text.
+        '''
+        auth_token_ticket = self._client.acquire_auth_token_ticket(
+            headers=headers,
+            http_session=self._http_session,
+            )
+        url = self.get_url(auth_token_ticket, **token_fields)
+        return self._client.perform_api_request(
+            url,
+            method=self._method,
+            headers=headers,
+            body=body,
+            http_session=self._http_session,
+            )
+
+    def perform_many(self, calls, headers=None, as_completed=False):
+        '''
+        Perform many (body, token fields) calls concurrently. ``token_fields``
+        may be None.
+
+        Each call yields a ``CASAPIResult`` holding either the response
+        text or the exception raised while performing it, so one failure
+        never aborts the batch. Returns a list in input order, or an
+        iterator in completion order if ``as_completed`` is true.
+        '''
+        calls = list(calls)
+        logging.debug('[CAS] Performing {} calls to API resource {}'.format(
+            len(calls), self._api_resource))
+        executor = futures.ThreadPoolExecutor(max_workers=self._max_workers)
+        pending = [
+            executor.submit(self._perform_call, body, token_fields, headers)
+            for body, token_fields in calls
+            ]
+        executor.shutdown(wait=False)
+        if as_completed:
+            return (future.result() for future in futures.as_completed(pending))
+        return [future.result() for future in pending]
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        _reset_http_session(self._http_session)
+
+    def _build_auth_token(self, auth_token_ticket, token_fields):
+        if not token_fields:
+            return ''.join((
+                self._token_prefix,
+                json.dumps(auth_token_ticket),
+                self._token_suffix,
+                ))
+        if 'ticket' in token_fields:
+            raise TypeError('The ticket is not a token field')
+        token_fields['ticket'] = auth_token_ticket
+        fields = _serialize_fields(token_fields)
+        keys = set(key for key, _ in fields)
+        if any(key in keys for key, _ in self._fields):
+            raise TypeError('Token fields {} are already set'.format(
+                sorted(keys.intersection(key for key, _ in self._fields))))
+        fields.extend(self._fields)
+        fields.sort(key=operator.itemgetter(0))
+        return '{' + ', '.join(text for _, text in fields) + '}'
+
+    def _perform_call(self, body, token_fields, headers):
+        try:
+            response = self.perform(body, headers=headers, **(token_fields or {}))
+        except Exception as exception:
+            logging.debug('[CAS] API call to {} failed: {!r}'.format(
+                self._api_resource, exception))
+            return CASAPIResult(body, token_fields, None, exception)
+        return CASAPIResult(body, token_fields, response, None)
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def api_resource(self):
+        '''
+        The API resource the session calls.
+        '''
+        return self._api_resource
+
+    @property
+    def http_session(self):
+        '''
+        The ``requests.Session`` pooling the session's connections.
+        '''
+        return self._http_session
+
+
+def _serialize_fields(fields):
+    # Matches ``json.dumps(fields, sort_keys=True)`` once sorted and joined.
+    return [
+        (key, json.dumps(key) + ': ' + json.dumps(value, sort_keys=True))
+        for key, value in fields.items()
+        ]
+
+
+__all__ = [
+    'CASAPIResult',
+    'CASAPISession',
+    ]
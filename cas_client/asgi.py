@@ -0,0 +1,423 @@
+# -*- encoding: utf-8 -*-
+import abc
+import asyncio
+import functools
+import logging
+from urllib.parse import parse_qsl, quote, urlencode
+from .wsgi import (
+    _RETRY_AFTER,
+    _UNAVAILABLE_BODY,
+    _NearCache,
+    _build_cookie,
+    _get_cookie,
+    _get_logout_request,
+    _get_session_index,
+    )
+
+
+class CASASGIMiddleware(object):
+    '''
+    ASGI middleware protecting an application with CAS authentication.
+
+    ::
+
+        >>> from cas_client import CASClient, MemoryCASSessionAdapter
+        >>> from cas_client.asgi import CASASGIMiddleware
+        >>> client = CASClient(
+        ...     'https://logmein.com',
+        ...     session_storage_adapter=MemoryCASSessionAdapter(),
+        ...     )
+        >>> async def application(scope, receive, send):
+        ...     pass
+        ...
+        >>> application = CASASGIMiddleware(application, client)
+
+    Behaves like ``cas_client.wsgi.CASWSGIMiddleware``, without ever blocking
+    the event loop: ticket validation runs the client's synchronous HTTP
+    calls on ``executor`` (the loop's default executor if ``None``), and
+    session storage goes through an ``AsyncCASSessionAdapter``. When no
+    ``session_adapter`` is given, the client's session storage adapter is
+    wrapped in an ``ExecutorAsyncCASSessionAdapter`` sharing ``executor``.
+
+    The validated service ticket is available to the application as
+    ``scope['cas_client.ticket']``. Websocket connections without a valid
+    session are closed before being accepted.
+    '''
+
+    def __init__(
+        self,
+        application,
+        cas_client,
+        session_adapter=None,
+        service_url=None,
+        cookie_name='cas_ticket',
+        session_expires=None,
+        near_cache_ttl=0,
+        near_cache_size=10000,
+        proxy_callback_path=None,
+        logout_path=None,
+        executor=None,
+        ):
+        if session_adapter is None:
+            session_adapter = ExecutorAsyncCASSessionAdapter(
+                cas_client.session_storage_adapter,
+                executor=executor,
+                )
+        assert isinstance(session_adapter, AsyncCASSessionAdapter)
+        self._application = application
+        self._cas_client = cas_client
+        self._session_adapter = session_adapter
+        self._service_url = service_url
+        self._cookie_name = cookie_name
+        self._session_expires = session_expires
+        self._executor = executor
+        self._proxy_callback_path = proxy_callback_path
+        self._logout_path = logout_path
+        self._near_cache = None
+        if near_cache_ttl:
+            self._near_cache = _NearCache(near_cache_ttl, near_cache_size)
+
+    ### SPECIAL METHODS ###
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self._application(scope, receive, send)
+            return
+        headers = _get_headers(scope)
+        if (
+            scope['type'] == 'http' and
+            self._proxy_callback_path is not None and
+            scope['path'] == self._proxy_callback_path
+            ):
+            await self._handle_proxy_callback(
+                scope.get('query_string', b'').decode('latin-1'))
+            await _send_response(send, 200, [])
+            return
+        if (
+            scope['type'] == 'http' and
+            scope['method'] == 'POST' and
+            self._logout_path in (None, scope['path'])
+            ):
+            body, receive = await self._read_body(headers, receive)
+            ticket = _get_session_index(
+                self._cas_client,
+                _get_logout_request(body),
+                )
+            if ticket:
+                await self._handle_logout_request(ticket)
+                await _send_response(send, 200, [])
+                return
+        ticket = _get_cookie(headers.get('cookie'), self.cookie_name)
+        if ticket and await self._session_exists(ticket):
+            scope = dict(scope)
+            scope['cas_client.ticket'] = ticket
+            await self._application(scope, receive, send)
+            return
+        if scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        query = parse_qsl(
+            scope.get('query_string', b'').decode('latin-1'),
+            keep_blank_values=True,
+            )
+        ticket = dict(query).get('ticket')
+        service_url = self._get_service_url(scope, headers, query)
+        try:
+            validated = ticket and await self._validate_ticket(ticket, service_url)
+        except Exception:
+            # Another trip through CAS login would only fail the same way.
+            logging.exception('[CAS] Could not validate ticket {}'.format(ticket))
+            await _send_response(
+                send,
+                503,
+                [('retry-after', _RETRY_AFTER)],
+                _UNAVAILABLE_BODY,
+                )
+            return
+        if validated:
+            await _send_response(send, 302, [
+                ('location', service_url),
+                ('set-cookie', _build_cookie(
+                    self.cookie_name,
+                    ticket,
+                    secure=scope.get('scheme') == 'https',
+                    )),
+                ])
+            return
+        login_url = self._cas_client.get_login_url(
+            service_url=quote(service_url, safe=''),
+            )
+        await _send_response(send, 302, [('location', login_url)])
+
+    ### PRIVATE METHODS ###
+
+    def _get_service_url(self, scope, headers, query):
+        if self._service_url:
+            return self._service_url
+        scheme = scope.get('scheme', 'http')
+        host = headers.get('host')
+        if host is None:
+            host, port = scope['server']
+            if (scheme, port) not in (('http', 80), ('https', 443)):
+                host = '{}:{}'.format(host, port)
+        url = '{}://{}{}'.format(scheme, host, quote(scope['path']))
+        query = [(key, value) for key, value in query if key != 'ticket']
+        if query:
+            url = '{}?{}'.format(url, urlencode(query))
+        return url
+
+    async def _handle_logout_request(self, ticket):
+        if self._near_cache is not None:
+            self._near_cache.discard(ticket)
+        logging.debug('[CAS] Deleting session for ticket {}'.format(ticket))
+        await self._session_adapter.delete(ticket)
+
+    async def _handle_proxy_callback(self, query_string):
+        query = dict(parse_qsl(query_string))
+        if query.get('pgtIou') and query.get('pgtId'):
+            await _run_in_executor(
+                self._executor,
+                self._cas_client.handle_proxy_callback,
+                query['pgtIou'],
+                query['pgtId'],
+                )
+
+    async def _read_body(self, headers, receive):
+        content_type = headers.get('content-type', '')
+        if not content_type.startswith('application/x-www-form-urlencoded'):
+            return b'', receive
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] != 'http.request':
+                break
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body = b''.join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        return body, replay
+
+    async def _session_exists(self, ticket):
+        if self._near_cache is not None and ticket in self._near_cache:
+            return True
+        if not await self._session_adapter.exists(ticket):
+            return False
+        if self._near_cache is not None:
+            self._near_cache.add(ticket)
+        return True
+
+    async def _validate_ticket(self, ticket, service_url):
+        response = await _run_in_executor(
+            self._executor,
+            self._cas_client.perform_service_validate,
+            ticket=ticket,
+            service_url=quote(service_url, safe=''),
+            )
+        if response is None or not response.success:
+            logging.debug('[CAS] Ticket {} failed validation'.format(ticket))
+            return False
+        logging.debug('[CAS] Creating session for ticket {}'.format(ticket))
+        await self._session_adapter.create(
+            ticket,
+            payload={
+                'user': response.user,
+                'attributes': response.attributes,
+                },
+            expires=self.session_expires,
+            )
+        if self._near_cache is not None:
+            self._near_cache.add(ticket)
+        return True
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def cookie_name(self):
+        '''
+        The name of the cookie carrying the validated service ticket.
+        '''
+        return self._cookie_name
+
+    @property
+    def session_adapter(self):
+        '''
+        The asynchronous session adapter used for maintaining session state.
+        '''
+        return self._session_adapter
+
+    @property
+    def session_expires(self):
+        '''
+        The expiry passed to the session adapter for new sessions.
+        '''
+        return self._session_expires
+
+
+class AsyncCASSessionAdapter(object, metaclass=abc.ABCMeta):
+    '''
+    Abstract base class for asynchronous session adapters.
+    '''
+
+    @abc.abstractmethod
+    async def create(self, ticket, payload=None, expires=None):
+        '''
+        Create a session identifier associated with ``ticket``.
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete(self, ticket):
+        '''
+        Destroy a session identifier associated with ``ticket``.
+        '''
+        raise NotImplementedError
+
+    async def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, returning
+        how many of them had not expired yet.
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def exists(self, ticket):
+        '''
+        Test if a session identifier exists for ``ticket``.
+        '''
+        raise NotImplementedError
+
+    async def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, or None
+        if there is no such session.
+        '''
+        raise NotImplementedError
+
+
+class ExecutorAsyncCASSessionAdapter(AsyncCASSessionAdapter):
+    r'''An asynchronous wrapper around a synchronous session adapter.
+
+    Each call to the wrapped ``CASSessionAdapter`` runs on ``executor`` (the
+    loop's default executor if ``None``), so blocking clients such as
+    memcached never stall the event loop.
+
+    ::
+
+        >>> import asyncio
+        >>> from cas_client import MemoryCASSessionAdapter
+        >>> from cas_client.asgi import ExecutorAsyncCASSessionAdapter
+        >>> adapter = ExecutorAsyncCASSessionAdapter(MemoryCASSessionAdapter())
+        >>> loop = asyncio.new_event_loop()
+        >>> loop.run_until_complete(adapter.create('ST-1234'))
+        >>> loop.run_until_complete(adapter.exists('ST-1234'))
+        True
+        >>> loop.close()
+
+    '''
+
+    def __init__(self, adapter, executor=None):
+        self._adapter = adapter
+        self._executor = executor
+
+    async def create(self, ticket, payload=None, expires=None):
+        '''
+        Create a session identifier associated with ``ticket``.
+        '''
+        await _run_in_executor(
+            self._executor,
+            self._adapter.create,
+            ticket,
+            payload=payload,
+            expires=expires,
+            )
+
+    async def delete(self, ticket):
+        '''
+        Destroy a session identifier associated with ``ticket``.
+        '''
+        await _run_in_executor(self._executor, self._adapter.delete, ticket)
+
+    async def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, returning
+        how many of them had not expired yet.
+        '''
+        return await _run_in_executor(
+            self._executor,
+            self._adapter.delete_user_sessions,
+            user,
+            )
+
+    async def exists(self, ticket):
+        '''
+        Test if a session identifier exists for ``ticket``.
+        '''
+        return await _run_in_executor(
+            self._executor,
+            self._adapter.exists,
+            ticket,
+            )
+
+    async def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, or None
+        if there is no such session.
+        '''
+        return await _run_in_executor(
+            self._executor,
+            self._adapter.get,
+            ticket,
+            )
+
+    @property
+    def adapter(self):
+        '''
+        The wrapped synchronous session adapter.
+        '''
+        return self._adapter
+
+
+def _get_headers(scope):
+    headers = {}
+    for key, value in scope.get('headers', ()):
+        headers[key.decode('latin-1').lower()] = value.decode('latin-1')
+    return headers
+
+
+async def _run_in_executor(executor, function, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(function, *args, **kwargs),
+        )
+
+
+async def _send_response(send, status, headers, body=b''):
+    headers = [
+        (key.encode('latin-1'), value.encode('latin-1'))
+        for key, value in headers
+        ]
+    headers.append((b'content-type', b'text/plain'))
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers,
+        })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+__all__ = [
+    'AsyncCASSessionAdapter',
+    'CASASGIMiddleware',
+    'ExecutorAsyncCASSessionAdapter',
+    ]
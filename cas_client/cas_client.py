@@ -1,18 +1,38 @@
 # -*- encoding: utf-8 -*-
 import abc
 import base64
+import collections
+import contextlib
+import hashlib
 import json
 import logging
 import requests
 import six
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
+import threading
+import time
+import weakref
+from concurrent import futures
 from xml.dom.minidom import parseString
+from xml.parsers.expat import ExpatError, ParserCreate
+from .lifecycle import register_after_fork
+from .session_codecs import CASSessionCodecError
+from .signers import CASSigner, RSASigner, _get_token_fields
+from .transport import (
+    _KeepaliveThread,
+    _reset_http_session,
+    create_http_session,
+    create_ssl_context,
+    )
 try:
     from urllib import urlencode
+    from urlparse import urlparse
 except ImportError:
-    from urllib.parse import urlencode
+    from urllib.parse import urlencode, urlparse
+
+
+_REPLAYED_TICKET_RESPONSE = '''<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+<cas:authenticationFailure code='INVALID_TICKET'>Ticket has already been validated</cas:authenticationFailure>
+</cas:serviceResponse>'''
 
 
 class CASClient(object):
@@ -37,9 +57,22 @@ class CASClient(object):
         verify_certificates=False,
         session_storage_adapter=None,
         headers=None,
+        http_session=None,
+        proxy_granting_ticket_store=None,
+        stream_responses=False,
+        max_response_size=None,
+        signer=None,
+        persistent_connections=False,
+        ca_bundle=None,
+        pool_maxsize=10,
+        keepalive_interval=None,
+        recorder=None,
+        admission_controller=None,
+        ticket_replay_filter=None,
         ):
         self._auth_prefix = auth_prefix
         self._proxy_callback = proxy_callback
+        self._proxy_granting_ticket_store = proxy_granting_ticket_store
         self._proxy_url = proxy_url
         self._server_url = server_url
         self._service_url = service_url
@@ -47,21 +80,61 @@ class CASClient(object):
         self._session_storage_adapter = session_storage_adapter
         self._verify_certificates = bool(verify_certificates)
         self._headers = headers
+        self._http_session = http_session
+        self._stream_responses = bool(stream_responses)
+        self._max_response_size = max_response_size
+        self._signer = signer
+        self._signers = {}
+        self._recorder = recorder
+        self._admission_controller = admission_controller
+        self._ticket_replay_filter = ticket_replay_filter
+        self._ca_bundle = ca_bundle
+        self._ssl_context = None
+        self._owns_http_session = False
+        if persistent_connections and http_session is None:
+            self._http_session = create_http_session(
+                self.ssl_context,
+                pool_maxsize=pool_maxsize,
+                )
+            self._owns_http_session = True
+        self._warm_up_connections = 1
+        self._keepalive_interval = keepalive_interval
+        self._keepalive_thread = None
+        if keepalive_interval:
+            assert self.http_session is not None
+            self._keepalive_thread = _KeepaliveThread(self, keepalive_interval)
+            self._keepalive_thread.start()
+        register_after_fork(self)
 
     ### PUBLIC METHODS ###
 
-    def acquire_auth_token_ticket(self, headers=None):
+    def acquire_auth_token_ticket(self, headers=None, http_session=None):
         '''
         Acquire an auth token from the CAS server.
         '''
         logging.debug('[CAS] Acquiring Auth token ticket')
         url = self._get_auth_token_tickets_url()
-        text = self._perform_post(url, headers=headers)
+        with self._admit('api'):
+            text = self._perform_post(
+                url,
+                headers=headers,
+                http_session=http_session,
+                )
         auth_token_ticket = json.loads(text)['ticket']
         logging.debug('[CAS] Acquire Auth token ticket: {}'.format(
             auth_token_ticket))
         return auth_token_ticket
 
+    def close(self):
+        '''
+        Stop keepalive pings and close the client's own connection pool.
+        '''
+        if self._keepalive_thread is not None:
+            self._keepalive_thread.stop()
+            self._keepalive_thread = None
+        if self._owns_http_session:
+            self._http_session.close()
+
     def create_session(self, ticket, payload=None, expires=None):
         '''
         Create a session record from a service ticket.
@@ -82,6 +155,28 @@ class CASClient(object):
         logging.debug('[CAS] Deleting session for ticket {}'.format(ticket))
         self.session_storage_adapter.delete(ticket)
 
+    def get_session(self, ticket):
+        '''
+        Get the payload of the session record for a service ticket, or None
+        if there is no such session.
+        '''
+        assert isinstance(self.session_storage_adapter, CASSessionAdapter)
+        return self.session_storage_adapter.get(ticket)
+
+    def delete_user_sessions(self, user):
+        '''
+        Delete every session record associated with ``user``, returning how
+        many of them had not expired yet.
+
+        The session storage adapter must index users (see
+        ``CASSessionAdapter``).
+        '''
+        assert isinstance(self.session_storage_adapter, CASSessionAdapter)
+        count = self.session_storage_adapter.delete_user_sessions(user)
+        logging.debug('[CAS] Deleted {} sessions for user {}'.format(
+            count, user))
+        return count
+
     def get_api_url(
         self,
         api_resource,
@@ -93,6 +188,9 @@ class CASClient(object):
     ):
         '''
         Build an auth-token-protected CAS API url.
+
+        ``private_key`` may be an RSA private key in PEM format, a
+        ``CASSigner``, or None to use the client's configured signer.
         '''
         auth_token, auth_token_signature = self._build_auth_token_data(
             auth_token_ticket,
@@ -123,6 +221,9 @@ class CASClient(object):
         '''
         Build an auth token login URL.
 
+        ``private_key`` may be an RSA private key in PEM format, a
+        ``CASSigner``, or None to use the client's configured signer.
+
         See https://github.com/rbCAS/CASino/wiki/Auth-Token-Login for details.
         '''
         auth_token, auth_token_signature = self._build_auth_token_data(
@@ -206,6 +307,34 @@ class CASClient(object):
         logging.debug('[CAS] Logout URL: {}'.format(url))
         return url
 
+    def get_proxy_granting_ticket(self, pgt_iou, timeout=10):
+        '''
+        Get the proxy-granting ticket delivered to the proxy callback for
+        ``pgt_iou``, as found in ``CASResponse.proxy_granting_ticket``.
+
+        Blocks for up to ``timeout`` seconds until the callback arrives, and
+        returns None if it never does.
+        '''
+        assert isinstance(
+            self.proxy_granting_ticket_store,
+            CASProxyGrantingTicketStore,
+            )
+        pgt_id = self.proxy_granting_ticket_store.wait(pgt_iou, timeout=timeout)
+        logging.debug('[CAS] PGT for {}: {}'.format(pgt_iou, pgt_id))
+        return pgt_id
+
+    def handle_proxy_callback(self, pgt_iou, pgt_id):
+        '''
+        Record a proxy-granting ticket delivered by the CAS server to the
+        client's proxy callback URL.
+        '''
+        assert isinstance(
+            self.proxy_granting_ticket_store,
+            CASProxyGrantingTicketStore,
+            )
+        logging.debug('[CAS] Proxy callback for {}'.format(pgt_iou))
+        self.proxy_granting_ticket_store.set(pgt_iou, pgt_id)
+
     def parse_logout_request(self, message_text):
         '''
         Parse the contents of a CAS `LogoutRequest` XML message.
@@ -236,6 +365,7 @@ class CASClient(object):
              'xmlns:samlp': 'urn:oasis:names:tc:SAML:2.0:protocol'}
 
         '''
+        started = time.time()
         result = {}
         xml_document = parseString(message_text)
         for node in xml_document.getElementsByTagName('saml:NameId'):
@@ -251,8 +381,30 @@ class CASClient(object):
         logging.debug('[CAS] LogoutRequest:\n{}'.format(
             json.dumps(result, sort_keys=True, indent=4, separators=[',', ': ']),
             ))
+        if self._recorder is not None:
+            self._recorder.record(
+                'logoutRequest',
+                None,
+                None,
+                started,
+                time.time() - started,
+                message_text,
+                )
         return result
 
+    def preload(self, private_keys=()):
+        '''
+        Parse ``private_keys`` (RSA private keys in PEM format) into cached
+        signers and load the client's SSL context now.
+
+        Call this before a pre-forking server forks its workers, so they
+        share the parsed keys and certificates copy-on-write instead of
+        each parsing its own.
+        '''
+        for private_key in private_keys:
+            self._get_signer(private_key)
+        return self.ssl_context
+
     def perform_api_request(
         self,
         url,
@@ -265,10 +417,11 @@ class CASClient(object):
         Perform an auth-token-protected request against a CAS API endpoint.
         '''
         assert method in ('GET', 'POST')
-        if method == 'GET':
-            response = self._perform_get(url, headers=headers, **kwargs)
-        elif method == 'POST':
-            response = self._perform_post(url, headers=headers, data=body, **kwargs)
+        with self._admit('api'):
+            if method == 'GET':
+                response = self._perform_get(url, headers=headers, **kwargs)
+            elif method == 'POST':
+                response = self._perform_post(url, headers=headers, data=body, **kwargs)
         return response
 
     def perform_proxy(self, proxy_ticket, headers=None):
@@ -281,13 +434,24 @@ class CASClient(object):
             url,
             ticket=proxy_ticket,
             headers=headers,
+            single_use=False,
             )
 
-    def perform_proxy_validate(self, proxied_service_ticket, headers=None):
+    def perform_proxy_validate(
+        self,
+        proxied_service_ticket,
+        headers=None,
+        service_url=None,
+        ):
         '''
         Fetch a response from the remote CAS `proxyValidate` endpoint.
+
+        ``service_url`` defaults to the client's proxy callback.
         '''
-        url = self._get_proxy_validate_url(ticket=proxied_service_ticket)
+        url = self._get_proxy_validate_url(
+            ticket=proxied_service_ticket,
+            service_url=service_url,
+            )
         logging.debug('[CAS] ProxyValidate URL: {}'.format(url))
         return self._perform_cas_call(
             url,
@@ -317,6 +481,98 @@ class CASClient(object):
         logging.debug('[CAS] Session [{}] exists: {}'.format(ticket, exists))
         return exists
 
+    def validate_many(
+        self,
+        tickets,
+        max_workers=8,
+        headers=None,
+        as_completed=False,
+        ):
+        '''
+        Validate many (ticket, service URL) pairs concurrently against the
+        remote CAS `proxyValidate` endpoint, which accepts both service and
+        proxy tickets.
+
+        Requests run on a pool of ``max_workers`` threads sharing the client's
+        HTTP session, or a connection pool of the same size created for the
+        batch if the client has none. Each pair yields a ``CASValidation``
+        holding either the ``CASResponse`` or the exception raised while
+        validating it, so one failure never aborts the batch.
+
+        Returns a list in input order, or an iterator in completion order if
+        ``as_completed`` is true.
+
+        ::
+
+            >>> from cas_client import CASClient
+            >>> client = CASClient('https://logmein.com')
+            >>> results = client.validate_many([
+            ...     ('PT-1234', 'http://myservice.net'),
+            ...     ('PT-5678', 'http://myservice.net'),
+            ...     ])  # doctest: +SKIP
+            >>> [result.response.user for result in results if not result.error]  # doctest: +SKIP
+            ['jott', 'jdoe']
+
+        '''
+        tickets = list(tickets)
+        logging.debug('[CAS] Validating {} tickets'.format(len(tickets)))
+        http_session = self.http_session
+        owns_http_session = http_session is None
+        if owns_http_session:
+            http_session = create_http_session(
+                self.ssl_context,
+                pool_maxsize=max_workers,
+                )
+        executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        pending = [
+            executor.submit(
+                self._validate,
+                ticket,
+                service_url,
+                headers,
+                http_session,
+                )
+            for ticket, service_url in tickets
+            ]
+        executor.shutdown(wait=False)
+        if as_completed:
+            return self._iterate_validations(
+                pending,
+                http_session if owns_http_session else None,
+                )
+        try:
+            return [future.result() for future in pending]
+        finally:
+            if owns_http_session:
+                http_session.close()
+
+    def warm_up(self, connections=1, timeout=5):
+        '''
+        Open ``connections`` pooled connections to each of the client's CAS
+        hosts, paying for DNS, TCP and TLS handshakes ahead of the first real
+        request.
+
+        Requires an HTTP session, see ``persistent_connections``. Failures are
+        logged rather than raised; returns True if every host answered.
+        '''
+        assert self.http_session is not None
+        self._warm_up_connections = connections
+        urls = []
+        for url in (self.server_url, self.validate_url):
+            if url not in urls:
+                urls.extend([url] * connections)
+        if len(urls) == 1:
+            return self._ping(urls[0], timeout)
+        executor = futures.ThreadPoolExecutor(max_workers=len(urls))
+        try:
+            results = list(executor.map(
+                lambda url: self._ping(url, timeout),
+                urls,
+                ))
+        finally:
+            executor.shutdown()
+        return all(results)
+
     ### PRIVATE METHODS ###
 
     def _build_auth_token_data(
@@ -326,23 +582,34 @@ class CASClient(object):
         private_key,
         **kwargs
     ):
+        signer = self._get_signer(private_key)
         auth_token = dict(
             authenticator=authenticator,
             ticket=auth_token_ticket,
             **kwargs
             )
+        auth_token.update(_get_token_fields(signer))
         auth_token = json.dumps(auth_token, sort_keys=True)
         if six.PY3:
             auth_token = auth_token.encode('utf-8')
-        digest = SHA256.new()
-        digest.update(auth_token)
+        auth_token_signature = signer.sign(auth_token)
         auth_token = base64.b64encode(auth_token)
-        rsa_key = RSA.importKey(private_key)
-        signer = PKCS1_v1_5.new(rsa_key)
-        auth_token_signature = signer.sign(digest)
         auth_token_signature = base64.b64encode(auth_token_signature)
         return auth_token, auth_token_signature
 
+    def _build_replayed_ticket_response(self, ticket):
+        logging.debug('[CAS] Rejected replayed ticket {}'.format(ticket))
+        return CASResponse(_REPLAYED_TICKET_RESPONSE)
+
+    def _build_cas_response(self, response_text):
+        if response_text:
+            response_text = self._clean_up_response_text(response_text)
+        if response_text:
+            logging.debug('[CAS] Response:\n{}'.format(response_text))
+            return CASResponse(response_text)
+        logging.debug('[CAS] Response: None')
+        return None
+
     def _clean_up_response_text(self, response_text):
         lines = []
         for line in response_text.splitlines():
@@ -388,13 +655,13 @@ class CASClient(object):
             )
         return url
 
-    def _get_proxy_validate_url(self, ticket):
-        template = '{validate_url}{auth_prefix}/proxy?'
-        template += 'ticket={ticket}&service={proxy_callback}'
+    def _get_proxy_validate_url(self, ticket, service_url=None):
+        template = '{validate_url}{auth_prefix}/proxyValidate?'
+        template += 'ticket={ticket}&service={service_url}'
         url = template.format(
             auth_prefix=self.auth_prefix,
-            proxy_callback=self.proxy_callback,
-            validate=self.validate_url,
+            service_url=service_url or self.proxy_callback,
+            validate_url=self.validate_url,
             ticket=ticket,
             )
         return url
@@ -409,49 +676,224 @@ class CASClient(object):
             ticket=ticket,
             )
         if self.proxy_url:
-            url = '{url}&pgtUrl={proxy_url}'.format(url, self.proxy_url)
+            url = '{url}&pgtUrl={proxy_url}'.format(
+                url=url,
+                proxy_url=self.proxy_url,
+                )
         return url
 
-    def _perform_cas_call(self, url, ticket, headers=None):
+    def _get_signer(self, private_key):
+        if private_key is None:
+            assert isinstance(self.signer, CASSigner)
+            return self.signer
+        if isinstance(private_key, CASSigner):
+            return private_key
+        signer = self._signers.get(private_key)
+        if signer is None:
+            signer = self._signers[private_key] = RSASigner(private_key)
+        return signer
+
+    def _iterate_validations(self, pending, http_session=None):
+        try:
+            for future in futures.as_completed(pending):
+                yield future.result()
+        finally:
+            if http_session is not None:
+                http_session.close()
+
+    def _after_fork(self):
+        if self._http_session is not None:
+            _reset_http_session(self._http_session)
+        if self._keepalive_thread is not None:
+            self._keepalive_thread = _KeepaliveThread(
+                self,
+                self._keepalive_interval,
+                )
+            self._keepalive_thread.start()
+
+    def _admit(self, priority):
+        if self._admission_controller is None:
+            return _null_context()
+        return self._admission_controller.admit(priority)
+
+    def _perform_cas_call(self, url, ticket, headers=None, single_use=True):
+        # Proxy granting tickets are reusable, so only single-use tickets go
+        # through the replay filter.
         if ticket is not None:
             logging.debug('[CAS] Requesting Ticket Validation')
-            response_text = self._perform_get(url, headers=headers)
-            response_text = self._clean_up_response_text(response_text)
-            if response_text:
-                logging.debug('[CAS] Response:\n{}'.format(response_text))
-                return CASResponse(response_text)
+            if single_use and self._is_replayed_ticket(ticket):
+                return self._build_replayed_ticket_response(ticket)
+            with self._admit('validate'):
+                if self.stream_responses:
+                    response = self._perform_streaming_get(url, headers=headers)
+                else:
+                    response_text = self._perform_get(url, headers=headers)
+            if not self.stream_responses:
+                response = self._build_cas_response(response_text)
+            if single_use:
+                self._remember_ticket(ticket, response)
+            return response
         logging.debug('[CAS] Response: None')
         return None
 
-    def _perform_get(self, url, headers=None, **kwargs):
+    def _perform_get(self, url, headers=None, http_session=None, **kwargs):
         headers = headers or self.headers
+        http_session = http_session or self.http_session or requests
+        started = time.time()
         try:
-            response = requests.get(
+            response = http_session.get(
                 url,
                 verify=self.verify_certificates,
                 headers=headers,
                 **kwargs
                 )
-            return response.text
+            text = response.text
         except requests.HTTPError:
-            return None
+            text = None
+        self._record_call('GET', url, started, text)
+        return text
 
-    def _perform_post(self, url, headers=None, data=None, **kwargs):
+    def _perform_post(self, url, headers=None, data=None, http_session=None, **kwargs):
         headers = headers or self.headers
+        http_session = http_session or self.http_session or requests
+        started = time.time()
         try:
-            response = requests.post(
+            response = http_session.post(
                 url,
                 verify=self.verify_certificates,
                 headers=headers,
                 data=data,
                 **kwargs
                 )
-            return response.text
+            text = response.text
         except requests.HTTPError:
+            text = None
+        self._record_call('POST', url, started, text)
+        return text
+
+    def _perform_streaming_get(self, url, headers=None, http_session=None):
+        headers = headers or self.headers
+        http_session = http_session or self.http_session or requests
+        started = time.time()
+        try:
+            response = http_session.get(
+                url,
+                verify=self.verify_certificates,
+                headers=headers,
+                stream=True,
+                )
+        except requests.HTTPError:
+            self._record_call('GET', url, started, None)
             return None
+        with contextlib.closing(response):
+            content_length = response.headers.get('Content-Length')
+            if (
+                self.max_response_size is not None and
+                content_length is not None and
+                int(content_length) > self.max_response_size
+                ):
+                raise CASResponseTooLargeError(
+                    'Content-Length {} exceeds {} bytes'.format(
+                        content_length, self.max_response_size))
+            response.raw.decode_content = True
+            reader = _CappedReader(
+                response.raw,
+                self.max_response_size,
+                capture=self._recorder is not None,
+                )
+            try:
+                cas_response = CASResponse.from_file(reader)
+            except ExpatError:
+                if not reader.is_blank:
+                    raise
+                cas_response = None
+        logging.debug('[CAS] Response: {} ({} bytes)'.format(
+            cas_response and cas_response.response_type, reader.size))
+        if reader.chunks is not None:
+            self._record_call(
+                'GET',
+                url,
+                started,
+                b''.join(reader.chunks).decode('utf-8'),
+                )
+        return cas_response
+
+    def _record_call(self, method, url, started, text):
+        if self._recorder is None:
+            return
+        self._recorder.record(
+            _get_call_kind(url),
+            method,
+            url,
+            started,
+            time.time() - started,
+            text,
+            )
+
+    def _is_replayed_ticket(self, ticket):
+        return (
+            self._ticket_replay_filter is not None and
+            ticket in self._ticket_replay_filter
+            )
+
+    def _remember_ticket(self, ticket, response):
+        # Only tickets CAS answered for are spent; a failed call may be retried.
+        if self._ticket_replay_filter is not None and response is not None:
+            self._ticket_replay_filter.add(ticket)
+
+    def _ping(self, url, timeout):
+        try:
+            self.http_session.head(
+                url,
+                headers=self.headers,
+                timeout=timeout,
+                verify=self.verify_certificates,
+                )
+        except requests.RequestException as exception:
+            logging.warning('[CAS] Warm-up of {} failed: {!r}'.format(
+                url, exception))
+            return False
+        return True
+
+    def _validate(self, ticket, service_url, headers, http_session):
+        if self._is_replayed_ticket(ticket):
+            response = self._build_replayed_ticket_response(ticket)
+            return CASValidation(ticket, service_url, response, None)
+        try:
+            url = self._get_proxy_validate_url(ticket, service_url=service_url)
+            logging.debug('[CAS] ProxyValidate URL: {}'.format(url))
+            with self._admit('validate'):
+                if self.stream_responses:
+                    response = self._perform_streaming_get(
+                        url,
+                        headers=headers,
+                        http_session=http_session,
+                        )
+                else:
+                    response_text = self._perform_get(
+                        url,
+                        headers=headers,
+                        http_session=http_session,
+                        )
+            if not self.stream_responses:
+                response = self._build_cas_response(response_text)
+        except Exception as exception:
+            logging.debug('[CAS] Validation of {} failed: {!r}'.format(
+                ticket, exception))
+            return CASValidation(ticket, service_url, None, exception)
+        self._remember_ticket(ticket, response)
+        return CASValidation(ticket, service_url, response, None)
 
     ### PUBLIC PROPERTIES ###
 
+    @property
+    def admission_controller(self):
+        '''
+        The CAS client's admission controller for calls to the CAS server,
+        if any.
+        '''
+        return self._admission_controller
+
     @property
     def auth_prefix(self):
         '''
@@ -463,6 +905,29 @@ class CASClient(object):
     def headers(self):
         return self._headers
 
+    @property
+    def http_session(self):
+        '''
+        The ``requests.Session`` used for pooling connections to the CAS
+        server, if any.
+
+        Without one, each call goes through the top-level ``requests``
+        functions and opens a fresh connection. With
+        ``persistent_connections``, the client creates its own, sharing the
+        client's ``ssl_context`` between up to ``pool_maxsize`` connections
+        per host.
+        '''
+        return self._http_session
+
+    @property
+    def max_response_size(self):
+        '''
+        Maximum size in bytes of a streamed CAS response body.
+
+        Larger bodies raise ``CASResponseTooLargeError``. None means no limit.
+        '''
+        return self._max_response_size
+
     @property
     def proxy_callback(self):
         '''
@@ -470,6 +935,14 @@ class CASClient(object):
         '''
         return self._proxy_callback
 
+    @property
+    def proxy_granting_ticket_store(self):
+        '''
+        The CAS client's store for proxy-granting tickets received by its
+        proxy callback.
+        '''
+        return self._proxy_granting_ticket_store
+
     @property
     def proxy_url(self):
         '''
@@ -477,6 +950,13 @@ class CASClient(object):
         '''
         return self._proxy_url
 
+    @property
+    def recorder(self):
+        '''
+        The CAS client's traffic recorder, if capturing.
+        '''
+        return self._recorder
+
     @property
     def server_url(self):
         '''
@@ -501,6 +981,45 @@ class CASClient(object):
         '''
         return self._session_storage_adapter
 
+    @property
+    def signer(self):
+        '''
+        The CAS client's default ``CASSigner`` for auth tokens, used when no
+        private key is passed to ``get_api_url`` or
+        ``get_auth_token_login_url``.
+        '''
+        return self._signer
+
+    @property
+    def ssl_context(self):
+        '''
+        The CAS client's SSL context, created once with its ``ca_bundle``
+        and reused by every connection the client pools.
+        '''
+        if self._ssl_context is None:
+            self._ssl_context = create_ssl_context(
+                ca_bundle=self._ca_bundle,
+                verify_certificates=self.verify_certificates,
+                )
+        return self._ssl_context
+
+    @property
+    def stream_responses(self):
+        '''
+        Flag for controlling whether ticket validation responses are parsed
+        incrementally as they are read from the connection, rather than
+        buffered and decoded in full first.
+        '''
+        return self._stream_responses
+
+    @property
+    def ticket_replay_filter(self):
+        '''
+        The CAS client's filter of already validated tickets, which are
+        rejected locally, if any.
+        '''
+        return self._ticket_replay_filter
+
     @property
     def validate_url(self):
         '''
@@ -520,6 +1039,12 @@ class CASClient(object):
         return self._verify_certificates
 
 
+CASValidation = collections.namedtuple(
+    'CASValidation',
+    ['ticket', 'service_url', 'response', 'error'],
+    )
+
+
 class CASResponse(object):
     '''
     A CAS response object.
@@ -529,6 +1054,35 @@ class CASResponse(object):
         self.response_text = response_text
         self.response_type, cas_data = self._parse_cas_xml_response(
             response_text)
+        self._set_cas_data(cas_data)
+
+    ### PUBLIC METHODS ###
+
+    @classmethod
+    def from_file(cls, file_pointer, chunk_size=65536):
+        '''
+        Parse a CAS response incrementally from a file-like object.
+
+        The response data is built from parser events as the body is read,
+        without a DOM, and the response text is not kept, so
+        ``response_text`` is None.
+        '''
+        handler = _CASResponseHandler()
+        parser = handler.create_parser()
+        while True:
+            data = file_pointer.read(chunk_size)
+            parser.Parse(data, not data)
+            if not data:
+                break
+        response = cls.__new__(cls)
+        response.response_text = None
+        response.response_type = handler.cas_type
+        response._set_cas_data(handler.cas_data)
+        return response
+
+    ### PRIVATE METHODS ###
+
+    def _set_cas_data(self, cas_data):
         self.success = 'success' in self.response_type.lower()
         self.data = cas_data.get(self.response_type)
         if isinstance(self.data, dict):
@@ -538,6 +1092,7 @@ class CASResponse(object):
             self.error = cas_data
         self.user = self.data.get('user')
         self.attributes = self.data.get('attributes')
+        self.proxy_granting_ticket = self.data.get('proxyGrantingTicket')
 
     @classmethod
     def _parse_cas_xml_response(cls, response_text):
@@ -545,7 +1100,12 @@ class CASResponse(object):
         cas_data = {}
         if not response_text:
             return cas_type, cas_data
-        xml_document = parseString(response_text)
+        return cls._parse_cas_xml_document(parseString(response_text))
+
+    @classmethod
+    def _parse_cas_xml_document(cls, xml_document):
+        cas_type = 'noResponse'
+        cas_data = {}
         node_element = xml_document.documentElement
         if node_element.nodeName != 'cas:serviceResponse':
             raise Exception
@@ -574,13 +1134,216 @@ class CASResponse(object):
         return result
 
 
+class CASProxyGrantingTicketStore(object):
+    '''
+    Abstract base class for proxy-granting ticket stores.
+
+    Maps the pgtIou handed back by ticket validation to the pgtId delivered
+    separately to the proxy callback. Waiters are woken as soon as a callback
+    is stored by the same process; backends shared between processes also
+    re-check every ``poll_interval`` seconds.
+    '''
+
+    __metaclass__ = abc.ABCMeta
+
+    poll_interval = None
+
+    def __init__(self, ttl=60):
+        self._condition = threading.Condition()
+        self._generation = 0
+        register_after_fork(self)
+        self._ttl = ttl
+        self._metrics = {
+            'callbacks': 0,
+            'hits': 0,
+            'misses': 0,
+            'handoff_seconds_max': 0.,
+            'handoff_seconds_total': 0.,
+            }
+
+    ### PUBLIC METHODS ###
+
+    def set(self, pgt_iou, pgt_id):
+        '''
+        Store ``pgt_id`` for ``pgt_iou`` and wake any waiters.
+        '''
+        self._set(str(pgt_iou), pgt_id, time.time())
+        with self._condition:
+            self._generation += 1
+            self._metrics['callbacks'] += 1
+            self._condition.notify_all()
+
+    def wait(self, pgt_iou, timeout=None):
+        '''
+        Pop the pgtId stored for ``pgt_iou``, waiting up to ``timeout``
+        seconds for it to arrive.
+
+        Returns None on timeout.
+        '''
+        pgt_iou = str(pgt_iou)
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._condition:
+                generation = self._generation
+            record = self._get(pgt_iou)
+            if record is not None:
+                self._delete(pgt_iou)
+                pgt_id, stored_at = record
+                self._record_hit(time.time() - stored_at)
+                return pgt_id
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                with self._condition:
+                    self._metrics['misses'] += 1
+                return None
+            if self.poll_interval is not None and (
+                    remaining is None or remaining > self.poll_interval):
+                remaining = self.poll_interval
+            with self._condition:
+                if self._generation == generation:
+                    self._condition.wait(remaining)
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        self._condition = threading.Condition()
+
+    @abc.abstractmethod
+    def _delete(self, pgt_iou):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _get(self, pgt_iou):
+        raise NotImplementedError
+
+    def _record_hit(self, handoff_seconds):
+        with self._condition:
+            self._metrics['hits'] += 1
+            self._metrics['handoff_seconds_total'] += handoff_seconds
+            self._metrics['handoff_seconds_max'] = max(
+                self._metrics['handoff_seconds_max'],
+                handoff_seconds,
+                )
+
+    @abc.abstractmethod
+    def _set(self, pgt_iou, pgt_id, stored_at):
+        raise NotImplementedError
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def metrics(self):
+        '''
+        Callback, hit and miss counts, and the time between callbacks
+        arriving and their pgtId being handed to a waiter.
+        '''
+        with self._condition:
+            metrics = dict(self._metrics)
+        if metrics['hits']:
+            metrics['handoff_seconds_mean'] = (
+                metrics['handoff_seconds_total'] / metrics['hits'])
+        else:
+            metrics['handoff_seconds_mean'] = 0.
+        return metrics
+
+    @property
+    def ttl(self):
+        '''
+        Seconds a pgtId is kept while nobody claims it.
+        '''
+        return self._ttl
+
+
+class MemcachedCASProxyGrantingTicketStore(CASProxyGrantingTicketStore):
+    r'''A Memcached proxy-granting ticket store.
+
+    Shared between processes, so callbacks received by another worker are
+    picked up by polling every ``poll_interval`` seconds.
+    '''
+
+    def __init__(self, client, ttl=60, poll_interval=0.05):
+        CASProxyGrantingTicketStore.__init__(self, ttl=ttl)
+        self._client = client
+        self.poll_interval = poll_interval
+
+    def _delete(self, pgt_iou):
+        self._client.delete(pgt_iou)
+
+    def _get(self, pgt_iou):
+        return self._client.get(pgt_iou)
+
+    def _set(self, pgt_iou, pgt_id, stored_at):
+        self._client.set(pgt_iou, (pgt_id, stored_at), self.ttl)
+
+
+class MemoryCASProxyGrantingTicketStore(CASProxyGrantingTicketStore):
+    r'''An in-process proxy-granting ticket store.
+
+    ::
+
+        >>> from cas_client import MemoryCASProxyGrantingTicketStore
+        >>> store = MemoryCASProxyGrantingTicketStore()
+        >>> store.set('PGTIOU-1234', 'PGT-1234')
+        >>> store.wait('PGTIOU-1234', timeout=1)
+        'PGT-1234'
+        >>> store.wait('PGTIOU-1234', timeout=0) is None
+        True
+
+    '''
+
+    def __init__(self, ttl=60):
+        CASProxyGrantingTicketStore.__init__(self, ttl=ttl)
+        self._lock = threading.Lock()
+        self._records = collections.OrderedDict()
+
+    def _after_fork(self):
+        CASProxyGrantingTicketStore._after_fork(self)
+        self._lock = threading.Lock()
+
+    def _delete(self, pgt_iou):
+        with self._lock:
+            self._records.pop(pgt_iou, None)
+
+    def _get(self, pgt_iou):
+        with self._lock:
+            record = self._records.get(pgt_iou)
+        if record is None or record[1] <= time.time() - self.ttl:
+            return None
+        return record
+
+    def _set(self, pgt_iou, pgt_id, stored_at):
+        with self._lock:
+            self._records.pop(pgt_iou, None)
+            self._records[pgt_iou] = (pgt_id, stored_at)
+            expired_at = stored_at - self.ttl
+            while self._records:
+                _, (_, oldest) = next(iter(self._records.items()))
+                if oldest > expired_at:
+                    break
+                self._records.popitem(last=False)
+
+
+class CASResponseTooLargeError(Exception):
+    '''
+    Raised when a streamed CAS response exceeds the client's
+    ``max_response_size``.
+    '''
+    pass
+
+
 class CASSessionAdapter(object):
     '''
     Abstract base class for session adapters.
+
+    Adapters with a ``codec`` store payloads encoded by it. Adapters created
+    with ``index_users`` also keep an index from each payload's ``user`` to
+    that user's tickets, for ``delete_user_sessions``.
     '''
 
     __metaclass__ = abc.ABCMeta
 
+    codec = None
+
     @abc.abstractmethod
     def create(self, ticket, payload=None, expires=None):
         '''
@@ -595,6 +1358,13 @@ class CASSessionAdapter(object):
         '''
         raise NotImplementedError
 
+    def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, returning
+        how many of them had not expired yet.
+        '''
+        raise NotImplementedError
+
     @abc.abstractmethod
     def exists(self, ticket):
         '''
@@ -602,12 +1372,89 @@ class CASSessionAdapter(object):
         '''
         raise NotImplementedError
 
+    def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, or None
+        if there is no such session.
+        '''
+        raise NotImplementedError
+
+    def touch(self, ticket, expires):
+        '''
+        Reset the time-to-live of the session associated with ``ticket`` to
+        ``expires`` seconds.
+        '''
+        raise NotImplementedError
+
+    def touch_many(self, tickets, expires):
+        '''
+        Reset the time-to-live of the sessions associated with ``tickets``
+        to ``expires`` seconds.
+
+        Adapters whose store can batch commands should override this, e.g.
+        with one pipelined round trip of Redis ``EXPIRE`` commands.
+        '''
+        for ticket in tickets:
+            self.touch(ticket, expires)
+
+    def _decode(self, value):
+        # Payloads stored before the adapter had a codec are returned as is.
+        if self.codec is None or not isinstance(value, bytes):
+            return value
+        return self.codec.decode(value)
+
+    def _encode(self, payload):
+        if self.codec is None:
+            return payload
+        return self.codec.encode(payload)
+
 
 class MemcachedCASSessionAdapter(CASSessionAdapter):
-    r'''A Memcached session adapter.'''
+    r'''A Memcached session adapter.
+
+    Payloads are stored as given, for the memcached client to serialize
+    (usually with pickle), unless a ``codec`` such as
+    ``BinaryCASSessionCodec`` is given to encode them instead. Payloads
+    stored before a codec was configured are still read back as is.
+
+    With ``index_users``, each user's tickets are logged under one more key
+    with atomic memcached ``append`` commands, so concurrent workers never
+    overwrite each other's entries. Each ``create`` then also sends an
+    ``add`` and an ``append`` for the index, and a ``get`` to check the entry
+    landed, plus a ``touch`` when the entry extends the index's lifetime;
+    each ``delete`` also sends a ``get`` of the session and an ``append``.
+    On pymemcache clients the ``add`` and ``append`` commands are sent with
+    ``noreply``, so they cost no round trips of their own. Indexes past
+    ``index_compact_size`` bytes, or whose entry was lost because the index
+    was evicted or full, are rewritten with only the tickets whose sessions
+    still exist, at the cost of a ``get_many`` and a ``set`` (``gets`` and
+    ``cas`` if the client supports them).
+
+    By default, indexes never expire, as sessions kept alive by sliding
+    expiry may outlive any time-to-live, and are left to memcached's LRU
+    eviction. With ``index_expires``, each entry keeps the index alive for
+    at least that long, or as long as its session's ``expires`` if longer,
+    or forever for sessions without ``expires``; the index's time-to-live
+    is only ever extended. Concurrent logins of one user racing their
+    ``touch`` commands may still leave the index one entry's lifetime short.
+    '''
 
-    def __init__(self, client):
+    def __init__(
+        self,
+        client,
+        codec=None,
+        index_users=False,
+        index_expires=None,
+        index_compact_size=16384,
+        ):
         self._client = client
+        self.codec = codec
+        self._index_users = bool(index_users)
+        self._index_expires = index_expires
+        self._index_compact_size = index_compact_size
+        # pymemcache clients have ``default_noreply``; python-memcached ones
+        # wait for every reply.
+        self._noreply = hasattr(client, 'default_noreply')
 
     def create(self, ticket, payload=None, expires=None):
         '''
@@ -615,24 +1462,724 @@ class MemcachedCASSessionAdapter(CASSessionAdapter):
         '''
         if not payload:
             payload = True
-        self._client.set(str(ticket), payload, expires)
+        self._client.set(str(ticket), self._encode(payload), expires)
+        user = _get_payload_user(payload) if self._index_users else None
+        if user is not None:
+            self._append_index_entry(user, b'+', ticket, expires)
 
     def delete(self, ticket):
         '''
         Destroy a session identifier in memcache associated with ``ticket``.
         '''
+        if self._index_users:
+            try:
+                payload = self.get(ticket)
+            except CASSessionCodecError:
+                # The index drops the ticket when next compacted.
+                logging.warning('[CAS] Undecodable session for {}'.format(ticket))
+                payload = None
+            user = _get_payload_user(payload)
+            if user is not None:
+                self._append_index_entry(user, b'-', ticket, None)
         self._client.delete(str(ticket))
 
+    def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, with one
+        batched memcached delete, returning how many of them had not expired
+        yet.
+        '''
+        assert self._index_users
+        key = _get_user_index_key(user)
+        tickets = list(_parse_user_index(self._client.get(key)))
+        live = self._get_existing_keys(tickets) if tickets else ()
+        delete_many = getattr(self._client, 'delete_many', None)
+        if delete_many is None:
+            delete_many = self._client.delete_multi
+        delete_many(tickets + [key])
+        return len(live)
+
     def exists(self, ticket):
         '''
         Test if a session identifier exists for ``ticket``.
         '''
         return self._client.get(str(ticket)) is not None
 
+    def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, or None
+        if there is no such session.
+        '''
+        value = self._client.get(str(ticket))
+        if value is None:
+            return None
+        return self._decode(value)
+
+    def touch(self, ticket, expires):
+        '''
+        Reset the time-to-live of the session associated with ``ticket`` to
+        ``expires`` seconds, with a memcached ``touch``.
+        '''
+        self._client.touch(str(ticket), expires)
+
+    def touch_many(self, tickets, expires):
+        '''
+        Reset the time-to-live of the sessions associated with ``tickets``
+        to ``expires`` seconds, with one multi-key touch if the client has
+        one, or otherwise with ``noreply`` touches, which pymemcache sends
+        without waiting for each reply.
+        '''
+        keys = [str(ticket) for ticket in tickets]
+        for name in ('touch_many', 'touch_multi'):
+            touch_many = getattr(self._client, name, None)
+            if touch_many is not None:
+                touch_many(keys, expires)
+                return
+        # python-memcached touches cost a round trip each.
+        if self._noreply:
+            for key in keys:
+                self._client.touch(key, expires, noreply=True)
+            return
+        for key in keys:
+            self._client.touch(key, expires)
+
+    def _append_index_entry(self, user, operation, ticket, expires):
+        key = _get_user_index_key(user)
+        ticket = str(ticket)
+        noreply = {'noreply': True} if self._noreply else {}
+        if operation == b'-':
+            self._client.append(
+                key,
+                b'-' + ticket.encode('utf-8') + b' ',
+                **noreply
+                )
+            return
+        deadline = self._get_index_deadline(expires)
+        # ``add`` is a no-op if the index exists; ``append`` is atomic.
+        self._client.add(key, b'', _get_memcached_expires(deadline), **noreply)
+        self._client.append(
+            key,
+            _format_user_index_entry(ticket, deadline),
+            **noreply
+            )
+        # Clients differ in whether ``append`` reports failure, so check.
+        value = self._client.get(key)
+        entries = _parse_user_index(value)
+        if (
+            entries.get(ticket) != deadline or
+            len(value) >= self._index_compact_size
+            ):
+            self._compact_index(key, ticket, deadline)
+        elif (
+            self._index_expires is not None and
+            _get_user_index_deadline(entries) == deadline
+            ):
+            self._client.touch(key, _get_memcached_expires(deadline))
+
+    def _compact_index(self, key, ticket, deadline):
+        for _ in range(3):
+            value, token = self._get_index_for_update(key)
+            entries = _parse_user_index(value)
+            entries[ticket] = deadline
+            live = self._get_existing_keys(list(entries))
+            entries = collections.OrderedDict(
+                (entry_ticket, entry_deadline)
+                for entry_ticket, entry_deadline in entries.items()
+                if entry_ticket in live or entry_ticket == ticket
+                )
+            value = b''.join(
+                _format_user_index_entry(entry_ticket, entry_deadline)
+                for entry_ticket, entry_deadline in entries.items()
+                )
+            expires = _get_memcached_expires(_get_user_index_deadline(entries))
+            if token is None:
+                self._client.set(key, value, expires)
+                return
+            if self._client.cas(key, value, token, expires):
+                return
+        logging.warning('[CAS] Failed compacting user index {}'.format(key))
+
+    def _get_existing_keys(self, keys):
+        get_many = getattr(self._client, 'get_many', None)
+        if get_many is None:
+            get_many = self._client.get_multi
+        return set(get_many(keys))
+
+    def _get_index_deadline(self, expires):
+        # 0 keeps the index forever.
+        if self._index_expires is None or not expires:
+            return 0
+        return int(time.time() + max(expires, self._index_expires)) + 1
+
+    def _get_index_for_update(self, key):
+        # pymemcache's ``gets`` returns the value and its CAS token.
+        if hasattr(self._client, 'gets') and hasattr(self._client, 'cas'):
+            result = self._client.gets(key)
+            if isinstance(result, tuple):
+                return result
+        return self._client.get(key), None
+
+
+class MemoryCASSessionAdapter(CASSessionAdapter):
+    r'''An in-process session adapter.
+
+    Only suitable for single-process deployments, development and testing, as
+    sessions are not shared between worker processes.
+
+    ::
+
+        >>> from cas_client import MemoryCASSessionAdapter
+        >>> adapter = MemoryCASSessionAdapter()
+        >>> adapter.create('ST-1234', payload={'user': 'jott'}, expires=60)
+        >>> adapter.exists('ST-1234')
+        True
+        >>> adapter.get('ST-1234')
+        {'user': 'jott'}
+        >>> adapter.delete('ST-1234')
+        >>> adapter.exists('ST-1234')
+        False
+
+    '''
+
+    def __init__(self, codec=None, index_users=False):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._users = {}
+        self._index_users = bool(index_users)
+        self.codec = codec
+        register_after_fork(self)
+
+    def create(self, ticket, payload=None, expires=None):
+        '''
+        Create a session identifier in memory associated with ``ticket``.
+
+        ``expires`` is a time-to-live in seconds, as for memcached.
+        '''
+        if not payload:
+            payload = True
+        user = _get_payload_user(payload) if self._index_users else None
+        expires_at = time.time() + expires if expires else None
+        payload = self._encode(payload)
+        ticket = str(ticket)
+        with self._lock:
+            self._remove_record(ticket)
+            self._sessions[ticket] = (payload, expires_at, user)
+            if user is not None:
+                self._users.setdefault(user, set()).add(ticket)
+
+    def delete(self, ticket):
+        '''
+        Destroy a session identifier in memory associated with ``ticket``.
+        '''
+        with self._lock:
+            self._remove_record(str(ticket))
+
+    def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, returning
+        how many of them had not expired yet.
+        '''
+        assert self._index_users
+        now = time.time()
+        count = 0
+        with self._lock:
+            for ticket in self._users.pop(user, ()):
+                record = self._sessions.pop(ticket)
+                if record[1] is None or record[1] > now:
+                    count += 1
+        return count
+
+    def exists(self, ticket):
+        '''
+        Test if a session identifier exists for ``ticket``.
+        '''
+        return self._get_record(str(ticket)) is not None
+
+    def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, or None
+        if there is no such session.
+        '''
+        record = self._get_record(str(ticket))
+        if record is None:
+            return None
+        return self._decode(record[0])
+
+    def touch(self, ticket, expires):
+        '''
+        Reset the time-to-live of the session associated with ``ticket`` to
+        ``expires`` seconds.
+        '''
+        self.touch_many([ticket], expires)
+
+    def touch_many(self, tickets, expires):
+        '''
+        Reset the time-to-live of the sessions associated with ``tickets``
+        to ``expires`` seconds.
+        '''
+        expires_at = time.time() + expires if expires else None
+        with self._lock:
+            for ticket in tickets:
+                record = self._sessions.get(str(ticket))
+                if record is not None:
+                    self._sessions[str(ticket)] = (
+                        record[0],
+                        expires_at,
+                        record[2],
+                        )
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _get_record(self, ticket):
+        with self._lock:
+            record = self._sessions.get(ticket)
+            if record is None:
+                return None
+            expires_at = record[1]
+            if expires_at is not None and expires_at <= time.time():
+                self._remove_record(ticket)
+                return None
+        return record
+
+    def _remove_record(self, ticket):
+        record = self._sessions.pop(ticket, None)
+        if record is None or record[2] is None:
+            return
+        tickets = self._users[record[2]]
+        tickets.discard(ticket)
+        if not tickets:
+            del self._users[record[2]]
+
+
+class SlidingExpiryCASSessionAdapter(CASSessionAdapter):
+    r'''A session adapter wrapper giving sessions a sliding expiry.
+
+    Sessions found by ``exists`` or ``get`` are noted in memory, and a
+    background thread resets their time-to-live to ``expires`` seconds every
+    ``flush_interval`` seconds (or only on ``flush`` if it is None), with
+    one ``touch_many`` call on the wrapped adapter per ``batch_size``
+    sessions. A session is touched at most once
+    every ``min_touch_interval`` seconds, however often it is used, so active
+    sessions cost one extra store command per ``min_touch_interval`` rather
+    than one per request. Touches are best effort: a batch that fails is
+    logged and dropped.
+
+    ::
+
+        >>> from cas_client import (
+        ...     MemoryCASSessionAdapter,
+        ...     SlidingExpiryCASSessionAdapter,
+        ...     )
+        >>> adapter = SlidingExpiryCASSessionAdapter(
+        ...     MemoryCASSessionAdapter(),
+        ...     expires=1800,
+        ...     flush_interval=None,
+        ...     min_touch_interval=0,
+        ...     )
+        >>> adapter.create('ST-1234')
+        >>> adapter.exists('ST-1234')
+        True
+        >>> adapter.flush()
+        1
+        >>> adapter.close()
+
+    '''
+
+    def __init__(
+        self,
+        adapter,
+        expires,
+        flush_interval=5,
+        min_touch_interval=60,
+        batch_size=100,
+        ):
+        assert expires
+        self._adapter = adapter
+        self._expires = expires
+        self._flush_interval = flush_interval
+        self._min_touch_interval = min_touch_interval
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()
+        self._touched = {}
+        self._flush_thread = None
+        register_after_fork(self)
+        self._metrics = {
+            'batches': 0,
+            'failures': 0,
+            'skipped': 0,
+            'touches': 0,
+            }
+
+    ### PUBLIC METHODS ###
+
+    def close(self):
+        '''
+        Stop the flush thread and flush any pending touches.
+        '''
+        with self._lock:
+            flush_thread, self._flush_thread = self._flush_thread, None
+        if flush_thread is not None:
+            flush_thread.stop()
+        self.flush()
+
+    def create(self, ticket, payload=None, expires=None):
+        '''
+        Create a session identifier associated with ``ticket``, expiring
+        after ``expires`` seconds (the sliding expiry by default).
+        '''
+        self._adapter.create(
+            ticket,
+            payload=payload,
+            expires=expires or self._expires,
+            )
+        with self._lock:
+            self._touched[str(ticket)] = time.time()
+
+    def delete(self, ticket):
+        '''
+        Destroy a session identifier associated with ``ticket``.
+        '''
+        with self._lock:
+            self._pending.pop(str(ticket), None)
+            self._touched.pop(str(ticket), None)
+        self._adapter.delete(ticket)
+
+    def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, returning
+        how many of them had not expired yet.
+        '''
+        return self._adapter.delete_user_sessions(user)
+
+    def exists(self, ticket):
+        '''
+        Test if a session identifier exists for ``ticket``, noting it for a
+        touch if so.
+        '''
+        exists = self._adapter.exists(ticket)
+        if exists:
+            self._note_activity(str(ticket))
+        return exists
+
+    def flush(self):
+        '''
+        Touch every pending session now, returning how many were touched.
+        '''
+        count = 0
+        while True:
+            with self._lock:
+                batch = []
+                while self._pending and len(batch) < self._batch_size:
+                    batch.append(self._pending.popitem(last=False)[0])
+                self._prune_touched(time.time())
+            if not batch:
+                return count
+            try:
+                self._adapter.touch_many(batch, self._expires)
+            except Exception:
+                logging.exception('[CAS] Failed touching {} sessions'.format(
+                    len(batch)))
+                with self._lock:
+                    self._metrics['failures'] += 1
+                continue
+            count += len(batch)
+            with self._lock:
+                self._metrics['batches'] += 1
+                self._metrics['touches'] += len(batch)
+
+    def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, noting
+        it for a touch if there is one.
+        '''
+        payload = self._adapter.get(ticket)
+        if payload is not None:
+            self._note_activity(str(ticket))
+        return payload
+
+    def touch(self, ticket, expires):
+        '''
+        Reset the time-to-live of the session associated with ``ticket`` to
+        ``expires`` seconds, immediately.
+        '''
+        self._adapter.touch(ticket, expires)
+
+    def touch_many(self, tickets, expires):
+        '''
+        Reset the time-to-live of the sessions associated with ``tickets``
+        to ``expires`` seconds, immediately.
+        '''
+        self._adapter.touch_many(tickets, expires)
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        # The parent flushes the touches it had pending; the flush thread
+        # is restarted on the child's first activity.
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()
+        self._flush_thread = None
+
+    def _note_activity(self, ticket):
+        now = time.time()
+        with self._lock:
+            touched = self._touched.get(ticket)
+            if touched is not None and now - touched < self._min_touch_interval:
+                self._metrics['skipped'] += 1
+                return
+            self._touched[ticket] = now
+            self._pending[ticket] = None
+            if self._flush_thread is None and self._flush_interval:
+                self._flush_thread = _SessionFlushThread(
+                    self,
+                    self._flush_interval,
+                    )
+                self._flush_thread.start()
+
+    def _prune_touched(self, now):
+        if len(self._touched) <= 2 * self._batch_size:
+            return
+        for ticket, touched in list(self._touched.items()):
+            if now - touched >= self._min_touch_interval:
+                del self._touched[ticket]
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def adapter(self):
+        '''
+        The wrapped session adapter.
+        '''
+        return self._adapter
+
+    @property
+    def expires(self):
+        '''
+        The sliding time-to-live, in seconds, sessions are touched to.
+        '''
+        return self._expires
+
+    @property
+    def metrics(self):
+        '''
+        Counts of touch batches flushed, sessions touched, touches skipped
+        by the per-session rate limit and failed batches, plus the number
+        of touches pending.
+        '''
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['pending'] = len(self._pending)
+        return metrics
+
+
+class _SessionFlushThread(threading.Thread):
+
+    def __init__(self, adapter, interval):
+        threading.Thread.__init__(self, name='cas-client-session-flush')
+        self.daemon = True
+        self._adapter = weakref.ref(adapter)
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            adapter = self._adapter()
+            if adapter is None:
+                return
+            adapter.flush()
+            del adapter
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _get_payload_user(payload):
+    if isinstance(payload, dict):
+        return payload.get('user')
+    return None
+
+
+def _get_user_index_key(user):
+    if not isinstance(user, bytes):
+        user = user.encode('utf-8')
+    return 'cas-user-' + hashlib.sha256(user).hexdigest()
+
+
+def _format_user_index_entry(ticket, deadline):
+    return '+{}:{} '.format(ticket, deadline).encode('utf-8')
+
+
+def _get_memcached_expires(deadline):
+    if not deadline:
+        return 0
+    expires = max(1, deadline - int(time.time()))
+    # Memcached reads times-to-live past 30 days as Unix timestamps.
+    if expires > 2592000:
+        return deadline
+    return expires
+
+
+def _get_user_index_deadline(entries):
+    deadlines = list(entries.values())
+    if not deadlines or 0 in deadlines:
+        return 0
+    return max(deadlines)
+
+
+def _parse_user_index(value):
+    # Maps tickets to the deadline their entry keeps the index until, or 0.
+    tickets = collections.OrderedDict()
+    if not value:
+        return tickets
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    for entry in value.split():
+        ticket, separator, deadline = entry[1:].rpartition(b':')
+        if not separator or not deadline.isdigit():
+            ticket, deadline = entry[1:], b'0'
+        ticket = ticket.decode('utf-8')
+        if entry[:1] == b'+':
+            tickets[ticket] = int(deadline)
+        else:
+            tickets.pop(ticket, None)
+    return tickets
+
+
+@contextlib.contextmanager
+def _null_context():
+    yield
+
+
+def _get_call_kind(url):
+    path = urlparse(url).path
+    if '/api/' in path:
+        return 'api/' + path.split('/api/', 1)[1]
+    return path.rstrip('/').rsplit('/', 1)[-1]
+
+
+class _CASResponseHandler(object):
+    # Builds what ``CASResponse._parse_cas_xml_document`` builds from a DOM,
+    # straight from expat events. Text runs are split by the same nodes a
+    # DOM splits them by (comments, CDATA sections, processing instructions).
+
+    def __init__(self):
+        self.cas_type = 'noResponse'
+        self.cas_data = {}
+        self._depth = 0
+        self._done = False
+        self._frames = []
+        self._in_cdata = False
+
+    def create_parser(self):
+        parser = ParserCreate()
+        parser.buffer_text = True
+        parser.CharacterDataHandler = self._character_data
+        parser.CommentHandler = self._flush_text
+        parser.EndCdataSectionHandler = self._end_cdata
+        parser.EndElementHandler = self._end_element
+        parser.ProcessingInstructionHandler = self._flush_text
+        parser.StartCdataSectionHandler = self._start_cdata
+        parser.StartElementHandler = self._start_element
+        return parser
+
+    def _character_data(self, data):
+        if not self._frames or self._in_cdata:
+            return
+        chunks = self._frames[-1][2]
+        if chunks or not data.isspace():
+            chunks.append(data)
+
+    def _end_cdata(self):
+        self._in_cdata = False
+
+    def _end_element(self, name):
+        self._depth -= 1
+        if not self._frames:
+            return
+        self._flush_text()
+        tag_name, result, _ = self._frames.pop()
+        if self._frames:
+            parent_tag_name, parent_result, _ = self._frames[-1]
+            parent_result.setdefault(parent_tag_name, {}).update(result)
+        else:
+            self.cas_data = result
+            self._done = True
+
+    def _flush_text(self, *args):
+        if not self._frames:
+            return
+        tag_name, result, chunks = self._frames[-1]
+        text = ''.join(chunks).strip()
+        del chunks[:]
+        if text:
+            result[tag_name] = text
+
+    def _start_cdata(self):
+        self._flush_text()
+        self._in_cdata = True
+
+    def _start_element(self, name, attributes):
+        self._depth += 1
+        if self._depth == 1:
+            if name != 'cas:serviceResponse':
+                raise Exception
+            return
+        if self._frames:
+            self._flush_text()
+        elif self._depth == 2 and not self._done:
+            self.cas_type = name.replace('cas:', '')
+        else:
+            return
+        tag_name = name
+        if tag_name.startswith('cas:'):
+            tag_name = tag_name.replace('cas:', '')
+        self._frames.append((tag_name, {}, []))
+
+
+class _CappedReader(object):
+
+    def __init__(self, file_pointer, max_size=None, capture=False):
+        self._file_pointer = file_pointer
+        self._max_size = max_size
+        self.chunks = [] if capture else None
+        self.is_blank = True
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._read(size)
+        # Leading blank lines are stripped from buffered responses too, and
+        # expat rejects an XML declaration anywhere but at the very start.
+        while self.is_blank and data:
+            data = data.lstrip()
+            if data:
+                self.is_blank = False
+            else:
+                data = self._read(size)
+        return data
+
+    def _read(self, size):
+        data = self._file_pointer.read(size)
+        self.size += len(data)
+        if self._max_size is not None and self.size > self._max_size:
+            raise CASResponseTooLargeError(
+                'Response exceeds {} bytes'.format(self._max_size))
+        if self.chunks is not None:
+            self.chunks.append(data)
+        return data
+
 
 __all__ = [
     'CASClient',
+    'CASProxyGrantingTicketStore',
     'CASResponse',
+    'CASResponseTooLargeError',
     'CASSessionAdapter',
+    'CASValidation',
+    'MemcachedCASProxyGrantingTicketStore',
     'MemcachedCASSessionAdapter',
+    'MemoryCASProxyGrantingTicketStore',
+    'MemoryCASSessionAdapter',
+    'SlidingExpiryCASSessionAdapter',
     ]
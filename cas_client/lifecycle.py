@@ -0,0 +1,57 @@
+# -*- encoding: utf-8 -*-
+import logging
+import os
+import threading
+import weakref
+
+
+_lock = threading.Lock()
+
+_pid = os.getpid()
+
+_resources = weakref.WeakSet()
+
+
+def register_after_fork(resource):
+    '''
+    Have ``resource._after_fork()`` called in every process forked from
+    this one, to reset its process-local state.
+    '''
+    with _lock:
+        _resources.add(resource)
+
+
+def reset_after_fork():
+    '''
+    Reset the connection pools, background threads and locks of every CAS
+    client object in a freshly forked process.
+
+    This runs automatically in the child process on Python 3.7 and newer.
+    On older interpreters, call it from the server's post-fork hook (e.g.
+    gunicorn's ``post_fork``). Calling it again, or in the parent process,
+    does nothing.
+
+    Read-only state, such as parsed private keys, SSL contexts and
+    validated tickets, is kept and shared with the parent copy-on-write.
+    '''
+    global _lock, _pid
+    if os.getpid() == _pid:
+        return
+    _pid = os.getpid()
+    # Another thread may have held the lock at fork time.
+    _lock = threading.Lock()
+    for resource in list(_resources):
+        try:
+            resource._after_fork()
+        except Exception:
+            logging.exception('[CAS] Failed resetting {!r} after fork'.format(
+                resource))
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+__all__ = [
+    'reset_after_fork',
+    ]
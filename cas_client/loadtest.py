@@ -0,0 +1,407 @@
+# -*- encoding: utf-8 -*-
+'''
+End-to-end load generator for ``cas_client``.
+
+Drives a weighted mix of client operations from many workers against a
+local CAS stand-in and an in-memory session store, and prints a JSON report
+of throughput, latency percentiles and CPU time per operation.
+
+::
+
+    python-cas-client$ python -m cas_client.loadtest \\
+    ...     --mode threads --workers 8 --duration 10 \\
+    ...     --mix login_url=1,service_validate=4,session=4,slo=1
+
+Operations:
+
+``login_url``
+    Build a login URL.
+
+``service_validate``
+    Validate a fresh service ticket against the stand-in with
+    ``perform_service_validate``.
+
+``auth_token_url``
+    Build and sign an auth token login URL.
+
+``session``
+    Create a session, check that it exists and delete it.
+
+``slo``
+    Create a session, then parse a single logout request for it and
+    delete it.
+
+Workers are threads, processes (each with its own client and session
+store) or concurrent operations on an asyncio event loop, run on an
+executor with one thread per worker. The stand-in runs in the load
+generator's own process, so the reported process CPU time includes serving
+the CAS side.
+'''
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent import futures
+from Crypto.PublicKey import RSA
+from .cas_client import CASClient, MemoryCASSessionAdapter
+from .replay import _CASStubServer, _percentile
+from .signers import RSASigner
+
+
+OPERATIONS = (
+    'login_url',
+    'service_validate',
+    'auth_token_url',
+    'session',
+    'slo',
+    )
+
+SERVICE_URL = 'https://app.example.com/'
+
+SERVICE_VALIDATE_RESPONSE = '''<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+<cas:authenticationSuccess>
+<cas:user>jott</cas:user>
+<cas:attributes>
+<cas:email>jott@example.com</cas:email>
+<cas:firstname>Jeffrey A</cas:firstname>
+<cas:lastname>Ott</cas:lastname>
+</cas:attributes>
+</cas:authenticationSuccess>
+</cas:serviceResponse>'''
+
+LOGOUT_REQUEST_TEMPLATE = '''<samlp:LogoutRequest
+    xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol"
+    xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion"
+    ID="{id}" Version="2.0" IssueInstant="2016-04-08 00:40:55 +0000">
+<saml:NameID>@NOT_USED@</saml:NameID>
+<samlp:SessionIndex>{ticket}</samlp:SessionIndex>
+</samlp:LogoutRequest>'''
+
+_thread_time = getattr(time, 'thread_time', None)
+
+
+class _Worker(object):
+
+    def __init__(self, server_url, private_key, seed):
+        self._random = random.Random(seed)
+        self._client = CASClient(
+            server_url,
+            service_url=SERVICE_URL,
+            session_storage_adapter=MemoryCASSessionAdapter(),
+            signer=RSASigner(private_key),
+            persistent_connections=True,
+            )
+
+    def close(self):
+        self._client.close()
+
+    def run(self, operation):
+        started = time.time()
+        cpu_started = _thread_time() if _thread_time else None
+        try:
+            getattr(self, '_' + operation)()
+            error = None
+        except Exception as exception:
+            error = repr(exception)
+        cpu = _thread_time() - cpu_started if _thread_time else None
+        return operation, time.time() - started, cpu, error
+
+    def choose(self, operations, weights):
+        return _choose_weighted(self._random, operations, weights)
+
+    def _auth_token_url(self):
+        self._client.get_auth_token_login_url(
+            auth_token_ticket=_new_ticket('ATT'),
+            authenticator='loadtest',
+            private_key=None,
+            service_url=SERVICE_URL,
+            username='jott',
+            )
+
+    def _login_url(self):
+        self._client.get_login_url()
+
+    def _service_validate(self):
+        response = self._client.perform_service_validate(
+            ticket=_new_ticket('ST'),
+            service_url=SERVICE_URL,
+            )
+        if response is None or not response.success:
+            raise ValueError('Validation failed')
+
+    def _session(self):
+        ticket = _new_ticket('ST')
+        self._client.create_session(ticket, payload={'user': 'jott'}, expires=60)
+        if not self._client.session_exists(ticket):
+            raise ValueError('Session not found')
+        self._client.delete_session(ticket)
+
+    def _slo(self):
+        ticket = _new_ticket('ST')
+        self._client.create_session(ticket, payload={'user': 'jott'}, expires=60)
+        message = self._client.parse_logout_request(
+            LOGOUT_REQUEST_TEMPLATE.format(id=uuid.uuid4(), ticket=ticket))
+        self._client.delete_session(message['session_index'])
+
+
+def main(argv=None):
+    '''
+    Run a load test from the command line, printing its JSON report.
+    '''
+    parser = argparse.ArgumentParser(
+        prog='python -m cas_client.loadtest',
+        description='Load test cas_client against a local CAS stand-in.',
+        )
+    parser.add_argument(
+        '--mode',
+        choices=('threads', 'processes', 'asyncio'),
+        default='threads',
+        )
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument(
+        '--mix',
+        default=','.join('{}=1'.format(operation) for operation in OPERATIONS),
+        help='comma separated operation=weight pairs, from: {}'.format(
+            ', '.join(OPERATIONS)),
+        )
+    parser.add_argument(
+        '--cas-latency',
+        type=float,
+        default=0.0,
+        help='seconds the CAS stand-in waits before answering',
+        )
+    parser.add_argument('--key-bits', type=int, default=2048)
+    parser.add_argument('--seed', type=int, default=None)
+    arguments = parser.parse_args(argv)
+    if arguments.workers < 1:
+        parser.error('--workers must be at least 1')
+    try:
+        mix = parse_mix(arguments.mix)
+    except ValueError as exception:
+        parser.error(str(exception))
+    report = run_load_test(
+        mix=mix,
+        mode=arguments.mode,
+        workers=arguments.workers,
+        duration=arguments.duration,
+        cas_latency=arguments.cas_latency,
+        key_bits=arguments.key_bits,
+        seed=arguments.seed,
+        )
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+def parse_mix(text):
+    '''
+    Parse an ``operation=weight,...`` mix into a dictionary.
+    '''
+    mix = {}
+    for item in text.split(','):
+        operation, _, weight = item.strip().partition('=')
+        if operation not in OPERATIONS:
+            raise ValueError('Unknown operation {!r}'.format(operation))
+        mix[operation] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('The mix has no operations')
+    return mix
+
+
+def run_load_test(
+    mix=None,
+    mode='threads',
+    workers=4,
+    duration=10.0,
+    cas_latency=0.0,
+    key_bits=2048,
+    seed=None,
+    ):
+    '''
+    Run a load test, returning its report as a dictionary.
+    '''
+    if workers < 1:
+        raise ValueError('At least one worker is needed')
+    mix = mix or dict.fromkeys(OPERATIONS, 1.0)
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    private_key = RSA.generate(key_bits).export_key().decode('ascii')
+    server = _CASStubServer([{
+        'b': SERVICE_VALIDATE_RESPONSE,
+        'd': cas_latency,
+        'k': 'serviceValidate',
+        }], simulate_latency=bool(cas_latency))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    config = {
+        'duration': duration,
+        'mix': mix,
+        'private_key': private_key,
+        'server_url': server.url,
+        }
+    runner = {
+        'asyncio': _run_asyncio,
+        'processes': _run_processes,
+        'threads': _run_threads,
+        }[mode]
+    times = os.times()
+    started = time.time()
+    try:
+        samples = runner(config, workers, seed)
+    finally:
+        server.shutdown()
+        server.server_close()
+    elapsed = time.time() - started
+    cpu_seconds = sum(os.times()[:4]) - sum(times[:4])
+    return _build_report(samples, mode, workers, elapsed, cpu_seconds, seed)
+
+
+def _build_report(samples, mode, workers, elapsed, cpu_seconds, seed):
+    by_operation = collections.defaultdict(list)
+    for sample in samples:
+        by_operation[sample[0]].append(sample)
+    operations = {}
+    for operation, operation_samples in sorted(by_operation.items()):
+        latencies = sorted(sample[1] for sample in operation_samples)
+        cpus = [sample[2] for sample in operation_samples if sample[2] is not None]
+        operations[operation] = {
+            'count': len(operation_samples),
+            'cpu_seconds_mean': sum(cpus) / len(cpus) if cpus else None,
+            'errors': sum(1 for sample in operation_samples if sample[3]),
+            'latency_seconds': {
+                'max': latencies[-1],
+                'mean': sum(latencies) / len(latencies),
+                'p50': _percentile(latencies, 0.5),
+                'p90': _percentile(latencies, 0.9),
+                'p99': _percentile(latencies, 0.99),
+                },
+            'throughput': len(operation_samples) / elapsed,
+            }
+    errors = [sample[3] for sample in samples if sample[3]]
+    return {
+        'cpu_seconds': cpu_seconds,
+        'cpu_seconds_per_operation': cpu_seconds / len(samples) if samples else None,
+        'elapsed': elapsed,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'mode': mode,
+        'operations': operations,
+        'seed': seed,
+        'throughput': len(samples) / elapsed,
+        'total': len(samples),
+        'workers': workers,
+        }
+
+
+def _choose_weighted(random_, operations, weights):
+    point = random_.random() * weights[-1]
+    for operation, weight in zip(operations, weights):
+        if point < weight:
+            return operation
+    return operations[-1]
+
+
+def _get_choices(mix):
+    operations = [operation for operation in OPERATIONS if mix.get(operation)]
+    weights = []
+    total = 0.0
+    for operation in operations:
+        total += mix[operation]
+        weights.append(total)
+    return operations, weights
+
+
+def _new_ticket(prefix):
+    return '{}-{}'.format(prefix, uuid.uuid4().hex)
+
+
+def _run_asyncio(config, workers, seed):
+    # Callbacks rather than coroutines keep this module importable on
+    # Python 2; asyncio mode itself needs Python 3.4 or newer.
+    import asyncio
+    operations, weights = _get_choices(config['mix'])
+    deadline = time.time() + config['duration']
+    worker = _Worker(config['server_url'], config['private_key'], seed)
+    executor = futures.ThreadPoolExecutor(max_workers=workers)
+    loop = asyncio.new_event_loop()
+    finished = loop.create_future()
+    running = [workers]
+    samples = []
+
+    def schedule():
+        if time.time() >= deadline:
+            running[0] -= 1
+            if not running[0]:
+                finished.set_result(None)
+            return
+        operation = worker.choose(operations, weights)
+        future = loop.run_in_executor(executor, worker.run, operation)
+        future.add_done_callback(complete)
+
+    def complete(future):
+        samples.append(future.result())
+        schedule()
+
+    try:
+        for _ in range(workers):
+            loop.call_soon(schedule)
+        loop.run_until_complete(finished)
+    finally:
+        loop.close()
+        executor.shutdown()
+        worker.close()
+    return samples
+
+
+def _run_processes(config, workers, seed):
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(
+            _run_process_worker,
+            [(config, seed + index) for index in range(workers)],
+            )
+    finally:
+        pool.close()
+        pool.join()
+    return [sample for samples in results for sample in samples]
+
+
+def _run_process_worker(arguments):
+    config, seed = arguments
+    return _run_threads(config, 1, seed)
+
+
+def _run_threads(config, workers, seed):
+    operations, weights = _get_choices(config['mix'])
+    deadline = time.time() + config['duration']
+    worker = _Worker(config['server_url'], config['private_key'], seed)
+    results = []
+
+    def loop(index):
+        random_ = random.Random(seed * 1000003 + index)
+        samples = []
+        while time.time() < deadline:
+            operation = _choose_weighted(random_, operations, weights)
+            samples.append(worker.run(operation))
+        results.append(samples)
+
+    threads = [
+        threading.Thread(target=loop, args=(index,))
+        for index in range(workers)
+        ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    worker.close()
+    return [sample for samples in results for sample in samples]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# -*- encoding: utf-8 -*-
+import collections
+import logging
+import threading
+import time
+from .cas_client import CASClient
+from .lifecycle import register_after_fork
+from .signers import RSASigner
+from .transport import create_http_session, create_ssl_context
+
+
+class CASClientRegistry(object):
+    '''
+    A registry of ``CASClient`` instances for multi-tenant deployments.
+
+    ::
+
+        >>> from cas_client import CASClientRegistry
+        >>> registry = CASClientRegistry(max_clients=100)
+        >>> client = registry.get_client(
+        ...     'shop',
+        ...     server_url='https://logmein.com',
+        ...     service_url='https://shop.example.com',
+        ...     )
+        >>> client is registry.get_client(
+        ...     'shop',
+        ...     server_url='https://logmein.com',
+        ...     service_url='https://shop.example.com',
+        ...     )
+        True
+        >>> registry.metrics['tenants']['shop']['hits']
+        1
+
+    Clients are memoized per tenant by their configuration: asking for a
+    tenant with a different configuration replaces its client. All clients
+    with the same certificate settings share one HTTP session, and so one
+    connection pool per CAS host. A ``private_key`` passed as configuration
+    is parsed once into an ``RSASigner`` shared by every tenant using that
+    key.
+
+    The least recently used tenants are evicted beyond ``max_clients``, as
+    are tenants idle for longer than ``idle_timeout`` seconds.
+    '''
+
+    def __init__(
+        self,
+        max_clients=256,
+        idle_timeout=None,
+        pool_connections=50,
+        pool_maxsize=10,
+        ):
+        self._max_clients = max_clients
+        self._idle_timeout = idle_timeout
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._clients = collections.OrderedDict()
+        self._http_sessions = {}
+        self._signers = {}
+        self._tenant_metrics = {}
+        self._evictions = 0
+        register_after_fork(self)
+
+    ### SPECIAL METHODS ###
+
+    def __contains__(self, tenant):
+        with self._lock:
+            return tenant in self._clients
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    ### PUBLIC METHODS ###
+
+    def close(self):
+        '''
+        Close every client and the shared HTTP sessions.
+        '''
+        with self._lock:
+            clients = [client for _, client in self._clients.values()]
+            self._clients.clear()
+            http_sessions = list(self._http_sessions.values())
+            self._http_sessions.clear()
+        for client in clients:
+            client.close()
+        for http_session in http_sessions:
+            http_session.close()
+
+    def evict(self, tenant):
+        '''
+        Drop the client for ``tenant``, if any.
+        '''
+        with self._lock:
+            record = self._clients.pop(tenant, None)
+            if record is not None:
+                self._evictions += 1
+        if record is not None:
+            logging.debug('[CAS] Evicted client for tenant {}'.format(tenant))
+            record[1].close()
+
+    def get_client(self, tenant, **config):
+        '''
+        Get the ``CASClient`` for ``tenant``, creating it from ``config`` (the
+        ``CASClient`` keyword arguments) if needed.
+        '''
+        assert 'http_session' not in config
+        config_key = _freeze(config)
+        now = time.time()
+        evicted = []
+        with self._lock:
+            metrics = self._tenant_metrics.setdefault(tenant, {
+                'created': 0,
+                'hits': 0,
+                'last_used': None,
+                })
+            record = self._clients.get(tenant)
+            if record is not None and record[0] == config_key:
+                client = record[1]
+                self._clients[tenant] = self._clients.pop(tenant)
+                metrics['hits'] += 1
+            else:
+                if record is not None:
+                    evicted.append(record[1])
+                    del self._clients[tenant]
+                client = self._create_client(config)
+                self._clients[tenant] = (config_key, client)
+                metrics['created'] += 1
+            metrics['last_used'] = now
+            evicted.extend(self._evict_idle(now))
+        for evicted_client in evicted:
+            evicted_client.close()
+        return client
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        # Clients reset their own (shared) connection pools.
+        self._lock = threading.Lock()
+
+    def _create_client(self, config):
+        config = dict(config)
+        private_key = config.pop('private_key', None)
+        if private_key is not None:
+            assert 'signer' not in config
+            signer = self._signers.get(private_key)
+            if signer is None:
+                signer = self._signers[private_key] = RSASigner(private_key)
+            config['signer'] = signer
+        transport_key = (
+            bool(config.get('verify_certificates', False)),
+            config.get('ca_bundle'),
+            )
+        http_session = self._http_sessions.get(transport_key)
+        if http_session is None:
+            ssl_context = create_ssl_context(
+                ca_bundle=transport_key[1],
+                verify_certificates=transport_key[0],
+                )
+            http_session = create_http_session(
+                ssl_context,
+                pool_connections=self._pool_connections,
+                pool_maxsize=self._pool_maxsize,
+                )
+            self._http_sessions[transport_key] = http_session
+        return CASClient(http_session=http_session, **config)
+
+    def _evict_idle(self, now):
+        evicted = []
+        while self._clients:
+            tenant = next(iter(self._clients))
+            last_used = self._tenant_metrics[tenant]['last_used']
+            if len(self._clients) <= self._max_clients and (
+                self._idle_timeout is None or
+                now - last_used <= self._idle_timeout
+                ):
+                break
+            evicted.append(self._clients.pop(tenant)[1])
+            self._evictions += 1
+            logging.debug('[CAS] Evicted client for tenant {}'.format(tenant))
+        return evicted
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def metrics(self):
+        '''
+        Registry-wide client and eviction counts, plus per-tenant creation
+        and hit counts and last use times.
+        '''
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'evictions': self._evictions,
+                'http_sessions': len(self._http_sessions),
+                'signers': len(self._signers),
+                'tenants': {
+                    tenant: dict(metrics)
+                    for tenant, metrics in self._tenant_metrics.items()
+                    },
+                }
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (key, _freeze(item)) for key, item in value.items()
+            ))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+__all__ = [
+    'CASClientRegistry',
+    ]
@@ -0,0 +1,406 @@
+# -*- encoding: utf-8 -*-
+import collections
+import io
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from concurrent import futures
+from six.moves import BaseHTTPServer, socketserver
+from .cas_client import CASClient, _get_call_kind
+from .lifecycle import register_after_fork
+try:
+    from urllib import urlencode
+    from urlparse import parse_qsl, urlparse, urlunparse
+except ImportError:
+    from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+_REDACTED = 'REDACTED'
+
+_REDACTED_PARAMETERS = frozenset([
+    'at',
+    'ats',
+    'pgt',
+    'pgtId',
+    'pgtIou',
+    'ticket',
+    ])
+
+_TICKET_PATTERN = re.compile(r'\b(ST|PT|PGT|PGTIOU|TGT|ATT|LT)-[\w.\-]+')
+
+
+class CASTrafficRecorder(object):
+    r'''Captures a ``CASClient``'s outgoing calls to an append-only file.
+
+    ::
+
+        >>> from cas_client import CASClient, CASTrafficRecorder
+        >>> recorder = CASTrafficRecorder('/tmp/cas-traffic.jsonl')
+        >>> client = CASClient('https://logmein.com', recorder=recorder)
+
+    Every call is written as one compact JSON line holding its kind (the CAS
+    endpoint, e.g. ``serviceValidate``), method, URL, start time, duration
+    and response text, flushed as it completes. Parsed SLO messages are
+    recorded too, as ``logoutRequest`` calls. Ticket values and auth token
+    signatures are redacted from URLs and response texts before anything
+    reaches the file.
+    '''
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file_pointer = io.open(path, 'ab')
+        register_after_fork(self)
+
+    ### PUBLIC METHODS ###
+
+    def close(self):
+        '''
+        Close the capture file.
+        '''
+        with self._lock:
+            self._file_pointer.close()
+
+    def record(self, kind, method, url, started, duration, text):
+        '''
+        Append one call to the capture file.
+        '''
+        record = {
+            'd': round(duration, 6),
+            'k': kind,
+            't': round(started, 6),
+            }
+        if method is not None:
+            record['m'] = method
+        if url is not None:
+            record['u'] = redact_url(url)
+        if text is not None:
+            record['b'] = redact_text(text)
+        line = json.dumps(record, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            self._file_pointer.write(line.encode('utf-8') + b'\n')
+            self._file_pointer.flush()
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def path(self):
+        '''
+        The capture file's path.
+        '''
+        return self._path
+
+
+class CASTrafficReplayer(object):
+    r'''Replays captured CAS traffic through a ``CASClient`` against a local
+    stub CAS server.
+
+    ::
+
+        >>> from cas_client import CASTrafficReplayer
+        >>> replayer = CASTrafficReplayer('/tmp/cas-traffic.jsonl', speed=10)
+        >>> report = replayer.run()  # doctest: +SKIP
+        >>> report['throughput'], report['latency']['p99']  # doctest: +SKIP
+
+    Calls are issued at their captured offsets divided by ``speed``, or as
+    fast as ``max_workers`` threads allow when ``speed`` is None. The stub
+    answers each endpoint with the responses captured for it, in turn, after
+    sleeping for the captured duration if ``simulate_latency`` is set.
+    ``client_kwargs`` configure the replaying ``CASClient``, which pools its
+    connections to the stub.
+
+    ``run`` reports call and error counts, wall time, throughput, how far
+    the dispatcher fell behind schedule, and latency percentiles overall
+    and per kind.
+    '''
+
+    def __init__(
+        self,
+        path,
+        speed=1.0,
+        max_workers=16,
+        simulate_latency=False,
+        client_kwargs=None,
+        ):
+        self._path = path
+        self._speed = speed
+        self._max_workers = max_workers
+        self._simulate_latency = bool(simulate_latency)
+        self._client_kwargs = client_kwargs or {}
+
+    ### PUBLIC METHODS ###
+
+    def load(self):
+        '''
+        Read the captured calls, ordered by start time.
+        '''
+        records = []
+        with io.open(self._path, 'rb') as file_pointer:
+            for line in file_pointer:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line.decode('utf-8')))
+        records.sort(key=lambda record: record['t'])
+        return records
+
+    def run(self):
+        '''
+        Replay the captured calls and report on them.
+        '''
+        records = self.load()
+        server = _CASStubServer(records, self._simulate_latency)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        client_kwargs = dict(self._client_kwargs)
+        client_kwargs.setdefault('auth_prefix', '')
+        client_kwargs.setdefault('persistent_connections', True)
+        client_kwargs.setdefault('pool_maxsize', self._max_workers)
+        client = CASClient(server.url, **client_kwargs)
+        try:
+            return self._replay(client, server.url, records)
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+    ### PRIVATE METHODS ###
+
+    def _call(self, client, server_url, record):
+        kind = record['k']
+        parsed_url = urlparse(record.get('u', ''))
+        parameters = dict(parse_qsl(parsed_url.query))
+        started = time.time()
+        try:
+            if kind == 'logoutRequest':
+                client.parse_logout_request(record['b'])
+            elif kind == 'serviceValidate':
+                client.perform_service_validate(
+                    ticket=parameters.get('ticket'),
+                    service_url=parameters.get('service'),
+                    )
+            elif kind == 'proxyValidate':
+                client.perform_proxy_validate(
+                    parameters.get('ticket'),
+                    service_url=parameters.get('service'),
+                    )
+            elif kind == 'proxy':
+                client.perform_proxy(parameters.get('pgt'))
+            elif kind == 'api/auth_token_tickets':
+                client.acquire_auth_token_ticket()
+            else:
+                url = urlunparse(
+                    urlparse(server_url)[:2] + parsed_url[2:]
+                    )
+                if kind.startswith('api/'):
+                    client.perform_api_request(url, method=record.get('m'))
+                elif record.get('m') == 'POST':
+                    client._perform_post(url)
+                else:
+                    client._perform_get(url)
+            error = None
+        except Exception as exception:
+            logging.debug('[CAS] Replayed {} failed: {!r}'.format(
+                kind, exception))
+            error = exception
+        return kind, time.time() - started, error
+
+    def _replay(self, client, server_url, records):
+        results = []
+        lag_max = 0.0
+        executor = futures.ThreadPoolExecutor(max_workers=self._max_workers)
+        started = time.time()
+        try:
+            pending = []
+            origin = records[0]['t'] if records else 0.0
+            for record in records:
+                if self._speed:
+                    due = started + (record['t'] - origin) / self._speed
+                    delay = due - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        lag_max = max(lag_max, -delay)
+                pending.append(executor.submit(
+                    self._call, client, server_url, record))
+            for future in pending:
+                results.append(future.result())
+        finally:
+            executor.shutdown(wait=True)
+        elapsed = time.time() - started
+        by_kind = collections.defaultdict(list)
+        for kind, latency, error in results:
+            by_kind[kind].append((latency, error))
+        return {
+            'calls': len(results),
+            'elapsed': elapsed,
+            'errors': sum(1 for _, _, error in results if error is not None),
+            'kinds': {
+                kind: _summarize(kind_results)
+                for kind, kind_results in by_kind.items()
+                },
+            'latency': _summarize([
+                (latency, error) for _, latency, error in results
+                ])['latency'],
+            'schedule_lag_max': lag_max,
+            'throughput': len(results) / elapsed if elapsed else 0.0,
+            }
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def path(self):
+        '''
+        The capture file's path.
+        '''
+        return self._path
+
+    @property
+    def speed(self):
+        '''
+        The replay rate relative to the captured rate, or None to replay as
+        fast as possible.
+        '''
+        return self._speed
+
+
+class _CASStubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, records, simulate_latency):
+        responses = collections.defaultdict(list)
+        for record in records:
+            if record['k'] != 'logoutRequest':
+                responses[record['k']].append((record.get('b') or '', record['d']))
+        self.responses = {
+            kind: itertools.cycle(kind_responses)
+            for kind, kind_responses in responses.items()
+            }
+        self.responses_lock = threading.Lock()
+        self.simulate_latency = simulate_latency
+        BaseHTTPServer.HTTPServer.__init__(
+            self,
+            ('127.0.0.1', 0),
+            _CASStubRequestHandler,
+            )
+
+    def get_response(self, kind):
+        with self.responses_lock:
+            responses = self.responses.get(kind)
+            if responses is None:
+                return '', 0.0
+            return next(responses)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_port)
+
+
+class _CASStubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length:
+            self.rfile.read(content_length)
+        self._respond()
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        text, duration = self.server.get_response(_get_call_kind(self.path))
+        if self.server.simulate_latency and duration:
+            time.sleep(duration)
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def redact_text(text):
+    '''
+    Replace every CAS ticket in ``text`` with a placeholder of the same kind.
+
+    ::
+
+        >>> from cas_client import redact_text
+        >>> redact_text('<cas:proxyGrantingTicket>PGTIOU-84678-8a9d</cas:proxyGrantingTicket>')
+        '<cas:proxyGrantingTicket>PGTIOU-REDACTED</cas:proxyGrantingTicket>'
+
+    '''
+    return _TICKET_PATTERN.sub(r'\1-' + _REDACTED, text)
+
+
+def redact_url(url):
+    '''
+    Replace ticket and auth token parameters in ``url`` with placeholders.
+
+    ::
+
+        >>> from cas_client import redact_url
+        >>> redact_url('https://logmein.com/cas/serviceValidate?ticket=ST-1-abc&service=http://myservice.net')
+        'https://logmein.com/cas/serviceValidate?ticket=ST-REDACTED&service=http%3A%2F%2Fmyservice.net'
+
+    '''
+    parsed_url = urlparse(url)
+    if not parsed_url.query:
+        return url
+    parameters = []
+    for key, value in parse_qsl(parsed_url.query, keep_blank_values=True):
+        if key in _REDACTED_PARAMETERS:
+            redacted_value = redact_text(value)
+            if redacted_value == value:
+                redacted_value = _REDACTED
+            value = redacted_value
+        parameters.append((key, value))
+    return urlunparse(parsed_url._replace(query=urlencode(parameters)))
+
+
+def _summarize(results):
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'calls': len(results),
+        'errors': sum(1 for _, error in results if error is not None),
+        'latency': {
+            'max': latencies[-1] if latencies else None,
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': _percentile(latencies, 0.5),
+            'p90': _percentile(latencies, 0.9),
+            'p99': _percentile(latencies, 0.99),
+            },
+        }
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+__all__ = [
+    'CASTrafficRecorder',
+    'CASTrafficReplayer',
+    'redact_text',
+    'redact_url',
+    ]
@@ -0,0 +1,156 @@
+# -*- encoding: utf-8 -*-
+import collections
+import hashlib
+import math
+import struct
+import threading
+import time
+from .lifecycle import register_after_fork
+
+
+_HASH_PAIR = struct.Struct('>QQ')
+
+
+class CASTicketReplayFilter(object):
+    r'''A time-sliced Bloom filter of recently validated service tickets.
+
+    CAS service tickets are single-use, so a ticket ``CASClient`` has
+    already validated can be refused locally instead of costing a round
+    trip that ends in ``INVALID_TICKET``.
+
+    ::
+
+        >>> from cas_client import CASTicketReplayFilter
+        >>> replay_filter = CASTicketReplayFilter(ttl=3600, capacity=1000)
+        >>> replay_filter.add('ST-1234')
+        >>> 'ST-1234' in replay_filter
+        True
+        >>> 'ST-5678' in replay_filter
+        False
+
+    Tickets go into the newest of a series of Bloom filter slices. A new
+    slice is started every ``ttl / slices`` seconds, and slices are dropped
+    once all of their tickets are older than ``ttl``, so tickets are
+    remembered for between ``ttl`` seconds and one slice longer. Beyond
+    ``capacity`` tickets per ``ttl``, slices fill up and are started early,
+    and the oldest slices are dropped early to keep memory bounded. Slices
+    are sized so that a ticket never validated is mistaken for a replay
+    with probability at most ``error_rate``, at about
+    ``1.44 * log2(slices / error_rate)`` bits per ticket of ``capacity``.
+    '''
+
+    def __init__(self, ttl=3600, capacity=100000, error_rate=1e-6, slices=6):
+        assert 0 < error_rate < 1
+        assert slices >= 1
+        self._ttl = ttl
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._max_slices = slices + 1
+        self._slice_seconds = float(ttl) / slices
+        self._slice_capacity = max(1, int(math.ceil(float(capacity) / slices)))
+        self._bits = max(8, int(math.ceil(
+            -self._slice_capacity * math.log(error_rate / self._max_slices) /
+            math.log(2) ** 2
+            )))
+        self._hashes = max(1, int(round(
+            float(self._bits) / self._slice_capacity * math.log(2))))
+        self._lock = threading.Lock()
+        self._slices = collections.deque()
+        register_after_fork(self)
+        self._metrics = {
+            'added': 0,
+            'checked': 0,
+            'rejected': 0,
+            }
+
+    ### SPECIAL METHODS ###
+
+    def __contains__(self, ticket):
+        indices = self._get_indices(ticket)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._metrics['checked'] += 1
+            for _, _, bits in self._slices:
+                if all(bits[index >> 3] & (1 << (index & 7)) for index in indices):
+                    self._metrics['rejected'] += 1
+                    return True
+        return False
+
+    ### PUBLIC METHODS ###
+
+    def add(self, ticket):
+        '''
+        Remember ``ticket`` as validated.
+        '''
+        indices = self._get_indices(ticket)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if (
+                not self._slices or
+                now - self._slices[-1][0] >= self._slice_seconds or
+                self._slices[-1][1] >= self._slice_capacity
+                ):
+                self._slices.append([now, 0, bytearray((self._bits + 7) // 8)])
+                while len(self._slices) > self._max_slices:
+                    self._slices.popleft()
+            current = self._slices[-1]
+            bits = current[2]
+            for index in indices:
+                bits[index >> 3] |= 1 << (index & 7)
+            current[1] += 1
+            self._metrics['added'] += 1
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        horizon = self._ttl + self._slice_seconds
+        while self._slices and now - self._slices[0][0] >= horizon:
+            self._slices.popleft()
+
+    def _get_indices(self, ticket):
+        if not isinstance(ticket, bytes):
+            ticket = ticket.encode('utf-8')
+        first, second = _HASH_PAIR.unpack_from(hashlib.sha256(ticket).digest())
+        second |= 1
+        return [
+            (first + index * second) % self._bits
+            for index in range(self._hashes)
+            ]
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def error_rate(self):
+        '''
+        The target probability of mistaking a new ticket for a replay.
+        '''
+        return self._error_rate
+
+    @property
+    def metrics(self):
+        '''
+        Counts of tickets added, checked and rejected as replays, plus the
+        number of live slices and the filter's memory footprint in bytes.
+        '''
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['slices'] = len(self._slices)
+        metrics['bytes'] = self._max_slices * ((self._bits + 7) // 8)
+        return metrics
+
+    @property
+    def ttl(self):
+        '''
+        How long, in seconds, validated tickets are remembered.
+        '''
+        return self._ttl
+
+
+__all__ = [
+    'CASTicketReplayFilter',
+    ]
@@ -0,0 +1,236 @@
+# -*- encoding: utf-8 -*-
+import abc
+import six
+import struct
+import zlib
+
+
+_VERSION = 1
+
+_FLAG_COMPRESSED = 0x01
+
+_NONE, _FALSE, _TRUE, _INTEGER, _FLOAT, _TEXT, _BYTES, _LIST, _DICT = range(9)
+
+_DOUBLE = struct.Struct('>d')
+
+
+class CASSessionCodecError(Exception):
+    r'''Raised when a stored session payload cannot be decoded.'''
+    pass
+
+
+class CASSessionCodec(object):
+    '''
+    Abstract base class for session payload codecs.
+
+    Session adapters encode payloads with their codec before storing them,
+    and decode them again in ``get``.
+    '''
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def decode(self, data):
+        '''
+        Decode the bytes ``data`` into a session payload.
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def encode(self, payload):
+        '''
+        Encode the session ``payload`` into bytes.
+        '''
+        raise NotImplementedError
+
+
+class BinaryCASSessionCodec(CASSessionCodec):
+    r'''A compact binary session payload codec.
+
+    Payloads may be built from None, booleans, integers, floats, text,
+    bytes, lists, tuples and dictionaries, as ``CASResponse`` users and
+    attributes are. Each encoded payload starts with a two byte header
+    holding the format version and flags. Encodings of at least
+    ``compress_threshold`` bytes are zlib-compressed, when that makes them
+    smaller.
+
+    ::
+
+        >>> from cas_client import BinaryCASSessionCodec
+        >>> codec = BinaryCASSessionCodec()
+        >>> data = codec.encode({'user': 'jott', 'attributes': {'puid': 42}})
+        >>> len(data)
+        38
+        >>> codec.decode(data) == {'user': 'jott', 'attributes': {'puid': 42}}
+        True
+
+    '''
+
+    def __init__(self, compress_threshold=512, compression_level=6):
+        self._compress_threshold = compress_threshold
+        self._compression_level = compression_level
+
+    ### PUBLIC METHODS ###
+
+    def decode(self, data):
+        '''
+        Decode the bytes ``data`` into a session payload.
+        '''
+        data = bytearray(data)
+        if len(data) < 2 or data[0] != _VERSION:
+            raise CASSessionCodecError('Unsupported session payload header')
+        if data[1] & _FLAG_COMPRESSED:
+            try:
+                data = bytearray(zlib.decompress(bytes(data[2:])))
+            except zlib.error as exception:
+                raise CASSessionCodecError(str(exception))
+            offset = 0
+        else:
+            offset = 2
+        try:
+            payload, offset = _decode_value(data, offset)
+        except (IndexError, UnicodeDecodeError, struct.error) as exception:
+            raise CASSessionCodecError(
+                'Truncated or corrupt session payload: {!r}'.format(exception))
+        if offset != len(data):
+            raise CASSessionCodecError('Trailing bytes in session payload')
+        return payload
+
+    def encode(self, payload):
+        '''
+        Encode the session ``payload`` into bytes.
+        '''
+        buffer_ = bytearray()
+        _encode_value(buffer_, payload)
+        body = bytes(buffer_)
+        flags = 0
+        if (
+            self._compress_threshold is not None and
+            len(body) >= self._compress_threshold
+            ):
+            compressed = zlib.compress(body, self._compression_level)
+            if len(compressed) < len(body):
+                body = compressed
+                flags |= _FLAG_COMPRESSED
+        return bytes(bytearray((_VERSION, flags))) + body
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def compress_threshold(self):
+        '''
+        The encoded size in bytes from which payloads are compressed, or
+        None to never compress.
+        '''
+        return self._compress_threshold
+
+
+def _decode_value(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == _TEXT or tag == _BYTES:
+        length = data[offset]
+        if length < 0x80:
+            offset += 1
+        else:
+            length, offset = _read_varint(data, offset)
+        end = offset + length
+        if end > len(data):
+            raise IndexError(end)
+        if tag == _TEXT:
+            return data[offset:end].decode('utf-8'), end
+        return bytes(data[offset:end]), end
+    if tag == _DICT:
+        count, offset = _read_varint(data, offset)
+        items = {}
+        for _ in range(count):
+            key, offset = _decode_value(data, offset)
+            items[key], offset = _decode_value(data, offset)
+        return items, offset
+    if tag == _LIST:
+        count, offset = _read_varint(data, offset)
+        items = []
+        for _ in range(count):
+            item, offset = _decode_value(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == _NONE:
+        return None, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _INTEGER:
+        value, offset = _read_varint(data, offset)
+        return (value >> 1) ^ -(value & 1), offset
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(data, offset)[0], offset + 8
+    raise CASSessionCodecError('Unknown session payload tag {}'.format(tag))
+
+
+def _encode_value(buffer_, value):
+    if isinstance(value, six.text_type):
+        encoded = value.encode('utf-8')
+        length = len(encoded)
+        if length < 0x80:
+            buffer_.append(_TEXT)
+            buffer_.append(length)
+        else:
+            buffer_.append(_TEXT)
+            _write_varint(buffer_, length)
+        buffer_ += encoded
+    elif isinstance(value, dict):
+        buffer_.append(_DICT)
+        _write_varint(buffer_, len(value))
+        for key, item in value.items():
+            _encode_value(buffer_, key)
+            _encode_value(buffer_, item)
+    elif value is None:
+        buffer_.append(_NONE)
+    elif value is True:
+        buffer_.append(_TRUE)
+    elif value is False:
+        buffer_.append(_FALSE)
+    elif isinstance(value, six.integer_types):
+        buffer_.append(_INTEGER)
+        _write_varint(buffer_, (value << 1) ^ -1 if value < 0 else value << 1)
+    elif isinstance(value, float):
+        buffer_.append(_FLOAT)
+        buffer_ += _DOUBLE.pack(value)
+    elif isinstance(value, (bytes, bytearray)):
+        buffer_.append(_BYTES)
+        _write_varint(buffer_, len(value))
+        buffer_ += value
+    elif isinstance(value, (list, tuple)):
+        buffer_.append(_LIST)
+        _write_varint(buffer_, len(value))
+        for item in value:
+            _encode_value(buffer_, item)
+    else:
+        raise TypeError('Cannot encode {!r} in a session payload'.format(value))
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_varint(buffer_, value):
+    while value >= 0x80:
+        buffer_.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer_.append(value)
+
+
+__all__ = [
+    'BinaryCASSessionCodec',
+    'CASSessionCodec',
+    'CASSessionCodecError',
+    ]
@@ -0,0 +1,491 @@
+# -*- encoding: utf-8 -*-
+import hashlib
+import mmap
+import os
+import platform
+import struct
+import threading
+import time
+from .cas_client import CASSessionAdapter, _get_payload_user
+from .lifecycle import register_after_fork
+from .session_codecs import BinaryCASSessionCodec
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+_MAGIC = b'CASSHM02'
+
+_HEADER = struct.Struct('<8sIII')
+
+_HEADER_SIZE = 64
+
+_SEQUENCE = struct.Struct('<I')
+
+_SLOT = struct.Struct('<BxHHxxdQ')
+
+_HASH = struct.Struct('<Q')
+
+_READ_ATTEMPTS = 100
+
+# Seqlock reads need stores to become visible in program order.
+_LOCK_FREE_READS = platform.machine().lower() in (
+    'amd64',
+    'i386',
+    'i686',
+    'x86',
+    'x86_64',
+    )
+
+
+class CASSessionTooLargeError(Exception):
+    r'''Raised when a session's ticket and encoded payload do not fit in one
+    slot of a ``SharedMemoryCASSessionAdapter``.
+    '''
+    pass
+
+
+class SharedMemoryCASSessionAdapter(CASSessionAdapter):
+    r'''A session adapter sharing sessions between the worker processes of
+    one host through a memory-mapped file.
+
+    Sessions live in a fixed-size hash table of ``capacity`` sessions in the
+    file at ``path``, preferably on a tmpfs such as ``/dev/shm``. Every
+    process opening the same ``path`` (or forked after opening it) sees the
+    same sessions, without a network round trip. The file is created on
+    first use, and must be removed to change the table's geometry.
+
+    ::
+
+        >>> import os, tempfile
+        >>> from cas_client import SharedMemoryCASSessionAdapter
+        >>> path = os.path.join(tempfile.mkdtemp(), 'sessions')
+        >>> adapter = SharedMemoryCASSessionAdapter(path, capacity=1024)
+        >>> adapter.create('ST-1234', payload={'user': 'jott'}, expires=60)
+        >>> adapter.exists('ST-1234')
+        True
+        >>> adapter.get('ST-1234') == {'user': 'jott'}
+        True
+        >>> adapter.delete('ST-1234')
+        >>> adapter.exists('ST-1234')
+        False
+        >>> adapter.close()
+
+    The table is split into buckets of ``ways`` slots, and a ticket may only
+    be stored in the bucket its hash selects. Each bucket has a sequence
+    counter, odd while the bucket is being written, and readers retry until
+    they see the same even counter before and after reading, so reads take
+    no locks. Writers serialize on a per-bucket POSIX record lock (and a
+    thread lock within the process), which the kernel releases if a worker
+    dies mid-write; the next writer or blocked reader then clears the torn
+    bucket.
+
+    Only x86 processors make stores visible in order without fences, which
+    pure Python cannot issue, so elsewhere reads take the bucket lock too.
+
+    ``expires`` is a time-to-live in seconds, as for memcached. Expired
+    sessions are reused first when a bucket fills up. Otherwise the bucket's
+    clock hand sweeps its slots, sparing each recently read session once,
+    and evicts the first session not read since the hand last passed it.
+
+    Each slot holds ``slot_size`` bytes, including a 24 byte header, the
+    ticket and the payload encoded by ``codec`` (a ``BinaryCASSessionCodec``
+    by default); larger sessions raise ``CASSessionTooLargeError``. With
+    ``index_users``, slots also record a hash of each payload's ``user``,
+    and ``delete_user_sessions`` scans the table for them. Requires
+    ``fcntl``, i.e. a POSIX system.
+    '''
+
+    def __init__(
+        self,
+        path,
+        capacity=65536,
+        slot_size=512,
+        ways=8,
+        codec=None,
+        index_users=False,
+        ):
+        assert fcntl is not None, 'SharedMemoryCASSessionAdapter requires fcntl'
+        assert 0 < ways < 256
+        assert _SLOT.size < slot_size < 65536
+        self.codec = codec or BinaryCASSessionCodec()
+        self._index_users = bool(index_users)
+        self._path = path
+        self._ways = ways
+        self._slot_size = slot_size
+        self._buckets = max(1, -(-capacity // ways))
+        self._bucket_header = struct.Struct('<IB3x{}Q'.format(ways))
+        self._bucket_size = self._bucket_header.size + ways * slot_size
+        self._size = _HEADER_SIZE + self._buckets * self._bucket_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._initialize()
+            self._mmap = mmap.mmap(self._fd, self._size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+        self._metrics = dict.fromkeys(
+            ('evictions', 'hits', 'misses', 'read_retries', 'repairs'), 0)
+        register_after_fork(self)
+
+    ### PUBLIC METHODS ###
+
+    def close(self):
+        '''
+        Unmap the table and close its file. The sessions remain in the file.
+        '''
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            os.close(self._fd)
+
+    def create(self, ticket, payload=None, expires=None):
+        '''
+        Create a session identifier in shared memory associated with
+        ``ticket``, evicting another session if its bucket is full.
+        '''
+        if not payload:
+            payload = True
+        key = str(ticket).encode('utf-8')
+        user_hash = 0
+        if self._index_users:
+            user_hash = _get_user_hash(_get_payload_user(payload))
+        value = self._encode(payload)
+        if _SLOT.size + len(key) + len(value) > self._slot_size:
+            raise CASSessionTooLargeError(
+                'Session for {} needs {} bytes, slots hold {}'.format(
+                    ticket,
+                    _SLOT.size + len(key) + len(value),
+                    self._slot_size,
+                    ))
+        expires_at = time.time() + expires if expires else 0.0
+        key_hash, bucket = self._get_location(key)
+        with self._lock_bucket(bucket) as offset:
+            hashes = self._bucket_header.unpack_from(self._mmap, offset)[2:]
+            index = self._find(offset, hashes, key_hash, key)
+            if index is None:
+                index = self._choose_slot(offset, hashes)
+            slot_offset = self._get_slot_offset(offset, index)
+            self._begin_write(offset)
+            _SLOT.pack_into(
+                self._mmap,
+                slot_offset,
+                1,
+                len(key),
+                len(value),
+                expires_at,
+                user_hash,
+                )
+            start = slot_offset + _SLOT.size
+            self._mmap[start:start + len(key) + len(value)] = key + value
+            _HASH.pack_into(self._mmap, self._get_hash_offset(offset, index), key_hash)
+            self._end_write(offset)
+
+    def delete(self, ticket):
+        '''
+        Destroy a session identifier in shared memory associated with
+        ``ticket``.
+        '''
+        key = str(ticket).encode('utf-8')
+        key_hash, bucket = self._get_location(key)
+        with self._lock_bucket(bucket) as offset:
+            hashes = self._bucket_header.unpack_from(self._mmap, offset)[2:]
+            index = self._find(offset, hashes, key_hash, key)
+            if index is not None:
+                self._begin_write(offset)
+                _HASH.pack_into(self._mmap, self._get_hash_offset(offset, index), 0)
+                self._end_write(offset)
+
+    def delete_user_sessions(self, user):
+        '''
+        Destroy every session identifier associated with ``user``, returning
+        how many of them had not expired yet. Scans the whole table.
+        '''
+        assert self._index_users
+        user_hash = _get_user_hash(user)
+        count = 0
+        for bucket in range(self._buckets):
+            offset = _HEADER_SIZE + bucket * self._bucket_size
+            # Skip buckets without the user's sessions without locking them.
+            if _LOCK_FREE_READS and not self._find_user(offset, user_hash):
+                continue
+            with self._lock_bucket(bucket) as offset:
+                indices = self._find_user(offset, user_hash)
+                if not indices:
+                    continue
+                now = time.time()
+                self._begin_write(offset)
+                for index in indices:
+                    expires_at = _SLOT.unpack_from(
+                        self._mmap, self._get_slot_offset(offset, index))[3]
+                    if not expires_at or expires_at > now:
+                        count += 1
+                    _HASH.pack_into(
+                        self._mmap, self._get_hash_offset(offset, index), 0)
+                self._end_write(offset)
+        return count
+
+    def exists(self, ticket):
+        '''
+        Test if a session identifier exists for ``ticket``.
+        '''
+        return self._read(ticket, False) is not None
+
+    def get(self, ticket):
+        '''
+        Get the payload of the session associated with ``ticket``, or None
+        if there is no such session.
+        '''
+        value = self._read(ticket, True)
+        if value is None:
+            return None
+        return self._decode(value)
+
+    def touch(self, ticket, expires):
+        '''
+        Reset the time-to-live of the session associated with ``ticket`` to
+        ``expires`` seconds.
+        '''
+        key = str(ticket).encode('utf-8')
+        expires_at = time.time() + expires if expires else 0.0
+        key_hash, bucket = self._get_location(key)
+        with self._lock_bucket(bucket) as offset:
+            hashes = self._bucket_header.unpack_from(self._mmap, offset)[2:]
+            index = self._find(offset, hashes, key_hash, key)
+            if index is not None:
+                slot_offset = self._get_slot_offset(offset, index)
+                _, key_length, value_length, _, user_hash = _SLOT.unpack_from(
+                    self._mmap, slot_offset)
+                self._begin_write(offset)
+                _SLOT.pack_into(
+                    self._mmap,
+                    slot_offset,
+                    1,
+                    key_length,
+                    value_length,
+                    expires_at,
+                    user_hash,
+                    )
+                self._end_write(offset)
+
+    ### PRIVATE METHODS ###
+
+    def _after_fork(self):
+        self._thread_locks = [threading.Lock() for _ in self._thread_locks]
+
+    def _begin_write(self, offset):
+        sequence = _SEQUENCE.unpack_from(self._mmap, offset)[0]
+        _SEQUENCE.pack_into(self._mmap, offset, (sequence + 1) & 0xffffffff)
+
+    def _choose_slot(self, offset, hashes):
+        now = time.time()
+        for index, key_hash in enumerate(hashes):
+            if not key_hash:
+                return index
+        for index in range(self._ways):
+            expires_at = _SLOT.unpack_from(
+                self._mmap, self._get_slot_offset(offset, index))[3]
+            if expires_at and expires_at <= now:
+                return index
+        # Clock eviction: spare each recently read session once.
+        hand = bytearray(self._mmap[offset + 4:offset + 5])[0] % self._ways
+        for _ in range(2 * self._ways):
+            slot_offset = self._get_slot_offset(offset, hand)
+            index, hand = hand, (hand + 1) % self._ways
+            if self._mmap[slot_offset:slot_offset + 1] == b'\x00':
+                break
+            self._mmap[slot_offset:slot_offset + 1] = b'\x00'
+        self._mmap[offset + 4:offset + 5] = struct.pack('<B', hand)
+        self._metrics['evictions'] += 1
+        return index
+
+    def _end_write(self, offset):
+        self._begin_write(offset)
+
+    def _find(self, offset, hashes, key_hash, key):
+        for index, slot_hash in enumerate(hashes):
+            if slot_hash == key_hash:
+                slot_offset = self._get_slot_offset(offset, index)
+                key_length = _SLOT.unpack_from(self._mmap, slot_offset)[1]
+                start = slot_offset + _SLOT.size
+                if self._mmap[start:start + key_length] == key:
+                    return index
+        return None
+
+    def _find_user(self, offset, user_hash):
+        hashes = self._bucket_header.unpack_from(self._mmap, offset)[2:]
+        return [
+            index
+            for index, key_hash in enumerate(hashes)
+            if key_hash and _SLOT.unpack_from(
+                self._mmap, self._get_slot_offset(offset, index))[4] == user_hash
+            ]
+
+    def _get_hash_offset(self, offset, index):
+        return offset + 8 + index * 8
+
+    def _get_location(self, key):
+        key_hash = _HASH.unpack_from(hashlib.sha256(key).digest())[0] or 1
+        bucket = key_hash % self._buckets
+        return key_hash, bucket
+
+    def _get_slot_offset(self, offset, index):
+        return offset + self._bucket_header.size + index * self._slot_size
+
+    def _initialize(self):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, self._size)
+                header = _HEADER.pack(
+                    _MAGIC, self._buckets, self._ways, self._slot_size)
+                os.write(self._fd, header)
+                return
+            header = os.read(self._fd, _HEADER.size)
+            expected = (_MAGIC, self._buckets, self._ways, self._slot_size)
+            if len(header) < _HEADER.size or _HEADER.unpack(header) != expected:
+                raise ValueError(
+                    '{} is not a session table with {} buckets of {} slots '
+                    'of {} bytes'.format(self._path, *expected[1:]))
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+
+    def _lock_bucket(self, bucket):
+        return _BucketLock(self, bucket)
+
+    def _read(self, ticket, with_value):
+        key = str(ticket).encode('utf-8')
+        key_hash, bucket = self._get_location(key)
+        offset = _HEADER_SIZE + bucket * self._bucket_size
+        found = False
+        if _LOCK_FREE_READS:
+            for _ in range(_READ_ATTEMPTS):
+                found = self._read_bucket(offset, key_hash, key, with_value)
+                if found is not False:
+                    break
+                self._metrics['read_retries'] += 1
+        if found is False:
+            # No lock-free reads here, or a writer is stalled or died
+            # mid-write: wait for its lock.
+            with self._lock_bucket(bucket):
+                found = self._read_bucket(offset, key_hash, key, with_value)
+                if found is not None:
+                    self._mark_referenced(found[0])
+        elif found is not None:
+            # A racy store: at worst a session is spared by one more sweep.
+            self._mark_referenced(found[0])
+        if found is None:
+            self._metrics['misses'] += 1
+            return None
+        self._metrics['hits'] += 1
+        return found[1]
+
+    def _mark_referenced(self, slot_offset):
+        self._mmap[slot_offset:slot_offset + 1] = b'\x01'
+
+    def _read_bucket(self, offset, key_hash, key, with_value):
+        # Returns False if a write raced with the read.
+        header = self._bucket_header.unpack_from(self._mmap, offset)
+        sequence = header[0]
+        if sequence & 1:
+            return False
+        found = None
+        for index, slot_hash in enumerate(header[2:]):
+            if slot_hash != key_hash:
+                continue
+            slot_offset = self._get_slot_offset(offset, index)
+            _, key_length, value_length, expires_at, _ = _SLOT.unpack_from(
+                self._mmap, slot_offset)
+            start = slot_offset + _SLOT.size
+            if _SLOT.size + key_length + value_length > self._slot_size:
+                return False
+            if self._mmap[start:start + key_length] != key:
+                continue
+            if expires_at and expires_at <= time.time():
+                break
+            value = True
+            if with_value:
+                start += key_length
+                value = self._mmap[start:start + value_length]
+            found = slot_offset, value
+            break
+        if _SEQUENCE.unpack_from(self._mmap, offset)[0] != sequence:
+            return False
+        return found
+
+    def _repair(self, offset):
+        # The last writer died mid-write: drop the possibly torn bucket.
+        self._mmap[offset + 8:offset + self._bucket_header.size] = (
+            b'\x00' * (self._bucket_header.size - 8))
+        self._end_write(offset)
+        self._metrics['repairs'] += 1
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def capacity(self):
+        '''
+        The number of sessions the table holds.
+        '''
+        return self._buckets * self._ways
+
+    @property
+    def metrics(self):
+        '''
+        This process's approximate counts of evictions, read hits and
+        misses, lock-free reads retried because of a concurrent write, and
+        torn buckets cleared.
+        '''
+        return dict(self._metrics)
+
+    @property
+    def path(self):
+        '''
+        The path of the memory-mapped file.
+        '''
+        return self._path
+
+
+def _get_user_hash(user):
+    if user is None:
+        return 0
+    if not isinstance(user, bytes):
+        user = user.encode('utf-8')
+    return _HASH.unpack_from(hashlib.sha256(user).digest())[0] or 1
+
+
+class _BucketLock(object):
+
+    __slots__ = ('_adapter', '_bucket', '_offset', '_thread_lock')
+
+    def __init__(self, adapter, bucket):
+        self._adapter = adapter
+        self._bucket = bucket
+        self._offset = _HEADER_SIZE + bucket * adapter._bucket_size
+        locks = adapter._thread_locks
+        self._thread_lock = locks[bucket % len(locks)]
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            fcntl.lockf(self._adapter._fd, fcntl.LOCK_EX, 1, self._offset)
+        except Exception:
+            self._thread_lock.release()
+            raise
+        if _SEQUENCE.unpack_from(self._adapter._mmap, self._offset)[0] & 1:
+            self._adapter._repair(self._offset)
+        return self._offset
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            fcntl.lockf(self._adapter._fd, fcntl.LOCK_UN, 1, self._offset)
+        finally:
+            self._thread_lock.release()
+
+
+__all__ = [
+    'CASSessionTooLargeError',
+    'SharedMemoryCASSessionAdapter',
+    ]
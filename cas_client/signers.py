@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+import abc
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import ECC, RSA
+from Crypto.Signature import DSS, PKCS1_v1_5, eddsa
+
+
+class CASSigner(object):
+    '''
+    Abstract base class for auth token signers.
+
+    Signers parse their private key once, on construction, so reusing a
+    signer across calls avoids re-importing the key every time a token is
+    signed.
+
+    Tokens signed with anything but RSA, the algorithm CAS servers have
+    always assumed, name the signer's ``algorithm`` in their ``alg`` field.
+    '''
+
+    __metaclass__ = abc.ABCMeta
+
+    algorithm = None
+
+    @abc.abstractmethod
+    def sign(self, message):
+        '''
+        Sign the bytes ``message``, returning the raw signature bytes.
+        '''
+        raise NotImplementedError
+
+
+class RSASigner(CASSigner):
+    r'''An RSA PKCS#1 v1.5 signer over SHA256 digests.
+
+    The algorithm CAS auth token logins have always used.
+    '''
+
+    algorithm = 'RS256'
+
+    def __init__(self, private_key):
+        if not isinstance(private_key, RSA.RsaKey):
+            private_key = RSA.importKey(private_key)
+        self._signer = PKCS1_v1_5.new(private_key)
+
+    def sign(self, message):
+        '''
+        Sign the bytes ``message``, returning the raw signature bytes.
+        '''
+        return self._signer.sign(SHA256.new(message))
+
+
+class ECDSASigner(CASSigner):
+    r'''An ECDSA signer over SHA256 digests.
+
+    Signatures are deterministic (RFC 6979) and DER-encoded by default, as
+    expected by OpenSSL-based verifiers.
+
+    ::
+
+        >>> from Crypto.PublicKey import ECC
+        >>> from cas_client import ECDSASigner
+        >>> private_key = ECC.generate(curve='P-256').export_key(format='PEM')
+        >>> signer = ECDSASigner(private_key)
+        >>> signer.sign(b'token') == signer.sign(b'token')
+        True
+
+    '''
+
+    algorithm = 'ES256'
+
+    def __init__(
+        self,
+        private_key,
+        mode='deterministic-rfc6979',
+        encoding='der',
+        ):
+        if not isinstance(private_key, ECC.EccKey):
+            private_key = ECC.import_key(private_key)
+        self._signer = DSS.new(private_key, mode, encoding=encoding)
+
+    def sign(self, message):
+        '''
+        Sign the bytes ``message``, returning the raw signature bytes.
+        '''
+        return self._signer.sign(SHA256.new(message))
+
+
+class Ed25519Signer(CASSigner):
+    r'''An Ed25519 signer.
+
+    ::
+
+        >>> from Crypto.PublicKey import ECC
+        >>> from cas_client import Ed25519Signer
+        >>> private_key = ECC.generate(curve='Ed25519').export_key(format='PEM')
+        >>> len(Ed25519Signer(private_key).sign(b'token'))
+        64
+
+    '''
+
+    algorithm = 'EdDSA'
+
+    def __init__(self, private_key):
+        if not isinstance(private_key, ECC.EccKey):
+            private_key = ECC.import_key(private_key)
+        self._signer = eddsa.new(private_key, 'rfc8032')
+
+    def sign(self, message):
+        '''
+        Sign the bytes ``message``, returning the raw signature bytes.
+        '''
+        return self._signer.sign(message)
+
+
+def _get_token_fields(signer):
+    # RSA tokens are left as they always were.
+    if signer.algorithm in (None, RSASigner.algorithm):
+        return {}
+    return {'alg': signer.algorithm}
+
+
+__all__ = [
+    'CASSigner',
+    'ECDSASigner',
+    'Ed25519Signer',
+    'RSASigner',
+    ]
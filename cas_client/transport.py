@@ -0,0 +1,193 @@
+# -*- encoding: utf-8 -*-
+import logging
+import os
+import requests
+import requests.certs
+import ssl
+import threading
+import weakref
+from requests.adapters import HTTPAdapter
+from .lifecycle import register_after_fork
+
+
+_HAS_SSL_SESSIONS = hasattr(ssl.SSLSocket, 'session')
+
+
+class CASHTTPAdapter(HTTPAdapter):
+    r'''A ``requests`` transport adapter sharing one SSL context between all
+    of its pooled connections.
+
+    ``requests`` normally hands its CA bundle to every new connection, which
+    reloads it into a fresh verification context. Here the bundle is loaded
+    into ``ssl_context`` once, up front, and every connection is wrapped with
+    that same context.
+    '''
+
+    def __init__(self, ssl_context, **kwargs):
+        self._ssl_context = ssl_context
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = HTTPAdapter.build_connection_pool_key_attributes(
+            self,
+            request,
+            verify,
+            cert,
+            )
+        pool_kwargs.pop('ca_certs', None)
+        pool_kwargs.pop('ca_cert_dir', None)
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        HTTPAdapter.cert_verify(self, conn, url, verify, cert)
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return HTTPAdapter.proxy_manager_for(self, *args, **kwargs)
+
+    @property
+    def ssl_context(self):
+        '''
+        The SSL context shared by the adapter's connections.
+        '''
+        return self._ssl_context
+
+
+if _HAS_SSL_SESSIONS:
+
+    class _ResumingSSLContext(ssl.SSLContext):
+
+        def __init__(self, protocol):
+            self._sessions_lock = threading.Lock()
+            self._sessions = {}
+            self._sockets = {}
+            register_after_fork(self)
+
+        def wrap_socket(self, sock, *args, **kwargs):
+            server_hostname = kwargs.get('server_hostname')
+            if (
+                server_hostname is not None and
+                not kwargs.get('server_side') and
+                kwargs.get('session') is None
+                ):
+                kwargs['session'] = self._get_session(server_hostname)
+            ssl_socket = ssl.SSLContext.wrap_socket(self, sock, *args, **kwargs)
+            if server_hostname is not None and not kwargs.get('server_side'):
+                with self._sessions_lock:
+                    self._sockets[server_hostname] = weakref.ref(ssl_socket)
+                    if ssl_socket.session is not None:
+                        self._sessions[server_hostname] = ssl_socket.session
+            return ssl_socket
+
+        def _after_fork(self):
+            # Sessions stay resumable; the parent's sockets are not ours.
+            self._sessions_lock = threading.Lock()
+            self._sockets = {}
+
+        def _get_session(self, server_hostname):
+            # TLS 1.3 servers only issue session tickets after the handshake,
+            # so prefer the session of the most recent live connection.
+            with self._sessions_lock:
+                reference = self._sockets.get(server_hostname)
+                ssl_socket = reference() if reference is not None else None
+                if ssl_socket is not None:
+                    try:
+                        session = ssl_socket.session
+                    except (OSError, ValueError):
+                        session = None
+                    if session is not None:
+                        self._sessions[server_hostname] = session
+                return self._sessions.get(server_hostname)
+
+
+class _KeepaliveThread(threading.Thread):
+
+    def __init__(self, client, interval):
+        threading.Thread.__init__(self, name='cas-client-keepalive')
+        self.daemon = True
+        self._client = weakref.ref(client)
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            client = self._client()
+            if client is None:
+                return
+            try:
+                client.warm_up(connections=client._warm_up_connections)
+            except Exception:
+                logging.exception('[CAS] Keepalive failed')
+            del client
+
+    def stop(self):
+        self._stopped.set()
+
+
+def create_http_session(ssl_context, pool_connections=10, pool_maxsize=10):
+    '''
+    Create a ``requests.Session`` whose connection pools share
+    ``ssl_context``.
+    '''
+    http_session = requests.Session()
+    adapter = CASHTTPAdapter(
+        ssl_context,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        )
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    return http_session
+
+
+def _reset_http_session(http_session):
+    # Give every adapter fresh, empty connection pools, leaving the pools
+    # (and any locks) inherited from the parent process untouched.
+    for adapter in http_session.adapters.values():
+        if isinstance(adapter, HTTPAdapter):
+            adapter.proxy_manager = {}
+            adapter.init_poolmanager(
+                adapter._pool_connections,
+                adapter._pool_maxsize,
+                block=adapter._pool_block,
+                )
+
+
+def create_ssl_context(ca_bundle=None, verify_certificates=True):
+    '''
+    Create a client SSL context, loading ``ca_bundle`` (or the bundle
+    ``requests`` uses by default) once.
+
+    On Python 3.6 and newer, the context resumes TLS sessions per server
+    hostname, so reconnecting to a CAS host skips the full handshake.
+    '''
+    protocol = getattr(ssl, 'PROTOCOL_TLS_CLIENT', ssl.PROTOCOL_SSLv23)
+    if _HAS_SSL_SESSIONS:
+        ssl_context = _ResumingSSLContext(protocol)
+    else:
+        ssl_context = ssl.SSLContext(protocol)
+    if verify_certificates:
+        ssl_context.verify_mode = ssl.CERT_REQUIRED
+        ssl_context.check_hostname = True
+        ca_bundle = ca_bundle or requests.certs.where()
+        if os.path.isdir(ca_bundle):
+            ssl_context.load_verify_locations(capath=ca_bundle)
+        else:
+            ssl_context.load_verify_locations(cafile=ca_bundle)
+    else:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+
+__all__ = [
+    'CASHTTPAdapter',
+    'create_http_session',
+    'create_ssl_context',
+    ]
@@ -0,0 +1,302 @@
+# -*- encoding: utf-8 -*-
+import collections
+import io
+import logging
+import threading
+import time
+from wsgiref.util import request_uri
+from xml.parsers.expat import ExpatError
+from .lifecycle import register_after_fork
+try:
+    from urllib import quote, urlencode
+    from urlparse import parse_qsl
+except ImportError:
+    from urllib.parse import parse_qsl, quote, urlencode
+
+
+_RETRY_AFTER = '5'
+
+_UNAVAILABLE_BODY = b'CAS authentication is temporarily unavailable.'
+
+
+class CASWSGIMiddleware(object):
+    '''
+    WSGI middleware protecting an application with CAS authentication.
+
+    ::
+
+        >>> from cas_client import CASClient, MemoryCASSessionAdapter
+        >>> from cas_client.wsgi import CASWSGIMiddleware
+        >>> client = CASClient(
+        ...     'https://logmein.com',
+        ...     session_storage_adapter=MemoryCASSessionAdapter(),
+        ...     )
+        >>> def application(environ, start_response):
+        ...     start_response('200 OK', [('Content-Type', 'text/plain')])
+        ...     return [b'Hello ' + environ['cas_client.ticket'].encode()]
+        ...
+        >>> application = CASWSGIMiddleware(application, client)
+
+    Unauthenticated requests are redirected to the CAS `login` endpoint. The
+    service ticket CAS redirects back with is validated once, recorded through
+    the client's session storage adapter and handed to the browser in a
+    cookie. Subsequent requests only cost a single session adapter lookup, or
+    none at all while the ticket sits in the optional in-process near-cache.
+
+    If the ticket cannot be validated because the CAS server (or the
+    session store) is unreachable, overloaded or answers with something
+    other than a CAS response, the error is logged and the browser gets a
+    ``503 Service Unavailable``.
+
+    Back-channel `LogoutRequest` POSTs from the CAS server delete the session
+    associated with their session index. A POST is only treated as one if
+    its ``logoutRequest`` field parses and carries a `SessionIndex`, and, if
+    ``logout_path`` is set, only on that path; anything else goes through
+    like any other request. If ``proxy_callback_path`` is set,
+    requests to that path are answered without authentication and their
+    ``pgtIou``/``pgtId`` pair is handed to the client's
+    ``handle_proxy_callback``.
+
+    The near-cache is disabled by default: it is only invalidated by logout
+    requests received by the same process, so ``near_cache_ttl`` bounds how
+    long a session may outlive a logout handled by another worker.
+    '''
+
+    def __init__(
+        self,
+        application,
+        cas_client,
+        service_url=None,
+        cookie_name='cas_ticket',
+        session_expires=None,
+        near_cache_ttl=0,
+        near_cache_size=10000,
+        proxy_callback_path=None,
+        logout_path=None,
+        ):
+        self._application = application
+        self._cas_client = cas_client
+        self._service_url = service_url
+        self._cookie_name = cookie_name
+        self._session_expires = session_expires
+        self._proxy_callback_path = proxy_callback_path
+        self._logout_path = logout_path
+        self._near_cache = None
+        if near_cache_ttl:
+            self._near_cache = _NearCache(near_cache_ttl, near_cache_size)
+
+    ### SPECIAL METHODS ###
+
+    def __call__(self, environ, start_response):
+        if (
+            self._proxy_callback_path is not None and
+            environ.get('PATH_INFO') == self._proxy_callback_path
+            ):
+            self._handle_proxy_callback(environ.get('QUERY_STRING', ''))
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'']
+        if (
+            environ.get('REQUEST_METHOD') == 'POST' and
+            self._logout_path in (None, environ.get('PATH_INFO'))
+            ):
+            logout_request = self._read_logout_request(environ)
+            ticket = _get_session_index(self._cas_client, logout_request)
+            if ticket:
+                self._handle_logout_request(ticket)
+                start_response('200 OK', [('Content-Type', 'text/plain')])
+                return [b'']
+        ticket = _get_cookie(environ.get('HTTP_COOKIE'), self.cookie_name)
+        if ticket and self._session_exists(ticket):
+            environ['cas_client.ticket'] = ticket
+            return self._application(environ, start_response)
+        query = parse_qsl(
+            environ.get('QUERY_STRING', ''),
+            keep_blank_values=True,
+            )
+        ticket = dict(query).get('ticket')
+        service_url = self._get_service_url(environ, query)
+        try:
+            validated = ticket and self._validate_ticket(ticket, service_url)
+        except Exception:
+            # Another trip through CAS login would only fail the same way.
+            logging.exception('[CAS] Could not validate ticket {}'.format(ticket))
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'text/plain'),
+                ('Retry-After', _RETRY_AFTER),
+                ])
+            return [_UNAVAILABLE_BODY]
+        if validated:
+            headers = [
+                ('Location', service_url),
+                ('Set-Cookie', _build_cookie(
+                    self.cookie_name,
+                    ticket,
+                    secure=environ.get('wsgi.url_scheme') == 'https',
+                    )),
+                ]
+            start_response('302 Found', headers)
+            return [b'']
+        login_url = self._cas_client.get_login_url(
+            service_url=quote(service_url, safe=''),
+            )
+        start_response('302 Found', [('Location', login_url)])
+        return [b'']
+
+    ### PRIVATE METHODS ###
+
+    def _get_service_url(self, environ, query):
+        if self._service_url:
+            return self._service_url
+        url = request_uri(environ, include_query=False)
+        query = [(key, value) for key, value in query if key != 'ticket']
+        if query:
+            url = '{}?{}'.format(url, urlencode(query))
+        return url
+
+    def _handle_logout_request(self, ticket):
+        if self._near_cache is not None:
+            self._near_cache.discard(ticket)
+        self._cas_client.delete_session(ticket)
+
+    def _handle_proxy_callback(self, query_string):
+        query = dict(parse_qsl(query_string))
+        if query.get('pgtIou') and query.get('pgtId'):
+            self._cas_client.handle_proxy_callback(
+                query['pgtIou'],
+                query['pgtId'],
+                )
+
+    def _read_logout_request(self, environ):
+        content_type = environ.get('CONTENT_TYPE', '')
+        if not content_type.startswith('application/x-www-form-urlencoded'):
+            return None
+        try:
+            content_length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if content_length <= 0:
+            return None
+        body = environ['wsgi.input'].read(content_length)
+        environ['wsgi.input'] = io.BytesIO(body)
+        return _get_logout_request(body)
+
+    def _session_exists(self, ticket):
+        if self._near_cache is not None and ticket in self._near_cache:
+            return True
+        if not self._cas_client.session_exists(ticket):
+            return False
+        if self._near_cache is not None:
+            self._near_cache.add(ticket)
+        return True
+
+    def _validate_ticket(self, ticket, service_url):
+        response = self._cas_client.perform_service_validate(
+            ticket=ticket,
+            service_url=quote(service_url, safe=''),
+            )
+        if response is None or not response.success:
+            logging.debug('[CAS] Ticket {} failed validation'.format(ticket))
+            return False
+        self._cas_client.create_session(
+            ticket,
+            payload={
+                'user': response.user,
+                'attributes': response.attributes,
+                },
+            expires=self.session_expires,
+            )
+        if self._near_cache is not None:
+            self._near_cache.add(ticket)
+        return True
+
+    ### PUBLIC PROPERTIES ###
+
+    @property
+    def cookie_name(self):
+        '''
+        The name of the cookie carrying the validated service ticket.
+        '''
+        return self._cookie_name
+
+    @property
+    def session_expires(self):
+        '''
+        The expiry passed to the session storage adapter for new sessions.
+        '''
+        return self._session_expires
+
+
+class _NearCache(object):
+
+    def __init__(self, ttl, size):
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._size = size
+        self._ttl = ttl
+        register_after_fork(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __contains__(self, ticket):
+        with self._lock:
+            expires_at = self._entries.get(ticket)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._entries[ticket]
+                return False
+        return True
+
+    def add(self, ticket):
+        with self._lock:
+            self._entries.pop(ticket, None)
+            self._entries[ticket] = time.time() + self._ttl
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def discard(self, ticket):
+        with self._lock:
+            self._entries.pop(ticket, None)
+
+
+def _build_cookie(name, value, secure=False):
+    cookie = '{}={}; Path=/; HttpOnly'.format(name, value)
+    if secure:
+        cookie += '; Secure'
+    return cookie
+
+
+def _get_cookie(cookie_header, name):
+    if not cookie_header:
+        return None
+    for part in cookie_header.split(';'):
+        key, _, value = part.partition('=')
+        if key.strip() == name:
+            return value.strip().strip('"') or None
+    return None
+
+
+def _get_session_index(cas_client, logout_request):
+    if logout_request is None:
+        return None
+    try:
+        parsed = cas_client.parse_logout_request(logout_request)
+    except ExpatError:
+        logging.warning('[CAS] Ignoring malformed LogoutRequest', exc_info=True)
+        return None
+    return parsed.get('session_index')
+
+
+def _get_logout_request(body):
+    if b'logoutRequest=' not in body:
+        return None
+    for key, value in parse_qsl(body.decode('utf-8', 'replace')):
+        if key == 'logoutRequest':
+            return value
+    return None
+
+
+__all__ = [
+    'CASWSGIMiddleware',
+    ]
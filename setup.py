@@ -26,7 +26,8 @@ setuptools.setup(
     description='A Python CAS client',
     include_package_data=True,
     install_requires=[
-        'pycryptodome',
+        'futures; python_version < "3"',
+        'pycryptodome>=3.15',
         'requests',
         'six',
         'tox',
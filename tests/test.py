@@ -1,8 +1,18 @@
 # -*- encoding: utf-8 -*-
+import io
 import json
 import os
+import requests
+import threading
+import time
 import unittest
-from cas_client import CASClient, CASResponse
+from cas_client import (
+    CASClient,
+    CASResponse,
+    CASResponseTooLargeError,
+    MemcachedCASProxyGrantingTicketStore,
+    MemoryCASProxyGrantingTicketStore,
+    )
 try:
     from urlparse import parse_qs
 except ImportError:
@@ -31,6 +41,15 @@ class TestCase(unittest.TestCase):
     </cas:serviceResponse>
     """
 
+    proxy_response_text = """
+    <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationSuccess>
+            <cas:user>jott</cas:user>
+            <cas:proxyGrantingTicket>PGTIOU-1234</cas:proxyGrantingTicket>
+        </cas:authenticationSuccess>
+    </cas:serviceResponse>
+    """
+
     slo_text = """
     <samlp:LogoutRequest
         xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol"
@@ -386,3 +405,213 @@ class TestCase(unittest.TestCase):
 
 
 
+
+    def test_perform_proxy_validate(self):
+        cas_client = CASClient('https://dummy.url', proxy_callback='https://callback.url')
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = self.response_text
+            response = cas_client.perform_proxy_validate('PT-1234')
+            m.assert_called_once_with(
+                'https://dummy.url/cas/proxyValidate?ticket=PT-1234&service=https://callback.url',
+                headers=None
+            )
+        self.assertTrue(response.success)
+        self.assertEqual(response.user, 'jott')
+
+    def test_validate_many(self):
+        def perform_get(url, headers=None, http_session=None):
+            assert http_session is not None
+            if 'PT-2' in url:
+                raise requests.ConnectionError('boom')
+            return self.response_text
+
+        cas_client = CASClient('https://dummy.url')
+        tickets = [('PT-{}'.format(i), 'https://app.url') for i in range(5)]
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.side_effect = perform_get
+            results = cas_client.validate_many(tickets, max_workers=3)
+        self.assertEqual(m.call_count, 5)
+        self.assertEqual(
+            [(result.ticket, result.service_url) for result in results],
+            tickets,
+        )
+        for i, result in enumerate(results):
+            if i == 2:
+                self.assertIsNone(result.response)
+                self.assertIsInstance(result.error, requests.ConnectionError)
+            else:
+                self.assertIsNone(result.error)
+                self.assertEqual(result.response.user, 'jott')
+
+    def test_validate_many_as_completed(self):
+        cas_client = CASClient('https://dummy.url')
+        tickets = [('PT-{}'.format(i), 'https://app.url') for i in range(5)]
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = self.response_text
+            results = list(cas_client.validate_many(tickets, as_completed=True))
+        self.assertEqual(
+            sorted(result.ticket for result in results),
+            [ticket for ticket, _ in tickets],
+        )
+        self.assertTrue(all(result.response.success for result in results))
+
+    def test_perform_service_validate_proxy_url(self):
+        cas_client = CASClient(
+            'https://dummy.url',
+            proxy_url='https://app.url/callback',
+            proxy_granting_ticket_store=MemoryCASProxyGrantingTicketStore(),
+            )
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = self.proxy_response_text
+            response = cas_client.perform_service_validate(
+                ticket='FOO',
+                service_url='BAR',
+                )
+            m.assert_called_once_with(
+                'https://dummy.url/cas/serviceValidate?ticket=FOO&service=BAR'
+                '&pgtUrl=https://app.url/callback',
+                headers=None
+            )
+        self.assertEqual(response.proxy_granting_ticket, 'PGTIOU-1234')
+        cas_client.handle_proxy_callback('PGTIOU-1234', 'PGT-1234')
+        pgt_id = cas_client.get_proxy_granting_ticket(
+            response.proxy_granting_ticket)
+        self.assertEqual(pgt_id, 'PGT-1234')
+
+    def test_proxy_granting_ticket_store_wakes_waiter(self):
+        store = MemoryCASProxyGrantingTicketStore()
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(store.wait('PGTIOU-1234', timeout=5)),
+            )
+        waiter.start()
+        time.sleep(0.05)
+        started = time.time()
+        store.set('PGTIOU-1234', 'PGT-1234')
+        waiter.join()
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(results, ['PGT-1234'])
+        metrics = store.metrics
+        self.assertEqual(metrics['callbacks'], 1)
+        self.assertEqual(metrics['hits'], 1)
+        self.assertEqual(metrics['misses'], 0)
+
+    def test_proxy_granting_ticket_store_ttl(self):
+        store = MemoryCASProxyGrantingTicketStore(ttl=60)
+        with mock.patch('time.time') as m:
+            m.return_value = 1000.
+            store.set('PGTIOU-1234', 'PGT-1234')
+            m.return_value = 1061.
+            self.assertIsNone(store.wait('PGTIOU-1234', timeout=0))
+        self.assertEqual(store.metrics['misses'], 1)
+
+    def test_memcached_proxy_granting_ticket_store(self):
+        client = mock.Mock()
+        client.get.return_value = ('PGT-1234', time.time())
+        store = MemcachedCASProxyGrantingTicketStore(client, ttl=30)
+        store.set('PGTIOU-1234', 'PGT-1234')
+        self.assertEqual(client.set.call_args[0][0], 'PGTIOU-1234')
+        self.assertEqual(client.set.call_args[0][2], 30)
+        self.assertEqual(store.wait('PGTIOU-1234', timeout=1), 'PGT-1234')
+        client.delete.assert_called_once_with('PGTIOU-1234')
+
+    def _mock_streaming_response(self, body, content_length=None):
+        response = mock.Mock()
+        response.raw = io.BytesIO(body)
+        response.headers = {}
+        if content_length is not None:
+            response.headers['Content-Length'] = str(content_length)
+        return response
+
+    def test_perform_service_validate_streaming(self):
+        cas_client = CASClient('https://dummy.url', stream_responses=True)
+        with mock.patch('requests.get') as m:
+            m.return_value = self._mock_streaming_response(
+                self.response_text.encode('utf-8'))
+            response = cas_client.perform_service_validate(
+                ticket='FOO',
+                service_url='BAR',
+                )
+        m.assert_called_with(
+            'https://dummy.url/cas/serviceValidate?ticket=FOO&service=BAR',
+            headers=None,
+            stream=True,
+            verify=False,
+            )
+        m.return_value.close.assert_called_once_with()
+        self.assertIsNone(response.response_text)
+        self.assertTrue(response.success)
+        self.assertEqual(response.user, 'jott')
+        self.assertEqual(response.attributes['puid'], u'0012345678')
+
+    def test_perform_service_validate_streaming_xml_declaration(self):
+        cas_client = CASClient('https://dummy.url', stream_responses=True)
+        body = '\n<?xml version="1.0" encoding="UTF-8"?>\n' + self.response_text.strip()
+        with mock.patch('requests.get') as m:
+            m.return_value = self._mock_streaming_response(body.encode('utf-8'))
+            response = cas_client.perform_service_validate(ticket='FOO')
+        self.assertTrue(response.success)
+        self.assertEqual(response.user, 'jott')
+
+    def test_response_from_file(self):
+        failure_text = """
+        <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+            <cas:authenticationFailure code="INVALID_TICKET">
+                Ticket ST-1234 not recognized
+            </cas:authenticationFailure>
+        </cas:serviceResponse>
+        """
+        mixed_text = """
+        <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+            <!-- comment -->
+            <cas:authenticationSuccess>
+                <cas:user>jo<![CDATA[ignored]]>tt<!-- x -->  </cas:user>
+                <cas:attributes>
+                    <cas:name>Jeffrey &amp; Ott</cas:name>
+                    <cas:empty/>
+                </cas:attributes>
+            </cas:authenticationSuccess>
+            <cas:authenticationFailure code="IGNORED"/>
+        </cas:serviceResponse>
+        """
+        for text in (
+            self.response_text,
+            self.proxy_response_text,
+            failure_text,
+            mixed_text,
+            ):
+            buffered = CASResponse(text.strip())
+            for chunk_size in (7, 65536):
+                streamed = CASResponse.from_file(
+                    io.BytesIO(text.strip().encode('utf-8')),
+                    chunk_size=chunk_size,
+                    )
+                self.assertEqual(streamed.response_type, buffered.response_type)
+                self.assertEqual(streamed.data, buffered.data)
+                self.assertEqual(streamed.error, buffered.error)
+        with self.assertRaises(Exception):
+            CASResponse.from_file(io.BytesIO(b'<html>Bad gateway</html>'))
+
+    def test_perform_service_validate_streaming_empty(self):
+        cas_client = CASClient('https://dummy.url', stream_responses=True)
+        with mock.patch('requests.get') as m:
+            m.return_value = self._mock_streaming_response(b'\n  \n')
+            response = cas_client.perform_service_validate(ticket='FOO')
+        self.assertIsNone(response)
+
+    def test_perform_service_validate_streaming_too_large(self):
+        cas_client = CASClient(
+            'https://dummy.url',
+            stream_responses=True,
+            max_response_size=64,
+            )
+        body = self.response_text.encode('utf-8')
+        with mock.patch('requests.get') as m:
+            m.return_value = self._mock_streaming_response(body)
+            with self.assertRaises(CASResponseTooLargeError):
+                cas_client.perform_service_validate(ticket='FOO')
+            m.return_value.close.assert_called_once_with()
+            m.return_value = self._mock_streaming_response(body, len(body))
+            with self.assertRaises(CASResponseTooLargeError):
+                cas_client.perform_service_validate(ticket='FOO')
+            self.assertEqual(m.return_value.raw.tell(), 0)
@@ -0,0 +1,119 @@
+# -*- encoding: utf-8 -*-
+import requests
+import threading
+import time
+import unittest
+from cas_client import (
+    CASAdmissionController,
+    CASAdmissionError,
+    CASClient,
+    )
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    def test_priority_order(self):
+        controller = CASAdmissionController(
+            initial_limit=1,
+            max_limit=1,
+            queue_timeout=5,
+            )
+        admitted = []
+
+        def call(priority):
+            with controller.admit(priority):
+                admitted.append(priority)
+
+        threads = []
+        with controller.admit('validate'):
+            for priority in ('api', 'validate', 'slo'):
+                thread = threading.Thread(target=call, args=(priority,))
+                thread.start()
+                threads.append(thread)
+                deadline = time.time() + 5
+                while (
+                    controller.metrics['queued'] < len(threads) and
+                    time.time() < deadline
+                    ):
+                    time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted, ['slo', 'validate', 'api'])
+        metrics = controller.metrics
+        self.assertEqual(metrics['admitted'], {'slo': 1, 'validate': 2, 'api': 1})
+        self.assertEqual(metrics['inflight'], 0)
+        self.assertEqual(metrics['queued'], 0)
+        self.assertGreater(metrics['queue_seconds_max'], 0)
+
+    def test_queue_full(self):
+        controller = CASAdmissionController(initial_limit=1, queue_size=0)
+        with controller.admit('validate'):
+            with self.assertRaises(CASAdmissionError):
+                with controller.admit('api'):
+                    pass
+        self.assertEqual(controller.metrics['rejected']['api'], 1)
+        self.assertEqual(controller.metrics['timeouts']['api'], 0)
+
+    def test_queue_timeout(self):
+        controller = CASAdmissionController(initial_limit=1, queue_timeout=0.01)
+        with controller.admit('validate'):
+            with self.assertRaises(CASAdmissionError):
+                with controller.admit('api'):
+                    pass
+        metrics = controller.metrics
+        self.assertEqual(metrics['rejected']['api'], 1)
+        self.assertEqual(metrics['timeouts']['api'], 1)
+        self.assertEqual(metrics['queued'], 0)
+        with controller.admit('api'):
+            pass
+
+    def test_limit_decreases(self):
+        controller = CASAdmissionController(
+            initial_limit=10,
+            latency_threshold=0,
+            backoff_ratio=0.5,
+            )
+        with controller.admit('validate'):
+            time.sleep(0.001)
+        self.assertEqual(controller.limit, 5)
+        controller = CASAdmissionController(initial_limit=10, backoff_ratio=0.5)
+        with self.assertRaises(requests.ConnectionError):
+            with controller.admit('validate'):
+                raise requests.ConnectionError
+        self.assertEqual(controller.limit, 5)
+        with self.assertRaises(ValueError):
+            with controller.admit('validate'):
+                raise ValueError
+        self.assertEqual(controller.limit, 5)
+
+    def test_limit_increases(self):
+        controller = CASAdmissionController(initial_limit=2, max_limit=3)
+        with controller.admit('validate'):
+            for _ in range(10):
+                with controller.admit('validate'):
+                    pass
+        self.assertEqual(controller.limit, 3)
+        for _ in range(10):
+            with controller.admit('validate'):
+                pass
+        self.assertEqual(controller.limit, 3)
+
+    def test_client(self):
+        controller = CASAdmissionController(initial_limit=1, queue_size=0)
+        cas_client = CASClient(
+            'https://dummy.url',
+            admission_controller=controller,
+            )
+        with mock.patch('requests.get') as m:
+            with controller.admit('slo'):
+                with self.assertRaises(CASAdmissionError):
+                    cas_client.perform_service_validate(ticket='ST-1234')
+                validations = cas_client.validate_many(
+                    [('ST-1234', 'https://app.url')])
+                self.assertIsInstance(validations[0].error, CASAdmissionError)
+            self.assertFalse(m.called)
+        self.assertEqual(controller.metrics['rejected']['validate'], 2)
@@ -0,0 +1,129 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import requests
+import unittest
+from Crypto.PublicKey import ECC
+from cas_client import CASAPISession, CASClient, Ed25519Signer
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    private_key_filepath = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'test_private_key.pem',
+        )
+
+    def setUp(self):
+        with open(self.private_key_filepath, 'r') as file_pointer:
+            self.private_key = file_pointer.read()
+        self.cas_client = CASClient('https://dummy.url')
+
+    def test_get_url_matches_get_api_url(self):
+        session = CASAPISession(
+            self.cas_client,
+            'do_something_useful',
+            'my_company_ldap',
+            private_key=self.private_key,
+            service_url='https://example.com/?a=b',
+            you='should_know',
+            )
+        for token_fields in ({}, {'and': 'another_thing', 'zed': [1, {'b': 2, 'a': 1}]}):
+            self.assertEqual(
+                session.get_url('ATT-1234', **token_fields),
+                self.cas_client.get_api_url(
+                    api_resource='do_something_useful',
+                    auth_token_ticket='ATT-1234',
+                    authenticator='my_company_ldap',
+                    private_key=self.private_key,
+                    service_url='https://example.com/?a=b',
+                    you='should_know',
+                    **token_fields
+                    ),
+                )
+        with self.assertRaises(TypeError):
+            session.get_url('ATT-1234', you='again')
+        session.close()
+
+    def test_get_url_names_signer_algorithm(self):
+        signer = Ed25519Signer(ECC.generate(curve='Ed25519'))
+        session = CASAPISession(
+            self.cas_client,
+            'do_something_useful',
+            'my_company_ldap',
+            private_key=signer,
+            )
+        self.assertEqual(
+            session.get_url('ATT-1234', you='should_know'),
+            self.cas_client.get_api_url(
+                api_resource='do_something_useful',
+                auth_token_ticket='ATT-1234',
+                authenticator='my_company_ldap',
+                private_key=signer,
+                you='should_know',
+                ),
+            )
+        self.assertIn('"alg": "EdDSA"', session._build_auth_token('ATT-1234', {}))
+        session.close()
+
+    def test_perform_many(self):
+        session = CASAPISession(
+            self.cas_client,
+            'do_something_useful',
+            'my_company_ldap',
+            private_key=self.private_key,
+            max_workers=3,
+            )
+        tickets = iter(range(100))
+
+        def perform_post(url, headers=None, data=None, http_session=None):
+            assert http_session is session.http_session
+            if url.endswith('/auth_token_tickets'):
+                return json.dumps({'ticket': 'ATT-{}'.format(next(tickets))})
+            if data == 'boom':
+                raise requests.ConnectionError('boom')
+            return data.upper()
+
+        calls = [('one', None), ('boom', None), ('three', {'username': 'jott'})]
+        with mock.patch('cas_client.CASClient._perform_post') as m:
+            m.side_effect = perform_post
+            results = session.perform_many(calls)
+        self.assertEqual(m.call_count, 6)
+        self.assertEqual(
+            [(result.body, result.token_fields) for result in results],
+            calls,
+            )
+        self.assertEqual(results[0].response, 'ONE')
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].response)
+        self.assertIsInstance(results[1].error, requests.ConnectionError)
+        self.assertEqual(results[2].response, 'THREE')
+        urls = [call[0][0] for call in m.call_args_list]
+        self.assertEqual(len(set(urls)), 4)
+        session.close()
+
+    def test_uses_client_http_session(self):
+        cas_client = CASClient('https://dummy.url', persistent_connections=True)
+        session = CASAPISession(
+            cas_client,
+            'do_something_useful',
+            'my_company_ldap',
+            private_key=self.private_key,
+            method='GET',
+            )
+        self.assertIs(session.http_session, cas_client.http_session)
+        with mock.patch('cas_client.CASClient._perform_post') as post:
+            post.return_value = '{"ticket": "ATT-1234"}'
+            with mock.patch('cas_client.CASClient._perform_get') as get:
+                get.return_value = 'OK'
+                self.assertEqual(session.perform(username='jott'), 'OK')
+        self.assertEqual(
+            get.call_args[0][0],
+            session.get_url('ATT-1234', username='jott'),
+            )
+        session.close()
+        cas_client.close()
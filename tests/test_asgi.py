@@ -0,0 +1,261 @@
+# -*- encoding: utf-8 -*-
+import asyncio
+import requests
+import threading
+import time
+import unittest
+from cas_client import CASClient, MemoryCASSessionAdapter
+from cas_client.asgi import CASASGIMiddleware
+from urllib.parse import urlencode
+from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    response_text = """
+    <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationSuccess>
+            <cas:user>jott</cas:user>
+        </cas:authenticationSuccess>
+    </cas:serviceResponse>
+    """
+
+    slo_text = """
+    <samlp:LogoutRequest
+        xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol"
+        xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion"
+        ID="[RANDOM ID]"
+        Version="2.0"
+        IssueInstant="[CURRENT DATE/TIME]">
+        <saml:NameID>@NOT_USED@</saml:NameID>
+        <samlp:SessionIndex>ST-1234</samlp:SessionIndex>
+    </samlp:LogoutRequest>
+    """
+
+    def setUp(self):
+        self.adapter = MemoryCASSessionAdapter()
+        self.cas_client = CASClient(
+            'https://dummy.url',
+            session_storage_adapter=self.adapter,
+            )
+        self.scopes = []
+        self.bodies = []
+
+        async def application(scope, receive, send):
+            self.scopes.append(scope)
+            if scope['method'] == 'POST':
+                self.bodies.append((await receive())['body'])
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [],
+                })
+            await send({'type': 'http.response.body', 'body': b'OK'})
+
+        self.application = application
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _call(self, middleware, path='/', query='', cookie=None, method='GET', body=b''):
+        headers = [(b'host', b'app.url')]
+        if cookie:
+            headers.append((b'cookie', cookie.encode('latin-1')))
+        if body:
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+        scope = {
+            'type': 'http',
+            'method': method,
+            'scheme': 'https',
+            'path': path,
+            'query_string': query.encode('latin-1'),
+            'headers': headers,
+            }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.loop.run_until_complete(middleware(scope, receive, send))
+        start = messages[0]
+        return {
+            'status': start['status'],
+            'headers': {
+                key.decode('latin-1'): value.decode('latin-1')
+                for key, value in start['headers']
+                },
+            'body': b''.join(message.get('body', b'') for message in messages[1:]),
+            }
+
+    def test_redirect_to_login(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        result = self._call(middleware, path='/page', query='a=1')
+        self.assertEqual(result['status'], 302)
+        self.assertEqual(
+            result['headers']['location'],
+            'https://dummy.url/cas/login?service=https%3A%2F%2Fapp.url%2Fpage%3Fa%3D1',
+            )
+        self.assertEqual(self.scopes, [])
+
+    def test_validate_ticket(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        threads = []
+
+        def perform_get(url, headers=None):
+            threads.append(threading.current_thread())
+            return self.response_text
+
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.side_effect = perform_get
+            result = self._call(middleware, path='/page', query='a=1&ticket=ST-1234')
+            m.assert_called_once_with(
+                'https://dummy.url/cas/serviceValidate?ticket=ST-1234'
+                '&service=https%3A%2F%2Fapp.url%2Fpage%3Fa%3D1',
+                headers=None,
+                )
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertEqual(result['status'], 302)
+        self.assertEqual(result['headers']['location'], 'https://app.url/page?a=1')
+        self.assertEqual(
+            result['headers']['set-cookie'],
+            'cas_ticket=ST-1234; Path=/; HttpOnly; Secure',
+            )
+        self.assertTrue(self.adapter.exists('ST-1234'))
+
+    def test_validate_ticket_error(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        for side_effect in (
+            requests.ConnectionError('refused'),
+            requests.Timeout('timed out'),
+            ):
+            with mock.patch('cas_client.CASClient._perform_get') as m:
+                m.side_effect = side_effect
+                result = self._call(middleware, path='/page', query='ticket=ST-1')
+            self.assertEqual(result['status'], 503)
+            self.assertEqual(result['headers']['retry-after'], '5')
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = '<html>Bad gateway</html>'
+            result = self._call(middleware, path='/page', query='ticket=ST-2')
+        self.assertEqual(result['status'], 503)
+        self.assertNotIn('set-cookie', result['headers'])
+        self.assertFalse(self.adapter.exists('ST-2'))
+        self.assertEqual(self.scopes, [])
+
+    def test_authenticated_request(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        self.adapter.create('ST-1234')
+        result = self._call(middleware, cookie='cas_ticket=ST-1234')
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(result['body'], b'OK')
+        self.assertEqual(self.scopes[0]['cas_client.ticket'], 'ST-1234')
+
+    def test_logout_request(self):
+        middleware = CASASGIMiddleware(
+            self.application,
+            self.cas_client,
+            near_cache_ttl=60,
+            )
+        self.adapter.create('ST-1234')
+        result = self._call(middleware, cookie='cas_ticket=ST-1234')
+        self.assertEqual(result['status'], 200)
+        body = urlencode({'logoutRequest': self.slo_text}).encode('utf-8')
+        result = self._call(middleware, method='POST', body=body)
+        self.assertEqual(result['status'], 200)
+        self.assertFalse(self.adapter.exists('ST-1234'))
+        result = self._call(middleware, cookie='cas_ticket=ST-1234')
+        self.assertEqual(result['status'], 302)
+
+    def test_malformed_logout_request(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        self.adapter.create('ST-1234')
+        for value in ('<not-xml', '<form>ST-1234</form>'):
+            body = urlencode({'logoutRequest': value}).encode('utf-8')
+            result = self._call(middleware, method='POST', body=body)
+            self.assertEqual(result['status'], 302)
+            result = self._call(
+                middleware,
+                cookie='cas_ticket=ST-1234',
+                method='POST',
+                body=body,
+                )
+            self.assertEqual(result['status'], 200)
+            self.assertEqual(self.bodies[-1], body)
+        self.assertTrue(self.adapter.exists('ST-1234'))
+
+    def test_logout_path(self):
+        middleware = CASASGIMiddleware(
+            self.application,
+            self.cas_client,
+            logout_path='/cas/logout',
+            )
+        self.adapter.create('ST-1234')
+        body = urlencode({'logoutRequest': self.slo_text}).encode('utf-8')
+        result = self._call(
+            middleware,
+            path='/form',
+            cookie='cas_ticket=ST-1234',
+            method='POST',
+            body=body,
+            )
+        self.assertEqual(result['status'], 200)
+        self.assertTrue(self.adapter.exists('ST-1234'))
+        result = self._call(middleware, path='/cas/logout', method='POST', body=body)
+        self.assertEqual(result['status'], 200)
+        self.assertFalse(self.adapter.exists('ST-1234'))
+
+    def test_post_body_is_preserved(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        self.adapter.create('ST-1234')
+        result = self._call(
+            middleware,
+            cookie='cas_ticket=ST-1234',
+            method='POST',
+            body=b'a=1&b=2',
+            )
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(self.bodies, [b'a=1&b=2'])
+
+    def test_validation_does_not_block_event_loop(self):
+        middleware = CASASGIMiddleware(self.application, self.cas_client)
+        ticks = []
+
+        def perform_get(url, headers=None):
+            time.sleep(0.2)
+            return self.response_text
+
+        async def heartbeat():
+            for _ in range(10):
+                ticks.append(time.time())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(heartbeat(), self._validate(middleware))
+
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.side_effect = perform_get
+            self.loop.run_until_complete(run())
+        self.assertTrue(self.adapter.exists('ST-1234'))
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        self.assertLess(max(gaps), 0.1)
+
+    async def _validate(self, middleware):
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'scheme': 'https',
+            'path': '/',
+            'query_string': b'ticket=ST-1234',
+            'headers': [(b'host', b'app.url')],
+            }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            pass
+
+        await middleware(scope, receive, send)
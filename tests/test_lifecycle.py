@@ -0,0 +1,169 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import threading
+import unittest
+from cas_client import (
+    CASAdmissionController,
+    CASClient,
+    MemoryCASSessionAdapter,
+    SlidingExpiryCASSessionAdapter,
+    reset_after_fork,
+    )
+from six.moves import BaseHTTPServer, socketserver
+
+
+@unittest.skipUnless(
+    hasattr(os, 'register_at_fork'),
+    'requires os.register_at_fork',
+    )
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        requests = self.requests = []
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                requests.append(self.client_address)
+                body = b'{"ticket": "AT-1234"}'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_HEAD = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server_url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fork(self, function):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                result = function()
+            except BaseException as exception:
+                result = {'error': repr(exception)}
+            os.write(write_fd, json.dumps(result).encode('utf-8'))
+            os._exit(0)
+        os.close(write_fd)
+        chunks = []
+        while True:
+            chunk = os.read(read_fd, 4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        return json.loads(b''.join(chunks).decode('utf-8'))
+
+    def test_forked_workers_get_their_own_sockets(self):
+        cas_client = CASClient(self.server_url, persistent_connections=True)
+        url = self.server_url + '/cas/api/ping'
+
+        def call():
+            return cas_client.perform_api_request(url, method='GET')
+
+        def child():
+            adapter = cas_client.http_session.get_adapter(url)
+            return {
+                'pools': len(adapter.poolmanager.pools),
+                'responses': [call(), call()],
+                }
+
+        call()
+        results = [self.fork(child) for _ in range(2)]
+        call()
+        for result in results:
+            self.assertEqual(result, {
+                'pools': 0,
+                'responses': ['{"ticket": "AT-1234"}'] * 2,
+                })
+        ports = [port for _, port in self.requests]
+        self.assertEqual(len(ports), 6)
+        # Each process reuses its own connection, and only its own.
+        self.assertEqual(ports[0], ports[5])
+        self.assertEqual(ports[1], ports[2])
+        self.assertEqual(ports[3], ports[4])
+        self.assertEqual(len(set([ports[0], ports[1], ports[3]])), 3)
+        cas_client.close()
+
+    def test_keepalive_thread_is_restarted(self):
+        cas_client = CASClient(
+            self.server_url,
+            persistent_connections=True,
+            keepalive_interval=60,
+            )
+        parent_thread = cas_client._keepalive_thread
+
+        def child():
+            thread = cas_client._keepalive_thread
+            return {
+                'alive': thread.is_alive(),
+                'replaced': thread is not parent_thread,
+                }
+
+        self.assertEqual(self.fork(child), {'alive': True, 'replaced': True})
+        self.assertIs(cas_client._keepalive_thread, parent_thread)
+        cas_client.close()
+
+    def test_process_local_state_is_reset(self):
+        controller = CASAdmissionController(initial_limit=1)
+        adapter = SlidingExpiryCASSessionAdapter(
+            MemoryCASSessionAdapter(),
+            expires=600,
+            flush_interval=None,
+            min_touch_interval=0,
+            )
+        adapter.create('ST-1234')
+        adapter.exists('ST-1234')
+
+        def child():
+            with controller.admit('api'):
+                pass
+            reset_after_fork()
+            return {
+                'exists': adapter.exists('ST-1234'),
+                'inflight': controller.metrics['inflight'],
+                'touched': adapter.flush(),
+                }
+
+        with controller.admit('api'):
+            result = self.fork(child)
+        self.assertEqual(result, {'exists': True, 'inflight': 0, 'touched': 1})
+        self.assertEqual(adapter.flush(), 1)
+
+    def test_preload(self):
+        from Crypto.PublicKey import RSA
+        private_key = RSA.generate(2048).export_key().decode('ascii')
+        cas_client = CASClient(self.server_url)
+        ssl_context = cas_client.preload(private_keys=[private_key])
+        signer = cas_client._get_signer(private_key)
+
+        def child():
+            return {
+                'signer': id(cas_client._get_signer(private_key)),
+                'ssl_context': id(cas_client.ssl_context),
+                }
+
+        self.assertEqual(self.fork(child), {
+            'signer': id(signer),
+            'ssl_context': id(ssl_context),
+            })
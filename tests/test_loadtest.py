@@ -0,0 +1,73 @@
+# -*- encoding: utf-8 -*-
+import json
+import unittest
+from cas_client import loadtest
+from six import StringIO
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestCase(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(
+            loadtest.parse_mix('login_url=1, session=2.5,slo'),
+            {'login_url': 1.0, 'session': 2.5, 'slo': 1.0},
+            )
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('login_url=1,unknown=1')
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('login_url=0')
+
+    def test_run_load_test(self):
+        report = loadtest.run_load_test(
+            mode='threads',
+            workers=2,
+            duration=0.5,
+            key_bits=1024,
+            seed=1,
+            )
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(sorted(report['operations']), sorted(loadtest.OPERATIONS))
+        self.assertEqual(
+            report['total'],
+            sum(item['count'] for item in report['operations'].values()),
+            )
+        for item in report['operations'].values():
+            self.assertEqual(item['errors'], 0)
+            self.assertEqual(
+                sorted(item['latency_seconds']),
+                ['max', 'mean', 'p50', 'p90', 'p99'],
+                )
+            self.assertLessEqual(
+                item['latency_seconds']['p50'],
+                item['latency_seconds']['max'],
+                )
+
+    def test_no_workers(self):
+        for mode in ('asyncio', 'processes', 'threads'):
+            with self.assertRaises(ValueError):
+                loadtest.run_load_test(mode=mode, workers=0, key_bits=1024)
+        with mock.patch('sys.stderr', StringIO()):
+            with self.assertRaises(SystemExit):
+                loadtest.main(['--workers', '0'])
+
+    def test_main(self):
+        stdout = StringIO()
+        with mock.patch('sys.stdout', stdout):
+            loadtest.main([
+                '--mode', 'asyncio',
+                '--workers', '2',
+                '--duration', '0.2',
+                '--mix', 'service_validate=1,slo=1',
+                '--key-bits', '1024',
+                ])
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report['mode'], 'asyncio')
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(
+            sorted(report['operations']),
+            ['service_validate', 'slo'],
+            )
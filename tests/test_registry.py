@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+import os
+import unittest
+from cas_client import CASClientRegistry
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    private_key_filepath = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'test_private_key.pem',
+        )
+
+    def test_memoization(self):
+        registry = CASClientRegistry()
+        client = registry.get_client(
+            'shop',
+            server_url='https://dummy.url',
+            service_url='https://shop.url',
+            headers={'baz': 'quux'},
+            )
+        self.assertIs(client, registry.get_client(
+            'shop',
+            server_url='https://dummy.url',
+            service_url='https://shop.url',
+            headers={'baz': 'quux'},
+            ))
+        replacement = registry.get_client(
+            'shop',
+            server_url='https://dummy.url',
+            service_url='https://shop.url',
+            auth_prefix='',
+            )
+        self.assertIsNot(client, replacement)
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry.metrics['tenants']['shop']['created'], 2)
+        self.assertEqual(registry.metrics['tenants']['shop']['hits'], 1)
+        registry.close()
+
+    def test_shared_resources(self):
+        with open(self.private_key_filepath, 'r') as file_pointer:
+            private_key = file_pointer.read()
+        registry = CASClientRegistry()
+        clients = [
+            registry.get_client(
+                'tenant-{}'.format(i),
+                server_url='https://cas-{}.url'.format(i % 2),
+                service_url='https://tenant-{}.url'.format(i),
+                private_key=private_key,
+                )
+            for i in range(4)
+            ]
+        self.assertEqual(len(set(id(client.http_session) for client in clients)), 1)
+        self.assertEqual(len(set(id(client.signer) for client in clients)), 1)
+        verified_client = registry.get_client(
+            'verified',
+            server_url='https://dummy.url',
+            verify_certificates=True,
+            )
+        self.assertIsNot(verified_client.http_session, clients[0].http_session)
+        self.assertEqual(registry.metrics['http_sessions'], 2)
+        self.assertEqual(registry.metrics['signers'], 1)
+        registry.close()
+
+    def test_lru_eviction(self):
+        registry = CASClientRegistry(max_clients=2)
+        for tenant in ('a', 'b', 'a', 'c'):
+            registry.get_client(tenant, server_url='https://dummy.url')
+        self.assertIn('a', registry)
+        self.assertNotIn('b', registry)
+        self.assertIn('c', registry)
+        self.assertEqual(registry.metrics['evictions'], 1)
+        registry.close()
+
+    def test_idle_eviction(self):
+        registry = CASClientRegistry(idle_timeout=60)
+        with mock.patch('time.time') as m:
+            m.return_value = 1000.
+            registry.get_client('a', server_url='https://dummy.url')
+            m.return_value = 1030.
+            registry.get_client('b', server_url='https://dummy.url')
+            m.return_value = 1070.
+            registry.get_client('b', server_url='https://dummy.url')
+        self.assertNotIn('a', registry)
+        self.assertIn('b', registry)
+        registry.close()
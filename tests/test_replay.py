@@ -0,0 +1,119 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from cas_client import (
+    CASClient,
+    CASTrafficRecorder,
+    CASTrafficReplayer,
+    redact_url,
+    )
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    response_text = """
+    <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationSuccess>
+            <cas:user>jott</cas:user>
+            <cas:proxyGrantingTicket>PGTIOU-84678-8a9d2sfa23casd</cas:proxyGrantingTicket>
+        </cas:authenticationSuccess>
+    </cas:serviceResponse>
+    """
+
+    slo_text = """
+    <samlp:LogoutRequest
+        xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol"
+        xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion"
+        ID="[RANDOM ID]"
+        Version="2.0"
+        IssueInstant="[CURRENT DATE/TIME]">
+        <saml:NameID>@NOT_USED@</saml:NameID>
+        <samlp:SessionIndex>ST-14600760351898-0B3lSFt2jOWSbgQ377B4CtbD9uq0MXR9kG23vAuH</samlp:SessionIndex>
+    </samlp:LogoutRequest>
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'traffic.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record_traffic(self):
+        class MockResponse(object):
+            text = self.response_text
+
+        recorder = CASTrafficRecorder(self.path)
+        cas_client = CASClient('https://dummy.url', recorder=recorder)
+        with mock.patch('requests.get') as m:
+            m.return_value = MockResponse()
+            for _ in range(3):
+                cas_client.perform_service_validate(
+                    ticket='ST-1-secret',
+                    service_url='https://app.url',
+                    )
+        cas_client.parse_logout_request(self.slo_text)
+        recorder.close()
+
+    def test_record(self):
+        self.record_traffic()
+        with open(self.path) as file_pointer:
+            text = file_pointer.read()
+        records = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual(
+            [record['k'] for record in records],
+            ['serviceValidate'] * 3 + ['logoutRequest'],
+            )
+        self.assertEqual(records[0]['m'], 'GET')
+        self.assertIn('ticket=ST-REDACTED', records[0]['u'])
+        self.assertIn('PGTIOU-REDACTED', records[0]['b'])
+        self.assertIn('ST-REDACTED', records[3]['b'])
+        self.assertNotIn('secret', text)
+        self.assertNotIn('84678', text)
+        self.assertNotIn('0B3lSFt2jOWSbgQ377B4CtbD9uq0MXR9kG23vAuH', text)
+
+    def test_redact_url(self):
+        url = redact_url(
+            'https://dummy.url/cas/api/foo?at=eyJmb28iOiAiYmFyIn0%3D&ats=c2lnbmF0dXJl')
+        self.assertEqual(url, 'https://dummy.url/cas/api/foo?at=REDACTED&ats=REDACTED')
+
+    def test_replay(self):
+        self.record_traffic()
+        replayer = CASTrafficReplayer(self.path, speed=None, max_workers=2)
+        report = replayer.run()
+        self.assertEqual(report['calls'], 4)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['kinds']['serviceValidate']['calls'], 3)
+        self.assertEqual(report['kinds']['logoutRequest']['calls'], 1)
+        latency = report['latency']
+        self.assertTrue(latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max'])
+        self.assertGreater(report['throughput'], 0)
+
+    def test_replay_responses(self):
+        self.record_traffic()
+        responses = []
+        original = CASClient.perform_service_validate
+
+        def perform_service_validate(client, *args, **kwargs):
+            response = original(client, *args, **kwargs)
+            responses.append(response)
+            return response
+
+        with mock.patch.object(
+            CASClient,
+            'perform_service_validate',
+            perform_service_validate,
+            ):
+            CASTrafficReplayer(self.path, speed=None).run()
+        self.assertEqual(len(responses), 3)
+        for response in responses:
+            self.assertTrue(response.success)
+            self.assertEqual(response.user, 'jott')
+            self.assertEqual(response.proxy_granting_ticket, 'PGTIOU-REDACTED')
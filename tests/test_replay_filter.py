@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+import unittest
+from cas_client import CASClient, CASTicketReplayFilter
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    response_text = """
+    <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationSuccess>
+            <cas:user>jott</cas:user>
+        </cas:authenticationSuccess>
+    </cas:serviceResponse>
+    """
+
+    def test_false_positive_rate(self):
+        replay_filter = CASTicketReplayFilter(capacity=6000, error_rate=0.01)
+        for index in range(6000):
+            replay_filter.add('ST-{}'.format(index))
+        for index in range(6000):
+            self.assertIn('ST-{}'.format(index), replay_filter)
+        false_positives = sum(
+            'PT-{}'.format(index) in replay_filter for index in range(20000))
+        self.assertLess(false_positives, 200)
+        metrics = replay_filter.metrics
+        self.assertEqual(metrics['added'], 6000)
+        self.assertEqual(metrics['rejected'], 6000 + false_positives)
+        self.assertEqual(metrics['slices'], 6)
+        self.assertLess(metrics['bytes'], 6000 * 2)
+
+    def test_expiry(self):
+        replay_filter = CASTicketReplayFilter(ttl=60, slices=6)
+        with mock.patch('time.time') as m:
+            m.return_value = 1000.
+            replay_filter.add('ST-1')
+            m.return_value = 1035.
+            replay_filter.add('ST-2')
+            m.return_value = 1060.
+            self.assertIn('ST-1', replay_filter)
+            m.return_value = 1070.
+            self.assertNotIn('ST-1', replay_filter)
+            self.assertIn('ST-2', replay_filter)
+            m.return_value = 1105.
+            self.assertNotIn('ST-2', replay_filter)
+            self.assertEqual(replay_filter.metrics['slices'], 0)
+
+    def test_client_rejects_replays(self):
+        class MockResponse(object):
+            text = self.response_text
+
+        replay_filter = CASTicketReplayFilter()
+        cas_client = CASClient(
+            'https://dummy.url',
+            ticket_replay_filter=replay_filter,
+            )
+        with mock.patch('requests.get') as m:
+            m.return_value = MockResponse()
+            response = cas_client.perform_service_validate(ticket='ST-1234')
+            self.assertTrue(response.success)
+            response = cas_client.perform_service_validate(ticket='ST-1234')
+            self.assertEqual(m.call_count, 1)
+        self.assertFalse(response.success)
+        self.assertEqual(response.response_type, 'authenticationFailure')
+        self.assertEqual(replay_filter.metrics['rejected'], 1)
+        validations = cas_client.validate_many([('ST-1234', 'https://app.url')])
+        self.assertFalse(validations[0].response.success)
+        self.assertIsNone(validations[0].error)
+
+    def test_client_failed_call_is_not_remembered(self):
+        replay_filter = CASTicketReplayFilter()
+        cas_client = CASClient(
+            'https://dummy.url',
+            ticket_replay_filter=replay_filter,
+            )
+        with mock.patch('requests.get') as m:
+            m.return_value.text = ''
+            self.assertIsNone(cas_client.perform_service_validate(ticket='ST-1234'))
+        self.assertNotIn('ST-1234', replay_filter)
+
+    def test_client_proxy_granting_tickets_are_reusable(self):
+        proxy_response_text = """
+        <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+            <cas:proxySuccess>
+                <cas:proxyTicket>PT-1234</cas:proxyTicket>
+            </cas:proxySuccess>
+        </cas:serviceResponse>
+        """
+        replay_filter = CASTicketReplayFilter()
+        cas_client = CASClient(
+            'https://dummy.url',
+            ticket_replay_filter=replay_filter,
+            )
+        with mock.patch('requests.get') as m:
+            m.return_value.text = proxy_response_text
+            for _ in range(2):
+                response = cas_client.perform_proxy('PGT-abc')
+                self.assertEqual(response.response_type, 'proxySuccess')
+            self.assertEqual(m.call_count, 2)
+        self.assertNotIn('PGT-abc', replay_filter)
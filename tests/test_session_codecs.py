@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+import datetime
+import unittest
+from cas_client import (
+    BinaryCASSessionCodec,
+    CASClient,
+    CASSessionCodecError,
+    MemcachedCASSessionAdapter,
+    MemoryCASSessionAdapter,
+    )
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    payload = {
+        'user': u'jott',
+        'attributes': {
+            u'email': u'jott@purdue.edu',
+            u'fullname': u'Jeffrey A Ött',
+            u'groups': [u'staff', u'faculty'],
+            u'puid': 12345678,
+            u'balance': -12.5,
+            u'active': True,
+            u'manager': None,
+            u'photo': b'\x00\xff',
+            },
+        }
+
+    def test_round_trip(self):
+        codec = BinaryCASSessionCodec(compress_threshold=None)
+        for payload in (self.payload, True, -(2 ** 70), 0, u'', [], {}):
+            data = codec.encode(payload)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(data[:2], b'\x01\x00')
+            self.assertEqual(codec.decode(data), payload)
+
+    def test_compression(self):
+        codec = BinaryCASSessionCodec(compress_threshold=64)
+        payload = {'user': u'jott', 'attributes': {'roles': [u'member'] * 100}}
+        data = codec.encode(payload)
+        self.assertEqual(data[:2], b'\x01\x01')
+        self.assertLess(len(data), len(BinaryCASSessionCodec(None).encode(payload)))
+        self.assertEqual(codec.decode(data), payload)
+        self.assertEqual(codec.encode(True)[:2], b'\x01\x00')
+
+    def test_decode_errors(self):
+        codec = BinaryCASSessionCodec()
+        data = codec.encode(self.payload)
+        for corrupt in (b'', b'\x02\x00\x02', data[:-3], data + b'\x00'):
+            with self.assertRaises(CASSessionCodecError):
+                codec.decode(corrupt)
+        with self.assertRaises(TypeError):
+            codec.encode(object())
+
+    def test_memcached_adapter(self):
+        values = {}
+        client = mock.Mock()
+        client.set.side_effect = lambda key, value, expires: values.__setitem__(key, value)
+        client.get.side_effect = values.get
+        adapter = MemcachedCASSessionAdapter(client, codec=BinaryCASSessionCodec())
+        adapter.create('ST-1234', payload=self.payload, expires=60)
+        self.assertIsInstance(values['ST-1234'], bytes)
+        self.assertEqual(client.set.call_args[0][2], 60)
+        self.assertTrue(adapter.exists('ST-1234'))
+        self.assertEqual(adapter.get('ST-1234'), self.payload)
+        self.assertIsNone(adapter.get('ST-5678'))
+        values['ST-5678'] = {'user': 'legacy'}
+        self.assertEqual(adapter.get('ST-5678'), {'user': 'legacy'})
+
+    def test_memcached_adapter_without_codec(self):
+        client = mock.Mock()
+        adapter = MemcachedCASSessionAdapter(client)
+        payload = {
+            'user': 'jott',
+            'login': datetime.datetime(2016, 4, 8),
+            'groups': set(['staff']),
+            }
+        cas_client = CASClient('https://dummy.url', session_storage_adapter=adapter)
+        cas_client.create_session('ST-1234', payload=payload, expires=60)
+        client.set.assert_called_once_with('ST-1234', payload, 60)
+        client.get.return_value = payload
+        self.assertIs(cas_client.get_session('ST-1234'), payload)
+
+    def test_memory_adapter_codec(self):
+        adapter = MemoryCASSessionAdapter(codec=BinaryCASSessionCodec())
+        cas_client = CASClient('https://dummy.url', session_storage_adapter=adapter)
+        cas_client.create_session('ST-1234', payload=self.payload)
+        self.assertEqual(cas_client.get_session('ST-1234'), self.payload)
+        cas_client.create_session('ST-5678')
+        self.assertIs(cas_client.get_session('ST-5678'), True)
+        cas_client.delete_session('ST-1234')
+        self.assertIsNone(cas_client.get_session('ST-1234'))
@@ -0,0 +1,160 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from cas_client import (
+    CASClient,
+    CASSessionTooLargeError,
+    SharedMemoryCASSessionAdapter,
+    )
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sessions')
+        self.adapters = []
+
+    def tearDown(self):
+        for adapter in self.adapters:
+            adapter.close()
+        shutil.rmtree(self.directory)
+
+    def open(self, **kwargs):
+        adapter = SharedMemoryCASSessionAdapter(self.path, **kwargs)
+        self.adapters.append(adapter)
+        return adapter
+
+    def test_sessions_are_shared(self):
+        first = self.open(capacity=64)
+        second = self.open(capacity=64)
+        cas_client = CASClient('https://logmein.com', session_storage_adapter=first)
+        cas_client.create_session('ST-1234', payload={'user': u'jott'})
+        self.assertTrue(second.exists('ST-1234'))
+        self.assertEqual(second.get('ST-1234'), {'user': u'jott'})
+        self.assertIsNone(second.get('ST-5678'))
+        second.create('ST-1234', payload={'user': u'other'})
+        self.assertEqual(first.get('ST-1234'), {'user': u'other'})
+        second.delete('ST-1234')
+        self.assertFalse(cas_client.session_exists('ST-1234'))
+        second.delete('ST-1234')
+
+    def test_locked_reads(self):
+        adapter = self.open(capacity=64)
+        adapter.create('ST-1234', payload={'user': u'jott'})
+        lock_bucket = adapter._lock_bucket
+        with mock.patch('cas_client.shared_memory._LOCK_FREE_READS', False):
+            with mock.patch.object(adapter, '_lock_bucket') as m:
+                m.side_effect = lock_bucket
+                self.assertEqual(adapter.get('ST-1234'), {'user': u'jott'})
+                adapter.delete('ST-1234')
+                self.assertFalse(adapter.exists('ST-1234'))
+            self.assertEqual(m.call_count, 3)
+        self.assertEqual(adapter.metrics['read_retries'], 0)
+
+    def test_delete_user_sessions(self):
+        adapter = self.open(capacity=64, index_users=True)
+        with mock.patch('time.time', return_value=1000.0):
+            for index in range(5):
+                adapter.create('ST-{}'.format(index), payload={'user': u'jött'})
+            adapter.create('ST-5', payload={'user': u'jött'}, expires=60)
+            adapter.create('ST-6', payload={'user': u'other'})
+            adapter.create('ST-7')
+        adapter.delete('ST-0')
+        self.assertEqual(adapter.delete_user_sessions(u'jött'), 4)
+        self.assertEqual(
+            [adapter.exists('ST-{}'.format(index)) for index in range(8)],
+            [False] * 6 + [True, True],
+            )
+        self.assertEqual(adapter.delete_user_sessions(u'jött'), 0)
+        with mock.patch('cas_client.shared_memory._LOCK_FREE_READS', False):
+            self.assertEqual(adapter.delete_user_sessions(u'other'), 1)
+
+    def test_expires(self):
+        adapter = self.open(capacity=64)
+        with mock.patch('time.time', return_value=1000.0):
+            adapter.create('ST-1234', expires=60)
+            adapter.create('ST-5678')
+        with mock.patch('time.time', return_value=1059.0):
+            self.assertTrue(adapter.exists('ST-1234'))
+            adapter.touch('ST-1234', 60)
+        with mock.patch('time.time', return_value=1118.0):
+            self.assertTrue(adapter.exists('ST-1234'))
+        with mock.patch('time.time', return_value=1119.0):
+            self.assertFalse(adapter.exists('ST-1234'))
+            self.assertTrue(adapter.exists('ST-5678'))
+
+    def test_clock_eviction(self):
+        adapter = self.open(capacity=4, ways=4)
+        for index in range(4):
+            adapter.create('ST-{}'.format(index))
+        # New sessions are spared once; reads spare them again.
+        adapter.create('ST-4')
+        self.assertFalse(adapter.exists('ST-0'))
+        self.assertTrue(adapter.exists('ST-2'))
+        adapter.create('ST-5')
+        self.assertFalse(adapter.exists('ST-1'))
+        adapter.create('ST-6')
+        self.assertTrue(adapter.exists('ST-2'))
+        self.assertFalse(adapter.exists('ST-3'))
+        self.assertEqual(adapter.metrics['evictions'], 3)
+
+    def test_expired_sessions_are_evicted_first(self):
+        adapter = self.open(capacity=4, ways=4)
+        with mock.patch('time.time', return_value=1000.0):
+            for index in range(4):
+                adapter.create('ST-{}'.format(index), expires=10 if index == 2 else None)
+        with mock.patch('time.time', return_value=2000.0):
+            adapter.create('ST-4')
+        self.assertEqual(
+            [adapter.exists('ST-{}'.format(index)) for index in range(5)],
+            [True, True, False, True, True],
+            )
+        self.assertEqual(adapter.metrics['evictions'], 0)
+
+    def test_session_too_large(self):
+        adapter = self.open(capacity=64, slot_size=64)
+        with self.assertRaises(CASSessionTooLargeError):
+            adapter.create('ST-1234', payload={'user': u'x' * 64})
+
+    def test_geometry_mismatch(self):
+        self.open(capacity=64)
+        with self.assertRaises(ValueError):
+            self.open(capacity=128)
+
+    def test_torn_bucket_is_cleared(self):
+        adapter = self.open(capacity=4, ways=4)
+        adapter.create('ST-1234')
+        # A writer died between its two sequence counter increments.
+        adapter._begin_write(64)
+        self.assertFalse(adapter.exists('ST-1234'))
+        self.assertEqual(adapter.metrics['repairs'], 1)
+        adapter.create('ST-1234')
+        self.assertTrue(adapter.exists('ST-1234'))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_forked_workers(self):
+        adapter = self.open(capacity=1024)
+        pids = []
+        for worker in range(4):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for index in range(100):
+                        adapter.create('ST-{}-{}'.format(worker, index), expires=60)
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+        self.assertTrue(all(
+            adapter.exists('ST-{}-{}'.format(worker, index))
+            for worker in range(4)
+            for index in range(100)
+            ))
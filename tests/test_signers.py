@@ -0,0 +1,99 @@
+# -*- encoding: utf-8 -*-
+import base64
+import json
+import os
+import unittest
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import ECC, RSA
+from Crypto.Signature import DSS, PKCS1_v1_5, eddsa
+from cas_client import CASClient, ECDSASigner, Ed25519Signer, RSASigner
+try:
+    from urlparse import parse_qs
+except ImportError:
+    from urllib.parse import parse_qs
+
+
+class TestCase(unittest.TestCase):
+
+    private_key_filepath = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'test_private_key.pem',
+        )
+
+    public_key_filepath = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'test_public_key.pem',
+        )
+
+    def _get_auth_token_login_url(self, cas_client, private_key=None):
+        url = cas_client.get_auth_token_login_url(
+            auth_token_ticket='AT-1234',
+            authenticator='my_company_ldap',
+            private_key=private_key,
+            service_url='https://example.com',
+            username='my_user',
+            )
+        query_string = url.partition('?')[-1]
+        query_parameters = {
+            key: value[0]
+            for key, value in parse_qs(query_string).items()
+        }
+        auth_token = base64.b64decode(query_parameters['at'])
+        signature = base64.b64decode(query_parameters['ats'])
+        return auth_token, signature
+
+    def test_rsa_signer(self):
+        with open(self.private_key_filepath, 'r') as file_pointer:
+            private_key = file_pointer.read()
+        with open(self.public_key_filepath, 'r') as file_pointer:
+            public_key = RSA.importKey(file_pointer.read())
+        legacy_client = CASClient('https://dummy.url')
+        signer_client = CASClient(
+            'https://dummy.url',
+            signer=RSASigner(private_key),
+            )
+        auth_token, signature = self._get_auth_token_login_url(
+            legacy_client,
+            private_key=private_key,
+            )
+        self.assertEqual(
+            self._get_auth_token_login_url(signer_client),
+            (auth_token, signature),
+            )
+        self.assertNotIn('alg', json.loads(auth_token.decode('utf-8')))
+        self.assertTrue(PKCS1_v1_5.new(public_key).verify(
+            SHA256.new(auth_token),
+            signature,
+            ))
+
+    def test_rsa_signer_cache(self):
+        with open(self.private_key_filepath, 'r') as file_pointer:
+            private_key = file_pointer.read()
+        cas_client = CASClient('https://dummy.url')
+        self._get_auth_token_login_url(cas_client, private_key=private_key)
+        signer = cas_client._get_signer(private_key)
+        self._get_auth_token_login_url(cas_client, private_key=private_key)
+        self.assertIs(cas_client._get_signer(private_key), signer)
+
+    def test_ecdsa_signer(self):
+        private_key = ECC.generate(curve='P-256')
+        cas_client = CASClient(
+            'https://dummy.url',
+            signer=ECDSASigner(private_key.export_key(format='PEM')),
+            )
+        auth_token, signature = self._get_auth_token_login_url(cas_client)
+        self.assertEqual(json.loads(auth_token.decode('utf-8'))['alg'], 'ES256')
+        verifier = DSS.new(private_key.public_key(), 'fips-186-3', encoding='der')
+        verifier.verify(SHA256.new(auth_token), signature)
+
+    def test_ed25519_signer(self):
+        private_key = ECC.generate(curve='Ed25519')
+        signer = Ed25519Signer(private_key.export_key(format='PEM'))
+        cas_client = CASClient('https://dummy.url')
+        auth_token, signature = self._get_auth_token_login_url(
+            cas_client,
+            private_key=signer,
+            )
+        self.assertEqual(json.loads(auth_token.decode('utf-8'))['alg'], 'EdDSA')
+        verifier = eddsa.new(private_key.public_key(), 'rfc8032')
+        verifier.verify(auth_token, signature)
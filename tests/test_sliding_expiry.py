@@ -0,0 +1,143 @@
+# -*- encoding: utf-8 -*-
+import time
+import unittest
+from cas_client import (
+    CASClient,
+    MemcachedCASSessionAdapter,
+    MemoryCASSessionAdapter,
+    SlidingExpiryCASSessionAdapter,
+    )
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    def test_touches_are_batched(self):
+        inner = mock.Mock(wraps=MemoryCASSessionAdapter())
+        adapter = SlidingExpiryCASSessionAdapter(
+            inner,
+            expires=600,
+            flush_interval=None,
+            min_touch_interval=0,
+            batch_size=2,
+            )
+        for index in range(5):
+            adapter.create('ST-{}'.format(index))
+        inner.create.assert_called_with('ST-4', payload=None, expires=600)
+        for _ in range(3):
+            for index in range(5):
+                self.assertTrue(adapter.exists('ST-{}'.format(index)))
+        self.assertFalse(adapter.exists('ST-5'))
+        self.assertEqual(adapter.flush(), 5)
+        self.assertEqual(
+            [call[0] for call in inner.touch_many.call_args_list],
+            [(['ST-0', 'ST-1'], 600), (['ST-2', 'ST-3'], 600), (['ST-4'], 600)],
+            )
+        metrics = adapter.metrics
+        self.assertEqual(metrics['batches'], 3)
+        self.assertEqual(metrics['touches'], 5)
+        self.assertEqual(metrics['pending'], 0)
+        self.assertEqual(adapter.flush(), 0)
+
+    def test_min_touch_interval(self):
+        inner = MemoryCASSessionAdapter()
+        adapter = SlidingExpiryCASSessionAdapter(
+            inner,
+            expires=600,
+            flush_interval=None,
+            min_touch_interval=60,
+            )
+        with mock.patch('time.time') as m:
+            m.return_value = 1000.
+            adapter.create('ST-1234')
+            m.return_value = 1030.
+            self.assertTrue(adapter.exists('ST-1234'))
+            self.assertEqual(adapter.flush(), 0)
+            m.return_value = 1061.
+            self.assertEqual(adapter.get('ST-1234'), True)
+            self.assertTrue(adapter.exists('ST-1234'))
+            self.assertEqual(adapter.flush(), 1)
+            self.assertEqual(adapter.metrics['skipped'], 2)
+            m.return_value = 1500.
+            self.assertTrue(inner.exists('ST-1234'))
+            m.return_value = 1700.
+            self.assertFalse(inner.exists('ST-1234'))
+
+    def test_sliding_expiry(self):
+        inner = MemoryCASSessionAdapter()
+        adapter = SlidingExpiryCASSessionAdapter(
+            inner,
+            expires=600,
+            flush_interval=None,
+            min_touch_interval=0,
+            )
+        cas_client = CASClient('https://dummy.url', session_storage_adapter=adapter)
+        with mock.patch('time.time') as m:
+            m.return_value = 1000.
+            cas_client.create_session('ST-1234')
+            m.return_value = 1500.
+            self.assertTrue(cas_client.session_exists('ST-1234'))
+            adapter.flush()
+            m.return_value = 1700.
+            self.assertTrue(cas_client.session_exists('ST-1234'))
+            cas_client.delete_session('ST-1234')
+            self.assertEqual(adapter.metrics['pending'], 0)
+            self.assertFalse(cas_client.session_exists('ST-1234'))
+
+    def test_flush_thread(self):
+        client = mock.Mock(spec=['get', 'touch'])
+        client.get.return_value = b'\x01\x00\x02'
+        adapter = SlidingExpiryCASSessionAdapter(
+            MemcachedCASSessionAdapter(client),
+            expires=600,
+            flush_interval=0.01,
+            min_touch_interval=0,
+            )
+        self.assertTrue(adapter.exists('ST-1234'))
+        deadline = time.time() + 5
+        while not client.touch.called and time.time() < deadline:
+            time.sleep(0.01)
+        client.touch.assert_called_once_with('ST-1234', 600)
+        adapter.close()
+
+    def test_memcached_flush_is_batched(self):
+        client = mock.Mock(spec=['get', 'touch', 'touch_many'])
+        client.get.return_value = True
+        adapter = SlidingExpiryCASSessionAdapter(
+            MemcachedCASSessionAdapter(client),
+            expires=600,
+            flush_interval=None,
+            min_touch_interval=0,
+            )
+        for index in range(5):
+            adapter.exists('ST-{}'.format(index))
+        self.assertEqual(adapter.flush(), 5)
+        client.touch_many.assert_called_once_with(
+            ['ST-{}'.format(index) for index in range(5)], 600)
+        self.assertFalse(client.touch.called)
+
+    def test_memcached_noreply_touches(self):
+        client = mock.Mock(spec=['default_noreply', 'get', 'touch'])
+        adapter = MemcachedCASSessionAdapter(client)
+        adapter.touch_many(['ST-1', 'ST-2'], 600)
+        self.assertEqual(client.touch.call_args_list, [
+            mock.call('ST-1', 600, noreply=True),
+            mock.call('ST-2', 600, noreply=True),
+            ])
+
+    def test_failed_flush(self):
+        inner = mock.Mock(wraps=MemoryCASSessionAdapter())
+        inner.touch_many.side_effect = IOError
+        adapter = SlidingExpiryCASSessionAdapter(
+            inner,
+            expires=600,
+            flush_interval=None,
+            min_touch_interval=0,
+            )
+        adapter.create('ST-1234')
+        adapter.exists('ST-1234')
+        self.assertEqual(adapter.flush(), 0)
+        self.assertEqual(adapter.metrics['failures'], 1)
@@ -0,0 +1,141 @@
+# -*- encoding: utf-8 -*-
+import os
+import socket
+import ssl
+import threading
+import time
+import unittest
+from cas_client import CASClient, create_ssl_context
+from six.moves import BaseHTTPServer, socketserver
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    certificate_filepath = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'test_tls_cert.pem',
+        )
+
+    key_filepath = os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'test_tls_key.pem',
+        )
+
+    def setUp(self):
+        requests = self.requests = []
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_HEAD(self):
+                requests.append((self.command, self.connection.session_reused))
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(self.certificate_filepath, self.key_filepath)
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.socket = server_context.wrap_socket(
+            self.server.socket,
+            server_side=True,
+            )
+        self.server_url = 'https://localhost:{}'.format(self.server.server_port)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_create_ssl_context(self):
+        ssl_context = create_ssl_context(ca_bundle=self.certificate_filepath)
+        self.assertEqual(ssl_context.verify_mode, ssl.CERT_REQUIRED)
+        self.assertTrue(ssl_context.check_hostname)
+        ssl_context = create_ssl_context(verify_certificates=False)
+        self.assertEqual(ssl_context.verify_mode, ssl.CERT_NONE)
+        self.assertFalse(ssl_context.check_hostname)
+
+    def test_ssl_context_is_shared(self):
+        cas_client = CASClient(
+            self.server_url,
+            validate_url='https://validate.url',
+            verify_certificates=True,
+            ca_bundle=self.certificate_filepath,
+            persistent_connections=True,
+            )
+        ssl_context = cas_client.ssl_context
+        self.assertIs(cas_client.ssl_context, ssl_context)
+        adapter = cas_client.http_session.get_adapter(self.server_url)
+        self.assertIs(adapter.ssl_context, ssl_context)
+        connection = mock.Mock()
+        adapter.cert_verify(connection, self.server_url, True, None)
+        self.assertIsNone(connection.ca_certs)
+        self.assertEqual(connection.cert_reqs, 'CERT_REQUIRED')
+        cas_client.close()
+
+    def test_ssl_session_resumption(self):
+        ssl_context = create_ssl_context(ca_bundle=self.certificate_filepath)
+        connections = []
+        for _ in range(2):
+            connection = ssl_context.wrap_socket(
+                socket.create_connection(('127.0.0.1', self.server.server_port)),
+                server_hostname='localhost',
+                )
+            connection.sendall(b'HEAD / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            connection.recv(1024)
+            connections.append(connection)
+        self.assertFalse(connections[0].session_reused)
+        self.assertTrue(connections[1].session_reused)
+        for connection in connections:
+            connection.close()
+
+    def test_warm_up(self):
+        cas_client = CASClient(
+            self.server_url,
+            verify_certificates=True,
+            ca_bundle=self.certificate_filepath,
+            persistent_connections=True,
+            )
+        self.assertTrue(cas_client.warm_up())
+        self.assertTrue(cas_client.warm_up(connections=2))
+        self.assertEqual(
+            [command for command, _ in self.requests],
+            ['HEAD', 'HEAD', 'HEAD'],
+            )
+        self.assertTrue(any(reused for _, reused in self.requests))
+        cas_client.close()
+
+    def test_warm_up_failure(self):
+        cas_client = CASClient(
+            'https://localhost:1',
+            persistent_connections=True,
+            )
+        self.assertFalse(cas_client.warm_up(timeout=1))
+        cas_client.close()
+
+    def test_keepalive(self):
+        cas_client = CASClient(
+            self.server_url,
+            verify_certificates=True,
+            ca_bundle=self.certificate_filepath,
+            persistent_connections=True,
+            keepalive_interval=0.05,
+            )
+        deadline = time.time() + 5
+        while len(self.requests) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        cas_client.close()
+        self.assertGreaterEqual(len(self.requests), 2)
@@ -0,0 +1,244 @@
+# -*- encoding: utf-8 -*-
+import time
+import unittest
+from cas_client import (
+    BinaryCASSessionCodec,
+    CASClient,
+    MemcachedCASSessionAdapter,
+    CASSessionCodecError,
+    MemoryCASSessionAdapter,
+    SlidingExpiryCASSessionAdapter,
+    )
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class MockMemcachedClient(object):
+
+    def __init__(self, max_item_size=1024 * 1024):
+        self.values = {}
+        self.expires = {}
+        self.deadlines = {}
+        self.delete_many_calls = []
+        self.max_item_size = max_item_size
+
+    def add(self, key, value, expire=0, noreply=False):
+        if self._get(key) is not None:
+            return False
+        self.set(key, value, expire)
+        return True
+
+    def append(self, key, value, noreply=False):
+        current = self._get(key)
+        if current is None or len(current + value) > self.max_item_size:
+            return False
+        self.values[key] = current + value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def delete_many(self, keys):
+        self.delete_many_calls.append(keys)
+        for key in keys:
+            self.values.pop(key, None)
+
+    def get(self, key):
+        return self._get(key)
+
+    def get_many(self, keys):
+        values = dict((key, self._get(key)) for key in keys)
+        return dict((key, value) for key, value in values.items() if value is not None)
+
+    def set(self, key, value, expire=0):
+        self.values[key] = value
+        self.touch(key, expire)
+
+    def touch(self, key, expire=0):
+        self.expires[key] = expire
+        self.deadlines[key] = time.time() + expire if expire else None
+
+    def _get(self, key):
+        deadline = self.deadlines.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.values.pop(key, None)
+        return self.values.get(key)
+
+
+class TestCase(unittest.TestCase):
+
+    def assert_user_index(self, adapter):
+        cas_client = CASClient('https://dummy.url', session_storage_adapter=adapter)
+        for index in range(3):
+            cas_client.create_session(
+                'ST-{}'.format(index),
+                payload={'user': u'jött', 'attributes': {}},
+                expires=600,
+                )
+        cas_client.create_session('ST-3', payload={'user': u'other'}, expires=600)
+        cas_client.create_session('ST-4', expires=600)
+        cas_client.delete_session('ST-1')
+        self.assertEqual(cas_client.delete_user_sessions(u'jött'), 2)
+        for ticket in ('ST-0', 'ST-1', 'ST-2'):
+            self.assertFalse(cas_client.session_exists(ticket))
+        self.assertTrue(cas_client.session_exists('ST-3'))
+        self.assertTrue(cas_client.session_exists('ST-4'))
+        self.assertEqual(cas_client.delete_user_sessions(u'jött'), 0)
+        self.assertEqual(cas_client.delete_user_sessions(u'nobody'), 0)
+
+    def test_memcached(self):
+        client = MockMemcachedClient()
+        adapter = MemcachedCASSessionAdapter(client, index_users=True)
+        self.assert_user_index(adapter)
+        self.assertEqual(
+            [len(keys) for keys in client.delete_many_calls],
+            [3, 1, 1],
+            )
+        self.assertEqual(
+            sorted(key[:9] for key in client.values),
+            ['ST-3', 'ST-4', 'cas-user-'],
+            )
+
+    def test_memcached_index_expires(self):
+        client = MockMemcachedClient()
+        adapter = MemcachedCASSessionAdapter(
+            client,
+            index_users=True,
+            index_expires=86400,
+            )
+        with mock.patch('time.time', return_value=1000.):
+            adapter.create('ST-1', payload={'user': 'jott'}, expires=600)
+        index_key = [key for key in client.values if key != 'ST-1'][0]
+        self.assertEqual(client.expires['ST-1'], 600)
+        self.assertEqual(client.expires[index_key], 86401)
+        self.assertEqual(client.values[index_key], b'+ST-1:87401 ')
+
+    def test_memcached_index_lifetime_is_only_extended(self):
+        for index_expires in (None, 30):
+            client = MockMemcachedClient()
+            adapter = MemcachedCASSessionAdapter(
+                client,
+                index_users=True,
+                index_expires=index_expires,
+                )
+            with mock.patch('time.time') as m:
+                m.return_value = 1000.
+                adapter.create('ST-long', payload={'user': 'alice'}, expires=3600)
+                adapter.create('ST-short', payload={'user': 'alice'}, expires=60)
+                m.return_value = 1120.
+                self.assertTrue(adapter.exists('ST-long'))
+                self.assertFalse(adapter.exists('ST-short'))
+                self.assertEqual(adapter.delete_user_sessions('alice'), 1)
+                self.assertFalse(adapter.exists('ST-long'))
+
+    def test_memcached_index_without_expiry(self):
+        client = MockMemcachedClient()
+        adapter = MemcachedCASSessionAdapter(
+            client,
+            index_users=True,
+            index_expires=30,
+            )
+        adapter.create('ST-1', payload={'user': 'alice'})
+        adapter.create('ST-2', payload={'user': 'alice'}, expires=60)
+        index_key = [key for key in client.values if key[:3] != 'ST-'][0]
+        self.assertEqual(client.expires[index_key], 0)
+
+    def test_memcached_index_compaction(self):
+        client = MockMemcachedClient()
+        adapter = MemcachedCASSessionAdapter(
+            client,
+            index_users=True,
+            index_compact_size=64,
+            )
+        for index in range(10):
+            adapter.create('ST-{}'.format(index), payload={'user': 'alice'})
+            adapter.delete('ST-{}'.format(index - 1))
+        index_key = [key for key in client.values if key[:3] != 'ST-'][0]
+        self.assertLess(len(client.values[index_key]), 64 + 16)
+        self.assertEqual(adapter.delete_user_sessions('alice'), 1)
+
+    def test_memcached_full_index_is_rewritten(self):
+        client = MockMemcachedClient(max_item_size=48)
+        adapter = MemcachedCASSessionAdapter(client, index_users=True)
+        for index in range(10):
+            adapter.create('ST-{}'.format(index), payload={'user': 'alice'})
+            adapter.delete('ST-{}'.format(index - 1))
+        self.assertTrue(adapter.exists('ST-9'))
+        self.assertEqual(adapter.delete_user_sessions('alice'), 1)
+        self.assertEqual(client.values, {})
+
+    def test_memcached_index_compaction_uses_cas(self):
+        client = MockMemcachedClient()
+        client.gets = mock.Mock(return_value=(b'+ST-0:0 ', b'1'))
+        client.cas = mock.Mock(side_effect=[False, True])
+        adapter = MemcachedCASSessionAdapter(
+            client,
+            index_users=True,
+            index_compact_size=1,
+            )
+        adapter.create('ST-1', payload={'user': 'alice'})
+        self.assertEqual(client.cas.call_count, 2)
+        self.assertEqual(client.cas.call_args[0][1], b'+ST-1:0 ')
+
+    def test_memcached_delete_undecodable_session(self):
+        client = MockMemcachedClient()
+        adapter = MemcachedCASSessionAdapter(
+            client,
+            codec=BinaryCASSessionCodec(),
+            index_users=True,
+            )
+        client.set('ST-1', b'\xff\xff')
+        with self.assertRaises(CASSessionCodecError):
+            adapter.get('ST-1')
+        adapter.delete('ST-1')
+        self.assertFalse(adapter.exists('ST-1'))
+
+    def test_memcached_delete_multi(self):
+        client = mock.Mock(spec=[
+            'add', 'append', 'delete_multi', 'get', 'get_multi', 'set', 'touch'])
+        client.get.return_value = '+ST-1 +ST-2 -ST-1 '
+        client.get_multi.return_value = {'ST-2': True}
+        adapter = MemcachedCASSessionAdapter(client, index_users=True)
+        self.assertEqual(adapter.delete_user_sessions('jott'), 1)
+        keys = client.delete_multi.call_args[0][0]
+        self.assertEqual(keys[0], 'ST-2')
+        self.assertEqual(len(keys), 2)
+
+    def test_memcached_noreply(self):
+        client = MockMemcachedClient()
+        client.default_noreply = False
+        client.add = mock.Mock(wraps=client.add)
+        client.append = mock.Mock(wraps=client.append)
+        adapter = MemcachedCASSessionAdapter(client, index_users=True)
+        adapter.create('ST-1', payload={'user': 'alice'})
+        adapter.delete('ST-1')
+        self.assertEqual(client.add.call_args[1], {'noreply': True})
+        self.assertEqual(
+            [call[1] for call in client.append.call_args_list],
+            [{'noreply': True}, {'noreply': True}],
+            )
+
+    def test_memory(self):
+        adapter = MemoryCASSessionAdapter(index_users=True)
+        self.assert_user_index(adapter)
+        self.assertEqual(adapter._users, {u'other': set(['ST-3'])})
+
+    def test_memory_expired_sessions(self):
+        adapter = MemoryCASSessionAdapter(index_users=True)
+        with mock.patch('time.time') as m:
+            m.return_value = 1000.
+            adapter.create('ST-1', payload={'user': 'jott'}, expires=60)
+            adapter.create('ST-2', payload={'user': 'jott'}, expires=120)
+            m.return_value = 1061.
+            self.assertFalse(adapter.exists('ST-1'))
+            self.assertEqual(adapter.delete_user_sessions('jott'), 1)
+
+    def test_sliding_expiry(self):
+        adapter = SlidingExpiryCASSessionAdapter(
+            MemoryCASSessionAdapter(index_users=True),
+            expires=600,
+            flush_interval=None,
+            )
+        self.assert_user_index(adapter)
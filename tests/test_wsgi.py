@@ -0,0 +1,264 @@
+# -*- encoding: utf-8 -*-
+import io
+import requests
+import unittest
+from cas_client import (
+    CASAdmissionError,
+    CASClient,
+    CASResponseTooLargeError,
+    MemoryCASProxyGrantingTicketStore,
+    MemoryCASSessionAdapter,
+    )
+from cas_client.wsgi import CASWSGIMiddleware
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+class TestCase(unittest.TestCase):
+
+    response_text = """
+    <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationSuccess>
+            <cas:user>jott</cas:user>
+        </cas:authenticationSuccess>
+    </cas:serviceResponse>
+    """
+
+    failure_text = """
+    <cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationFailure code="INVALID_TICKET">
+            Ticket ST-1234 not recognized
+        </cas:authenticationFailure>
+    </cas:serviceResponse>
+    """
+
+    slo_text = """
+    <samlp:LogoutRequest
+        xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol"
+        xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion"
+        ID="[RANDOM ID]"
+        Version="2.0"
+        IssueInstant="[CURRENT DATE/TIME]">
+        <saml:NameID>@NOT_USED@</saml:NameID>
+        <samlp:SessionIndex>ST-1234</samlp:SessionIndex>
+    </samlp:LogoutRequest>
+    """
+
+    def setUp(self):
+        self.adapter = MemoryCASSessionAdapter()
+        self.cas_client = CASClient(
+            'https://dummy.url',
+            session_storage_adapter=self.adapter,
+            )
+        self.calls = []
+
+        def application(environ, start_response):
+            self.calls.append(environ)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'OK']
+
+        self.application = application
+
+    def _call(self, middleware, path='/', query='', cookie=None, method='GET', body=b''):
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'app.url',
+            'SERVER_PORT': '443',
+            'HTTP_HOST': 'app.url',
+            'wsgi.url_scheme': 'https',
+            'wsgi.input': io.BytesIO(body),
+            }
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        if body:
+            environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+            environ['CONTENT_LENGTH'] = str(len(body))
+        result = {}
+
+        def start_response(status, headers):
+            result['status'] = status
+            result['headers'] = dict(headers)
+
+        result['body'] = b''.join(middleware(environ, start_response))
+        return result
+
+    def test_redirect_to_login(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        result = self._call(middleware, path='/page', query='a=1')
+        self.assertEqual(result['status'], '302 Found')
+        self.assertEqual(
+            result['headers']['Location'],
+            'https://dummy.url/cas/login?service=https%3A%2F%2Fapp.url%2Fpage%3Fa%3D1',
+            )
+        self.assertEqual(self.calls, [])
+
+    def test_validate_ticket(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = self.response_text
+            result = self._call(middleware, path='/page', query='a=1&ticket=ST-1234')
+            m.assert_called_once_with(
+                'https://dummy.url/cas/serviceValidate?ticket=ST-1234'
+                '&service=https%3A%2F%2Fapp.url%2Fpage%3Fa%3D1',
+                headers=None,
+                )
+        self.assertEqual(result['status'], '302 Found')
+        self.assertEqual(result['headers']['Location'], 'https://app.url/page?a=1')
+        self.assertEqual(
+            result['headers']['Set-Cookie'],
+            'cas_ticket=ST-1234; Path=/; HttpOnly; Secure',
+            )
+        self.assertTrue(self.adapter.exists('ST-1234'))
+
+    def test_validate_ticket_failure(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = self.failure_text
+            result = self._call(middleware, query='ticket=ST-1234')
+        self.assertEqual(result['status'], '302 Found')
+        self.assertTrue(result['headers']['Location'].startswith(
+            'https://dummy.url/cas/login?service='))
+        self.assertNotIn('Set-Cookie', result['headers'])
+        self.assertFalse(self.adapter.exists('ST-1234'))
+
+    def test_validate_ticket_error(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        errors = [
+            requests.ConnectionError('boom'),
+            requests.Timeout('slow'),
+            CASAdmissionError('busy'),
+            CASResponseTooLargeError('huge'),
+            ]
+        for error in errors:
+            with mock.patch('cas_client.CASClient._perform_get') as m:
+                m.side_effect = error
+                result = self._call(middleware, query='ticket=ST-1234')
+            self.assertEqual(result['status'], '503 Service Unavailable')
+            self.assertEqual(result['headers']['Retry-After'], '5')
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            m.return_value = '<html><body>Bad Gateway</body></html>'
+            result = self._call(middleware, query='ticket=ST-1234')
+        self.assertEqual(result['status'], '503 Service Unavailable')
+        self.assertNotIn('Set-Cookie', result['headers'])
+        self.assertFalse(self.adapter.exists('ST-1234'))
+        self.assertEqual(self.calls, [])
+
+    def test_authenticated_request(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        self.adapter.create('ST-1234')
+        with mock.patch('cas_client.CASClient._perform_get') as m:
+            result = self._call(middleware, cookie='cas_ticket=ST-1234')
+            self.assertFalse(m.called)
+        self.assertEqual(result['status'], '200 OK')
+        self.assertEqual(result['body'], b'OK')
+        self.assertEqual(self.calls[0]['cas_client.ticket'], 'ST-1234')
+
+    def test_logout_request(self):
+        middleware = CASWSGIMiddleware(
+            self.application,
+            self.cas_client,
+            near_cache_ttl=60,
+            )
+        self.adapter.create('ST-1234')
+        result = self._call(middleware, cookie='cas_ticket=ST-1234')
+        self.assertEqual(result['status'], '200 OK')
+        body = urlencode({'logoutRequest': self.slo_text}).encode('utf-8')
+        result = self._call(middleware, method='POST', body=body)
+        self.assertEqual(result['status'], '200 OK')
+        self.assertFalse(self.adapter.exists('ST-1234'))
+        result = self._call(middleware, cookie='cas_ticket=ST-1234')
+        self.assertEqual(result['status'], '302 Found')
+
+    def test_malformed_logout_request(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        self.adapter.create('ST-1234')
+        for value in ('<not-xml', '<form>ST-1234</form>'):
+            body = urlencode({'logoutRequest': value}).encode('utf-8')
+            result = self._call(middleware, method='POST', body=body)
+            self.assertEqual(result['status'], '302 Found')
+            result = self._call(
+                middleware,
+                cookie='cas_ticket=ST-1234',
+                method='POST',
+                body=body,
+                )
+            self.assertEqual(result['status'], '200 OK')
+            self.assertEqual(self.calls[-1]['wsgi.input'].read(), body)
+        self.assertTrue(self.adapter.exists('ST-1234'))
+
+    def test_logout_path(self):
+        middleware = CASWSGIMiddleware(
+            self.application,
+            self.cas_client,
+            logout_path='/cas/logout',
+            )
+        self.adapter.create('ST-1234')
+        body = urlencode({'logoutRequest': self.slo_text}).encode('utf-8')
+        result = self._call(
+            middleware,
+            path='/form',
+            cookie='cas_ticket=ST-1234',
+            method='POST',
+            body=body,
+            )
+        self.assertEqual(result['status'], '200 OK')
+        self.assertTrue(self.adapter.exists('ST-1234'))
+        result = self._call(middleware, path='/cas/logout', method='POST', body=body)
+        self.assertEqual(result['status'], '200 OK')
+        self.assertFalse(self.adapter.exists('ST-1234'))
+
+    def test_post_body_is_preserved(self):
+        middleware = CASWSGIMiddleware(self.application, self.cas_client)
+        self.adapter.create('ST-1234')
+        result = self._call(
+            middleware,
+            cookie='cas_ticket=ST-1234',
+            method='POST',
+            body=b'a=1&b=2',
+            )
+        self.assertEqual(result['status'], '200 OK')
+        self.assertEqual(self.calls[0]['wsgi.input'].read(), b'a=1&b=2')
+
+    def test_near_cache(self):
+        middleware = CASWSGIMiddleware(
+            self.application,
+            self.cas_client,
+            near_cache_ttl=60,
+            )
+        self.adapter.create('ST-1234')
+        with mock.patch.object(self.adapter, 'exists') as m:
+            m.return_value = True
+            self._call(middleware, cookie='cas_ticket=ST-1234')
+            self._call(middleware, cookie='cas_ticket=ST-1234')
+            m.assert_called_once_with('ST-1234')
+
+    def test_proxy_callback(self):
+        store = MemoryCASProxyGrantingTicketStore()
+        self.cas_client = CASClient(
+            'https://dummy.url',
+            session_storage_adapter=self.adapter,
+            proxy_granting_ticket_store=store,
+            )
+        middleware = CASWSGIMiddleware(
+            self.application,
+            self.cas_client,
+            proxy_callback_path='/callback',
+            )
+        result = self._call(middleware, path='/callback')
+        self.assertEqual(result['status'], '200 OK')
+        result = self._call(
+            middleware,
+            path='/callback',
+            query='pgtIou=PGTIOU-1234&pgtId=PGT-1234',
+            )
+        self.assertEqual(result['status'], '200 OK')
+        self.assertEqual(self.calls, [])
+        self.assertEqual(store.wait('PGTIOU-1234', timeout=0), 'PGT-1234')